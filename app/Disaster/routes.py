@@ -1,8 +1,11 @@
 from flask import Blueprint, request, jsonify, session, render_template
 from datetime import datetime
+from sqlalchemy import func, or_
+from sqlalchemy.orm import joinedload
 from app.models import db, Disaster, User, AuditLog
 
 from .import disasterBp
+from .summary import disaster_summary
 
 # ----------------------------
 # Helpers
@@ -19,6 +22,8 @@ def serialize_disaster(d):
         "name": d.name,
         "type": d.type,
         "location": d.location,
+        "latitude": d.latitude,
+        "longitude": d.longitude,
         "severity": d.severity,
         "affected_population": d.affected_population,
         "description": d.description,
@@ -28,6 +33,13 @@ def serialize_disaster(d):
         "reported_by_name": getattr(d.reporter, "name", "Unknown")
     }
 
+def like_pattern(text):
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def parse_date(value):
+    return datetime.fromisoformat(value) if value else None
+
 def log_action(user_id, action, details):
     audit = AuditLog(user_id=user_id or None, action=action, details=details, created_at=datetime.utcnow())
     db.session.add(audit)
@@ -72,12 +84,78 @@ def get_disasters():
     disasters = Disaster.query.all()
     return jsonify([serialize_disaster(d) for d in disasters]), 200
 
+# --- Search Disasters (with facet counts) ---
+SORTS = {
+    "newest": Disaster.reported_on.desc(),
+    "oldest": Disaster.reported_on.asc(),
+    "name": Disaster.name.asc(),
+}
+
+@disasterBp.route("/search", methods=["GET"])
+def search_disasters():
+    """?q=&type=&severity=&from=&to=&sort=newest|oldest|name&page=&per_page=
+
+    type and severity accept comma-separated values. Each facet is counted
+    with every filter applied except its own, so the UI can show what
+    selecting another value would return.
+    """
+    args = request.args
+    try:
+        date_from, date_to = parse_date(args.get("from")), parse_date(args.get("to"))
+    except ValueError:
+        return jsonify({"error": "from/to must be ISO dates"}), 400
+    types = [t for t in args.get("type", "").split(",") if t]
+    severities = [s for s in args.get("severity", "").split(",") if s]
+    page = max(args.get("page", 1, type=int), 1)
+    per_page = min(max(args.get("per_page", 20, type=int), 1), 100)
+
+    base = []
+    q = args.get("q", "").strip()
+    if q:
+        pattern = like_pattern(q)
+        base.append(or_(Disaster.name.ilike(pattern, escape="\\"), Disaster.location.ilike(pattern, escape="\\")))
+    if date_from:
+        base.append(Disaster.reported_on >= date_from)
+    if date_to:
+        base.append(Disaster.reported_on < date_to)
+    type_filter = [Disaster.type.in_(types)] if types else []
+    severity_filter = [Disaster.severity.in_(severities)] if severities else []
+
+    def facet(column, filters):
+        rows = db.session.query(column, func.count(Disaster.id)).filter(*filters).group_by(column)
+        return sorted(({"value": v, "count": n} for v, n in rows), key=lambda f: -f["count"])
+
+    filters = base + type_filter + severity_filter
+    total = db.session.query(func.count(Disaster.id)).filter(*filters).scalar()
+    results = (Disaster.query.options(joinedload(Disaster.reporter)).filter(*filters)
+               .order_by(SORTS.get(args.get("sort"), SORTS["newest"]), Disaster.id.desc())
+               .offset((page - 1) * per_page)
+               .limit(per_page)
+               .all())
+
+    return jsonify({
+        "results": [serialize_disaster(d) for d in results],
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "facets": {
+            "type": facet(Disaster.type, base + severity_filter),
+            "severity": facet(Disaster.severity, base + type_filter),
+        },
+    }), 200
+
 # --- Get Single Disaster ---
 @disasterBp.route("/<int:id>", methods=["GET"])
 def get_disaster(id):
     disaster = Disaster.query.get_or_404(id)
     return jsonify(serialize_disaster(disaster)), 200
 
+# --- Disaster Detail with Aggregates ---
+@disasterBp.route("/<int:id>/detail", methods=["GET"])
+def get_disaster_detail(id):
+    disaster = Disaster.query.get_or_404(id)
+    return jsonify(serialize_disaster(disaster) | {"summary": disaster_summary(disaster.id)}), 200
+
 # --- Update Disaster ---
 @disasterBp.route("/<int:id>", methods=["PUT"])
 def update_disaster(id):
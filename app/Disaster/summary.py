@@ -0,0 +1,79 @@
+# app/Disaster/summary.py
+"""
+Aggregates shown with a single disaster.
+
+disaster_summary() runs a fixed set of grouped queries: requests by status,
+stock by resource type, camps, and one primary-key read of the maintained
+donation totals. Its cost does not grow with the number of child rows the
+page would otherwise load.
+"""
+from sqlalchemy import func
+from app.models import db, ReliefRequest, Resource, ReliefCamp, DonationDisasterTotal
+from app.Resource.stock import usable
+from app.Resource.gaps import resource_key
+
+
+def request_summary(disaster_id):
+    rows = (db.session.query(ReliefRequest.status, func.count(ReliefRequest.id),
+                             func.coalesce(func.sum(ReliefRequest.quantity), 0))
+            .filter(ReliefRequest.disaster_id == disaster_id)
+            .group_by(ReliefRequest.status))
+    by_status = {status: {"count": n, "quantity": int(qty)} for status, n, qty in rows}
+    return {
+        "total": sum(s["count"] for s in by_status.values()),
+        "by_status": by_status,
+    }
+
+
+def stock_summary(disaster_id):
+    type_key = resource_key(Resource.resource_type)
+    rows = (db.session.query(type_key, Resource.canonical_unit,
+                             func.count(Resource.id),
+                             func.coalesce(func.sum(Resource.quantity), 0),
+                             func.coalesce(func.sum(Resource.reserved_quantity), 0),
+                             func.sum(Resource.normalized_quantity))
+            .filter(Resource.disaster_id == disaster_id, usable())
+            .group_by(type_key, Resource.canonical_unit)
+            .order_by(type_key))
+    return [{
+        "resource_type": resource_type,
+        "unit": unit,
+        "rows": n,
+        "quantity": int(qty),
+        "reserved": int(reserved),
+        "available": int(qty) - int(reserved),
+        "normalized_quantity": round(float(normalized), 3) if normalized is not None else None,
+    } for resource_type, unit, n, qty, reserved, normalized in rows]
+
+
+def donation_summary(disaster_id):
+    totals = db.session.get(DonationDisasterTotal, disaster_id)
+    return {
+        "count": totals.donation_count if totals else 0,
+        "amount": totals.total_amount if totals else 0.0,
+        "quantity": totals.total_quantity if totals else 0.0,
+    }
+
+
+def camp_summary(disaster_id):
+    camps, capacity, occupancy = (db.session.query(func.count(ReliefCamp.id),
+                                                   func.coalesce(func.sum(ReliefCamp.capacity), 0),
+                                                   func.coalesce(func.sum(ReliefCamp.current_occupancy), 0))
+                                  .filter(ReliefCamp.disaster_id == disaster_id)
+                                  .one())
+    return {
+        "camps": camps,
+        "capacity": int(capacity),
+        "occupancy": int(occupancy),
+        "free": int(capacity) - int(occupancy),
+        "occupancy_rate": round(int(occupancy) / int(capacity), 3) if capacity else None,
+    }
+
+
+def disaster_summary(disaster_id):
+    return {
+        "relief_requests": request_summary(disaster_id),
+        "stock": stock_summary(disaster_id),
+        "donations": donation_summary(disaster_id),
+        "camps": camp_summary(disaster_id),
+    }
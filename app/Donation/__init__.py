@@ -1,5 +1,5 @@
 from flask import Blueprint
 
-donationBp = Blueprint('donation',__name__)
+donationBp = Blueprint('donation',__name__, cli_group='donation')
 
 from . import routes
\ No newline at end of file
@@ -1,8 +1,18 @@
 from flask import Blueprint, request, jsonify, session, render_template
-from datetime import datetime
-from app.models import db, Donation, Resource, AuditLog, User
+from datetime import datetime, timedelta
+import click
+from app.models import db, Donation, AuditLog, User, Disaster, \
+    DonationDisasterTotal, DonationDonorTotal, DonationDailyTotal
+from app.Resource.stock import find_stock, ensure_stock, adjust_stock
 
 from . import donationBp
+from .totals import contribution, apply_contribution, rebuild_totals
+
+LEADERBOARD_COLUMNS = {
+    "amount": DonationDonorTotal.total_amount,
+    "quantity": DonationDonorTotal.total_quantity,
+    "count": DonationDonorTotal.donation_count,
+}
 
 # ---------------- Helpers ----------------
 def get_current_user():
@@ -23,36 +33,20 @@ def log_action(user_id, action, details):
     db.session.add(audit)
     db.session.commit()
 
-def update_resource_stock(donation, old_data=None):
-    # Rollback old quantity if updating
+def update_resource_stock(donation, old_data=None, user_id=None):
+    # Reverse the old donation's effect if updating
     if old_data and old_data.get("resource_type"):
-        res = Resource.query.filter_by(
-            resource_type=old_data["resource_type"],
-            disaster_id=old_data["disaster_id"]
-        ).first()
-        if res:
-            res.quantity -= old_data.get("quantity", 0)
-            if res.quantity < 0:
-                res.quantity = 0
+        resource_id = find_stock(old_data["resource_type"], old_data["disaster_id"], old_data.get("unit"))
+        if resource_id and old_data.get("quantity"):
+            adjust_stock(resource_id, -old_data["quantity"], "donation_in",
+                         user_id=user_id, donation_id=donation.id, note="donation reversed")
 
     # Add current donation quantity
     if donation.resource_type:
-        res = Resource.query.filter_by(
-            resource_type=donation.resource_type,
-            disaster_id=donation.disaster_id
-        ).first()
-        if res:
-            res.quantity += donation.quantity or 0
-            res.name = donation.donor_name or res.name
-        else:
-            res = Resource(
-                name=donation.donor_name or "Unknown",
-                resource_type=donation.resource_type,
-                quantity=donation.quantity or 0,
-                unit=donation.unit,
-                disaster_id=donation.disaster_id
-            )
-            db.session.add(res)
+        resource_id = ensure_stock(donation.resource_type, donation.disaster_id,
+                                   name=donation.donor_name, unit=donation.unit)
+        adjust_stock(resource_id, donation.quantity or 0, "donation_in",
+                     user_id=user_id, donation_id=donation.id, name=donation.donor_name)
 
 # ---------------- API ----------------
 @donationBp.route("/api", methods=["GET"])
@@ -129,7 +123,8 @@ def create_donation():
     try:
         db.session.add(donation)
         db.session.flush()
-        update_resource_stock(donation)
+        update_resource_stock(donation, user_id=user.id)
+        apply_contribution(contribution(donation))
         db.session.commit()
         log_action(user.id, "CREATE_DONATION", f"Donation {donation.id} created")
         return jsonify({"message": "Donation created", "id": donation.id}), 201
@@ -150,8 +145,10 @@ def update_donation(donation_id):
     old_data = {
         "resource_type": d.resource_type,
         "quantity": d.quantity,
+        "unit": d.unit,
         "disaster_id": d.disaster_id
     }
+    old_contribution = contribution(d)
 
     data = request.get_json() or {}
     try:
@@ -165,7 +162,10 @@ def update_donation(donation_id):
         return jsonify({"error": "Quantity, amount, and disaster_id must be numeric"}), 400
 
     try:
-        update_resource_stock(d, old_data)
+        update_resource_stock(d, old_data, user_id=user.id)
+        db.session.flush()
+        apply_contribution(old_contribution, sign=-1)
+        apply_contribution(contribution(d))
         db.session.commit()
         log_action(user.id, "UPDATE_DONATION", f"Donation {d.id} updated")
         return jsonify({"message": "Donation updated"}), 200
@@ -183,14 +183,13 @@ def delete_donation(donation_id):
     if not can_modify_donation(user, d):
         return jsonify({"error": "Forbidden"}), 403
 
-    if d.resource_type:
-        res = Resource.query.filter_by(resource_type=d.resource_type, disaster_id=d.disaster_id).first()
-        if res:
-            res.quantity -= d.quantity or 0
-            if res.quantity < 0:
-                res.quantity = 0
-
     try:
+        if d.resource_type and d.quantity:
+            resource_id = find_stock(d.resource_type, d.disaster_id, d.unit)
+            if resource_id:
+                adjust_stock(resource_id, -d.quantity, "donation_in",
+                             user_id=user.id, donation_id=d.id, note="donation deleted")
+        apply_contribution(contribution(d), sign=-1)
         db.session.delete(d)
         db.session.commit()
         log_action(user.id, "DELETE_DONATION", f"Donation {d.id} deleted")
@@ -199,7 +198,80 @@ def delete_donation(donation_id):
         db.session.rollback()
         return jsonify({"error": "Server error: " + str(e)}), 500
 
+# ---------------- Totals & leaderboards ----------------
+def serialize_totals(t):
+    return {
+        "donation_count": t.donation_count,
+        "total_amount": t.total_amount,
+        "total_quantity": t.total_quantity,
+    }
+
+@donationBp.route("/api/summary", methods=["GET"])
+def get_donation_summary():
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    rows = db.session.query(DonationDisasterTotal, Disaster.name) \
+        .outerjoin(Disaster, Disaster.id == DonationDisasterTotal.disaster_id)
+    disaster_id = request.args.get("disaster_id", type=int)
+    if disaster_id is not None:
+        rows = rows.filter(DonationDisasterTotal.disaster_id == disaster_id)
+    rows = rows.order_by(DonationDisasterTotal.total_amount.desc()).all()
+
+    by_disaster = [{"disaster_id": t.disaster_id or None, "disaster_name": name, **serialize_totals(t)}
+                   for t, name in rows]
+    overall = {
+        "donation_count": sum(r["donation_count"] for r in by_disaster),
+        "total_amount": sum(r["total_amount"] for r in by_disaster),
+        "total_quantity": sum(r["total_quantity"] for r in by_disaster),
+    }
+    return jsonify({"overall": overall, "by_disaster": by_disaster}), 200
+
+@donationBp.route("/api/leaderboard", methods=["GET"])
+def get_donor_leaderboard():
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    by = request.args.get("by", "amount")
+    if by not in LEADERBOARD_COLUMNS:
+        return jsonify({"error": f"by must be one of: {', '.join(LEADERBOARD_COLUMNS)}"}), 400
+    limit = min(request.args.get("limit", 10, type=int), 100)
+
+    column = LEADERBOARD_COLUMNS[by]
+    top = DonationDonorTotal.query.filter(column > 0).order_by(column.desc()).limit(limit).all()
+    return jsonify([{
+        "rank": i + 1,
+        "donor_id": t.donor_id,
+        "donor_name": t.donor_name,
+        "last_donated_at": t.last_donated_at.isoformat() if t.last_donated_at else None,
+        **serialize_totals(t),
+    } for i, t in enumerate(top)]), 200
+
+@donationBp.route("/api/daily", methods=["GET"])
+def get_donation_daily_totals():
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    days = min(request.args.get("days", 30, type=int), 366)
+    since = (datetime.utcnow() - timedelta(days=days)).date()
+    query = DonationDailyTotal.query.filter(DonationDailyTotal.day >= since)
+    if request.args.get("resource_type"):
+        query = query.filter(DonationDailyTotal.resource_type == request.args["resource_type"].strip().lower())
+    rows = query.order_by(DonationDailyTotal.day, DonationDailyTotal.resource_type).all()
+    return jsonify([{"day": t.day.isoformat(), "resource_type": t.resource_type, **serialize_totals(t)}
+                    for t in rows]), 200
+
 # ---------------- HTML ----------------
 @donationBp.route("/", methods=["GET"])
 def donation_page():
     return render_template("donation.html")
+
+# ---------------- CLI ----------------
+@donationBp.cli.command("rebuild-totals")
+def rebuild_totals_command():
+    """Recompute donation totals and leaderboards from the donations table."""
+    rebuild_totals()
+    click.echo("Donation totals rebuilt")
@@ -0,0 +1,131 @@
+# app/Donation/totals.py
+"""
+Incrementally maintained donation totals.
+
+apply_contribution() adds (sign=+1) or removes (sign=-1) one donation's share
+from the per-disaster, per-donor and per-type-per-day totals. Each bump is an
+`UPDATE ... SET x = x + :d`, with an INSERT under a savepoint when the row does
+not exist yet. It runs in the caller's transaction, so totals commit or roll
+back together with the donation itself.
+"""
+from datetime import date
+from sqlalchemy import update, insert, func, case
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Donation, DonationDisasterTotal, DonationDonorTotal, DonationDailyTotal
+from app.Resource.units import normalize_name
+
+
+def contribution(donation):
+    """Snapshot of what a donation adds to the totals (take it before editing)."""
+    return {
+        "disaster_id": donation.disaster_id or 0,
+        "donor_id": donation.donated_by,
+        "donor_name": donation.donor_name,
+        "resource_type": normalize_name(donation.resource_type) or "money",
+        "day": donation.donated_at.date(),
+        "donated_at": donation.donated_at,
+        "amount": donation.amount or 0,
+        "quantity": donation.normalized_quantity or 0,
+    }
+
+
+def _bump(model, key, deltas, set_on_update=None, set_on_insert=None):
+    if not any(deltas.values()):
+        return
+    values = {col: getattr(model, col) + value for col, value in deltas.items()}
+    values.update(set_on_update or {})
+    stmt = update(model).filter_by(**key).values(values)
+    options = {"synchronize_session": False}
+    if db.session.execute(stmt, execution_options=options).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model).values(**key, **deltas, **(set_on_insert or {})))
+    except IntegrityError:
+        # Another transaction created the row first
+        db.session.execute(stmt, execution_options=options)
+
+
+def apply_contribution(c, sign=1):
+    apply_contributions([c], sign)
+
+
+def apply_contributions(contributions, sign=1):
+    """Apply many contributions with one bump per distinct total row."""
+    def deltas():
+        return {"donation_count": 0, "total_amount": 0, "total_quantity": 0}
+
+    by_disaster, by_day, by_donor = {}, {}, {}
+    for c in contributions:
+        targets = [by_disaster.setdefault(c["disaster_id"], deltas()),
+                   by_day.setdefault((c["day"], c["resource_type"]), deltas())]
+        if c["donor_id"]:
+            donor = by_donor.setdefault(c["donor_id"], {"deltas": deltas(), "name": None, "last": None})
+            donor["name"] = c["donor_name"]
+            donor["last"] = max(donor["last"] or c["donated_at"], c["donated_at"])
+            targets.append(donor["deltas"])
+        for d in targets:
+            d["donation_count"] += sign
+            d["total_amount"] += sign * c["amount"]
+            d["total_quantity"] += sign * c["quantity"]
+
+    for disaster_id, d in by_disaster.items():
+        _bump(DonationDisasterTotal, {"disaster_id": disaster_id}, d)
+    for (day, resource_type), d in by_day.items():
+        _bump(DonationDailyTotal, {"day": day, "resource_type": resource_type}, d)
+    for donor_id, donor in by_donor.items():
+        on_update = {"donor_name": donor["name"]}
+        if sign > 0:
+            last = DonationDonorTotal.last_donated_at
+            on_update["last_donated_at"] = case(
+                (last.is_(None) | (last < donor["last"]), donor["last"]), else_=last
+            )
+        _bump(DonationDonorTotal, {"donor_id": donor_id}, donor["deltas"], on_update,
+              {"donor_name": donor["name"], "last_donated_at": donor["last"]})
+
+
+# ----------------------------
+# Full rebuild
+# ----------------------------
+def rebuild_totals():
+    """Recompute all three tables from `donations` with GROUP BY queries."""
+    for model in (DonationDisasterTotal, DonationDonorTotal, DonationDailyTotal):
+        db.session.query(model).delete(synchronize_session=False)
+
+    aggregates = (
+        func.count(Donation.id),
+        func.coalesce(func.sum(Donation.amount), 0),
+        func.coalesce(func.sum(Donation.normalized_quantity), 0),
+    )
+
+    disaster_key = func.coalesce(Donation.disaster_id, 0)
+    db.session.bulk_insert_mappings(DonationDisasterTotal, [{
+        "disaster_id": disaster_id, "donation_count": n, "total_amount": amount, "total_quantity": qty,
+    } for disaster_id, n, amount, qty in
+        db.session.query(disaster_key, *aggregates).group_by(disaster_key)])
+
+    db.session.bulk_insert_mappings(DonationDonorTotal, [{
+        "donor_id": donor_id, "donor_name": name, "donation_count": n, "total_amount": amount,
+        "total_quantity": qty, "last_donated_at": last,
+    } for donor_id, name, last, n, amount, qty in
+        db.session.query(Donation.donated_by, func.max(Donation.donor_name), func.max(Donation.donated_at),
+                         *aggregates)
+        .filter(Donation.donated_by.isnot(None))
+        .group_by(Donation.donated_by)])
+
+    # Day/type keys are normalized in Python so they match contribution()
+    daily = {}
+    day_key = func.date(Donation.donated_at)
+    for day, resource_type, n, amount, qty in (db.session.query(day_key, Donation.resource_type, *aggregates)
+                                               .group_by(day_key, Donation.resource_type)):
+        day = date.fromisoformat(day) if isinstance(day, str) else day
+        row = daily.setdefault((day, normalize_name(resource_type) or "money"), {
+            "day": day, "resource_type": normalize_name(resource_type) or "money",
+            "donation_count": 0, "total_amount": 0, "total_quantity": 0,
+        })
+        row["donation_count"] += n
+        row["total_amount"] += amount
+        row["total_quantity"] += qty
+    db.session.bulk_insert_mappings(DonationDailyTotal, list(daily.values()))
+
+    db.session.commit()
@@ -0,0 +1,132 @@
+# app/ReliefCamp/occupancy.py
+"""
+Camp check-ins and check-outs as atomic counter updates plus an event log.
+
+A check-in never reads the occupancy, adds to it in Python and writes it
+back, because two arrivals at the same camp would then overwrite each
+other. It is a single conditional statement:
+
+    UPDATE relief_camps
+       SET current_occupancy = coalesce(current_occupancy, 0) + :n
+     WHERE id = :camp AND coalesce(current_occupancy, 0) + :n <= capacity
+
+The database applies it under the row lock, so any number of concurrent
+check-ins at one camp serialize on that row and none can overfill it. If
+no row matches, the camp is full (or missing). Check-outs are the same
+with `- :n >= 0`.
+
+Every change also appends a CampOccupancyEvent in the same transaction,
+with the occupancy read back right after the update (still under the row
+lock). A camp's starting occupancy is an `adjust` event too, written when
+the camp is created (or by the migration for camps that existed before the
+log), so the counter is always the sum of the log, and the log says who
+moved the number and when. Capacity is changed the same way as a
+correction: under the row lock, and never below the current occupancy.
+
+The counter is written through the table, not the mapped class, so the
+per-camp geohash tile invalidation in UserLocation/clusters.py is not
+triggered by occupancy changes, which never move a camp. Callers commit.
+"""
+from sqlalchemy import func, insert, select, update
+from app.models import db, ReliefCamp, CampOccupancyEvent
+
+MAX_PEOPLE = 1000   # per check-in or check-out
+MAX_NOTE = 255      # CampOccupancyEvent.note
+_camps = ReliefCamp.__table__
+
+
+class OccupancyError(Exception):
+    """The change would overfill or underflow the camp, or the camp does not exist."""
+
+    def __init__(self, message, status=409, occupancy=None, capacity=None):
+        super().__init__(message)
+        self.status = status
+        self.occupancy = occupancy
+        self.capacity = capacity
+
+
+def _state(camp_id, lock=False):
+    query = select(_camps.c.current_occupancy, _camps.c.capacity).where(_camps.c.id == camp_id)
+    if lock:
+        query = query.with_for_update()
+    row = db.session.execute(query).first()
+    if row is None:
+        raise OccupancyError("Relief camp not found", status=404)
+    return row[0] or 0, row[1]
+
+
+def _check_note(note):
+    if note is not None and (not isinstance(note, str) or len(note) > MAX_NOTE):
+        raise OccupancyError(f"note must be text of at most {MAX_NOTE} characters", status=400)
+
+
+def _record(camp_id, kind, people, occupancy_after, user_id, note):
+    result = db.session.execute(insert(CampOccupancyEvent).values(
+        camp_id=camp_id, kind=kind, people=people, occupancy_after=occupancy_after,
+        user_id=user_id, note=note,
+    ))
+    return result.inserted_primary_key[0]
+
+
+def _move(camp_id, delta, kind, user_id, note):
+    _check_note(note)
+    occupancy = func.coalesce(_camps.c.current_occupancy, 0)
+    guard = occupancy + delta <= _camps.c.capacity if delta > 0 else occupancy + delta >= 0
+    result = db.session.execute(
+        update(_camps).where(_camps.c.id == camp_id, guard).values(current_occupancy=occupancy + delta)
+    )
+    after, capacity = _state(camp_id)
+    if result.rowcount == 0:
+        message = "Relief camp is full" if delta > 0 else "Fewer people checked in than are leaving"
+        raise OccupancyError(message, occupancy=after, capacity=capacity)
+    event_id = _record(camp_id, kind, delta, after, user_id, note)
+    return {"camp_id": camp_id, "event_id": event_id, "current_occupancy": after,
+            "capacity": capacity, "free_capacity": capacity - after}
+
+
+def check_in(camp_id, people=1, user_id=None, note=None):
+    """Add `people` to a camp's occupancy if they fit. Raises OccupancyError otherwise."""
+    return _move(camp_id, people, "check_in", user_id, note)
+
+
+def check_out(camp_id, people=1, user_id=None, note=None):
+    """Remove `people` from a camp's occupancy. Raises OccupancyError if fewer are there."""
+    return _move(camp_id, -people, "check_out", user_id, note)
+
+
+def set_occupancy(camp_id, occupancy, user_id=None, note=None):
+    """Correct a camp's occupancy to an absolute head count, logged as an `adjust` event."""
+    _check_note(note)
+    before, capacity = _state(camp_id, lock=True)
+    if occupancy < 0:
+        raise OccupancyError("Occupancy cannot be negative", status=400, occupancy=before, capacity=capacity)
+    if occupancy > capacity:
+        raise OccupancyError("Occupancy cannot exceed capacity", status=400, occupancy=before, capacity=capacity)
+    if occupancy == before:
+        return None
+    db.session.execute(update(_camps).where(_camps.c.id == camp_id).values(current_occupancy=occupancy))
+    _record(camp_id, "adjust", occupancy - before, occupancy, user_id, note)
+    return occupancy
+
+
+def set_capacity(camp_id, capacity, occupancy=None, user_id=None, note=None):
+    """Change a camp's capacity, and optionally its occupancy, without the one exceeding the other."""
+    before, _ = _state(camp_id, lock=True)
+    target = before if occupancy is None else occupancy
+    if capacity < 0:
+        raise OccupancyError("Capacity cannot be negative", status=400)
+    if target > capacity:
+        raise OccupancyError("Capacity cannot be below the current occupancy", status=400,
+                             occupancy=before, capacity=capacity)
+    db.session.execute(update(_camps).where(_camps.c.id == camp_id).values(capacity=capacity))
+    if occupancy is not None:
+        set_occupancy(camp_id, occupancy, user_id, note)
+    return capacity
+
+
+def recent_events(camp_id, limit=50, before_id=None):
+    """Newest events of a camp first; pass the last id seen as `before_id` for the next page."""
+    query = CampOccupancyEvent.query.filter(CampOccupancyEvent.camp_id == camp_id)
+    if before_id is not None:
+        query = query.filter(CampOccupancyEvent.id < before_id)
+    return query.order_by(CampOccupancyEvent.id.desc()).limit(limit).all()
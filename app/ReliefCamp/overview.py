@@ -0,0 +1,93 @@
+# app/ReliefCamp/overview.py
+"""
+Capacity overview of the relief camps, by organization and by disaster.
+
+All the totals come from one grouped query over (organization, disaster)
+pairs: camps, capacity, occupancy, near-full and full camps per pair. Each
+organization, each disaster and the grand total is a sum of those rows, so
+they are folded in Python rather than asked of the database three times.
+The number of rows is the number of distinct pairs, not the number of
+camps.
+
+The near-full camps themselves are a second, bounded query that reads the
+fullest camps first.
+"""
+from sqlalchemy import case, func
+from app.models import db, ReliefCamp, Organization, Disaster
+
+NEAR_FULL = 0.9        # occupancy / capacity at which a camp counts as near full
+NEAR_FULL_LIMIT = 50
+
+_COUNTERS = ("camps", "capacity", "occupancy", "near_full_camps", "full_camps")
+
+
+def _occupancy():
+    return func.coalesce(ReliefCamp.current_occupancy, 0)
+
+
+def _near_full(threshold):
+    return (ReliefCamp.capacity > 0) & (_occupancy() >= ReliefCamp.capacity * threshold)
+
+
+def _summary(counts):
+    capacity, occupancy = counts["capacity"], counts["occupancy"]
+    return dict(counts,
+                free_capacity=max(capacity - occupancy, 0),
+                occupancy_ratio=round(occupancy / capacity, 4) if capacity else None)
+
+
+def _add(totals, row):
+    for name in _COUNTERS:
+        totals[name] = totals.get(name, 0) + int(getattr(row, name) or 0)
+
+
+def capacity_overview(threshold=NEAR_FULL, limit=NEAR_FULL_LIMIT):
+    """Totals, occupancy ratios and near-full camps, overall and per organization and disaster."""
+    occupancy = _occupancy()
+    rows = (db.session.query(
+                ReliefCamp.organization_id, Organization.name.label("organization_name"),
+                ReliefCamp.disaster_id, Disaster.name.label("disaster_name"),
+                func.count(ReliefCamp.id).label("camps"),
+                func.sum(ReliefCamp.capacity).label("capacity"),
+                func.sum(occupancy).label("occupancy"),
+                func.sum(case((_near_full(threshold), 1), else_=0)).label("near_full_camps"),
+                func.sum(case((occupancy >= ReliefCamp.capacity, 1), else_=0)).label("full_camps"))
+            .join(Organization, Organization.org_id == ReliefCamp.organization_id)
+            .outerjoin(Disaster, Disaster.id == ReliefCamp.disaster_id)
+            .group_by(ReliefCamp.organization_id, Organization.name, ReliefCamp.disaster_id, Disaster.name)
+            .all())
+
+    totals, by_org, by_disaster = {}, {}, {}
+    for row in rows:
+        _add(totals, row)
+        _add(by_org.setdefault((row.organization_id, row.organization_name), {}), row)
+        _add(by_disaster.setdefault((row.disaster_id, row.disaster_name), {}), row)
+
+    near_full = (db.session.query(ReliefCamp.id, ReliefCamp.name, ReliefCamp.organization_id,
+                                  ReliefCamp.disaster_id, ReliefCamp.capacity, occupancy.label("occupancy"))
+                 .filter(_near_full(threshold))
+                 .order_by((occupancy * 1.0 / ReliefCamp.capacity).desc(), ReliefCamp.id)
+                 .limit(limit)
+                 .all())
+
+    return {
+        "near_full_threshold": threshold,
+        "totals": _summary({name: totals.get(name, 0) for name in _COUNTERS}),
+        "by_organization": sorted(
+            (dict(_summary(counts), org_id=org_id, name=name) for (org_id, name), counts in by_org.items()),
+            key=lambda g: (-g["occupancy_ratio"] if g["occupancy_ratio"] is not None else 0, g["name"])),
+        "by_disaster": sorted(
+            (dict(_summary(counts), id=disaster_id, name=name or "Unassigned")
+             for (disaster_id, name), counts in by_disaster.items()),
+            key=lambda g: (-g["occupancy_ratio"] if g["occupancy_ratio"] is not None else 0, g["name"])),
+        "near_full": [{
+            "id": camp_id,
+            "name": name,
+            "organization_id": organization_id,
+            "disaster_id": disaster_id,
+            "capacity": capacity,
+            "current_occupancy": occupied,
+            "free_capacity": max(capacity - occupied, 0),
+            "occupancy_ratio": round(occupied / capacity, 4),
+        } for camp_id, name, organization_id, disaster_id, capacity, occupied in near_full],
+    }
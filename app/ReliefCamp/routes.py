@@ -1,7 +1,13 @@
 # app/relief_camp/routes.py
 from flask import Blueprint, request, jsonify, session ,render_template
 from functools import wraps
-from app.models import db, ReliefCamp, AuditLog
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from app.models import db, ReliefCamp, AuditLog, UserLocation
+from app.UserLocation.spatial import nearest, within_radius
+from .occupancy import (MAX_PEOPLE, OccupancyError, check_in, check_out, recent_events,
+                        set_capacity, set_occupancy)
+from .overview import NEAR_FULL, capacity_overview
 
 from . import reliefCampBp
 
@@ -25,6 +31,10 @@ def require_roles(allowed_roles=None):
     return decorator
 
 
+# users are stored with the "campManager" role; the older lists below say "campmanager"
+CAMP_STAFF_ROLES = ["super_admin", "admin", "campmanager", "campManager"]
+
+
 # ----------------------------
 # Audit Log Helper
 # ----------------------------
@@ -42,6 +52,8 @@ def serialize_camp(camp, include_relations=False):
         "id": camp.id,
         "name": camp.name,
         "location": camp.location,
+        "latitude": camp.latitude,
+        "longitude": camp.longitude,
         "capacity": camp.capacity,
         "current_occupancy": camp.current_occupancy,
         "created_at": camp.created_at.isoformat(),
@@ -67,16 +79,25 @@ def create_camp():
     data = request.get_json()
     user_id = session["user"]["id"]
 
+    try:
+        opening = int(data.get("current_occupancy") or 0)
+    except (TypeError, ValueError):
+        return jsonify({"error": "current_occupancy must be an integer"}), 400
+
     try:
         camp = ReliefCamp(
             name=data.get("name"),
             location=data.get("location"),
             capacity=data.get("capacity"),
-            current_occupancy=data.get("current_occupancy", 0),
+            current_occupancy=0,
             organization_id=data.get("organization_id"),
             disaster_id=data.get("disaster_id")
         )
         db.session.add(camp)
+        db.session.flush()
+        # the starting head count is the first entry of the occupancy log
+        if opening:
+            set_occupancy(camp.id, opening, user_id, note="Opening occupancy")
         db.session.commit()
 
         log_action(user_id, "CREATE_RELIEF_CAMP", f"Created camp '{camp.name}' (ID: {camp.id})")
@@ -91,16 +112,74 @@ def create_camp():
 # ----------------------------
 @reliefCampBp.route("/api", methods=["GET"])
 def get_camps():
-    camps = ReliefCamp.query.all()
+    camps = ReliefCamp.query.options(joinedload(ReliefCamp.organization), joinedload(ReliefCamp.disaster)).all()
     return jsonify([serialize_camp(c, include_relations=True) for c in camps]), 200
 
 
+# ----------------------------
+# Capacity Overview
+# ----------------------------
+@reliefCampBp.route("/overview", methods=["GET"])
+@require_roles(CAMP_STAFF_ROLES)
+def camps_overview():
+    """Capacity, occupancy ratio and near-full camps, in total and per organization and disaster.
+
+    Optional: near_full (ratio, default 0.9) sets when a camp counts as near full.
+    """
+    threshold = request.args.get("near_full", NEAR_FULL, type=float)
+    if not 0 < threshold <= 1:
+        return jsonify({"error": "near_full must be a ratio between 0 and 1"}), 400
+    return jsonify(capacity_overview(threshold)), 200
+
+
+# ----------------------------
+# Nearest Camps With Space
+# ----------------------------
+@reliefCampBp.route("/nearest", methods=["GET"])
+def nearest_camps():
+    """Camps with free places nearest to ?lat=&lon= or the caller's saved location.
+
+    Optional: disaster_id, k (default 5), radius_km (only camps within it).
+    """
+    if "user" not in session:
+        return jsonify({"error": "Unauthorized - Login required"}), 401
+
+    lat, lon = request.args.get("lat", type=float), request.args.get("lon", type=float)
+    if lat is None or lon is None:
+        own = UserLocation.query.filter_by(user_id=int(session["user"]["id"])).first()
+        if not own or own.latitude is None or own.longitude is None:
+            return jsonify({"error": "No saved location; share your location or pass lat and lon"}), 400
+        lat, lon = own.latitude, own.longitude
+
+    free = ReliefCamp.capacity - func.coalesce(ReliefCamp.current_occupancy, 0)
+    query = ReliefCamp.query.filter(free > 0)
+    disaster_id = request.args.get("disaster_id", type=int)
+    if disaster_id is not None:
+        query = query.filter(ReliefCamp.disaster_id == disaster_id)
+    k = min(max(request.args.get("k", 5, type=int), 1), 50)
+    radius = request.args.get("radius_km", type=float)
+
+    if radius:
+        found = within_radius(query, ReliefCamp, lat, lon, radius, k)
+    else:
+        found = nearest(query, ReliefCamp, lat, lon, k)
+
+    camps = []
+    for camp, distance in found:
+        data = serialize_camp(camp)
+        data["free_capacity"] = camp.capacity - (camp.current_occupancy or 0)
+        data["distance_km"] = round(distance, 3)
+        camps.append(data)
+    return jsonify({"origin": {"latitude": lat, "longitude": lon}, "camps": camps}), 200
+
+
 # ----------------------------
 # Get Camp by ID
 # ----------------------------
 @reliefCampBp.route("/<int:camp_id>", methods=["GET"])
 def get_camp(camp_id):
-    camp = ReliefCamp.query.get_or_404(camp_id)
+    camp = (ReliefCamp.query.options(joinedload(ReliefCamp.organization), joinedload(ReliefCamp.disaster))
+            .get_or_404(camp_id))
     return jsonify(serialize_camp(camp, include_relations=True)), 200
 
 
@@ -116,10 +195,28 @@ def update_camp(camp_id):
 
     camp.name = data.get("name", camp.name)
     camp.location = data.get("location", camp.location)
-    camp.capacity = data.get("capacity", camp.capacity)
-    camp.current_occupancy = data.get("current_occupancy", camp.current_occupancy)
     camp.organization_id = data.get("organization_id", camp.organization_id)
     camp.disaster_id = data.get("disaster_id", camp.disaster_id)
+    db.session.flush()
+
+    # capacity and occupancy are never written back from the (possibly stale)
+    # loaded row; they go through the locked, checked path in occupancy.py
+    capacity, occupancy = data.get("capacity"), data.get("current_occupancy")
+    if capacity is not None or occupancy is not None:
+        try:
+            occupancy = None if occupancy is None else int(occupancy)
+            if capacity is None:
+                set_occupancy(camp.id, occupancy, session["user"]["id"], note="Corrected in camp update")
+            else:
+                set_capacity(camp.id, int(capacity), occupancy, session["user"]["id"],
+                             note="Corrected in camp update")
+        except (TypeError, ValueError):
+            db.session.rollback()
+            return jsonify({"error": "capacity and current_occupancy must be integers"}), 400
+        except OccupancyError as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), e.status
+        db.session.expire(camp, ["capacity", "current_occupancy"])
 
     db.session.commit()
 
@@ -129,6 +226,69 @@ def update_camp(camp_id):
     return jsonify({"message": "✅ Relief camp updated successfully!"}), 200
 
 
+# ----------------------------
+# Check-in / Check-out
+# ----------------------------
+def _change_occupancy(camp_id, change):
+    data = request.get_json(silent=True) or {}
+    try:
+        people = int(data.get("people", 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "people must be an integer"}), 400
+    if not 1 <= people <= MAX_PEOPLE:
+        return jsonify({"error": f"people must be between 1 and {MAX_PEOPLE}"}), 400
+
+    try:
+        result = change(camp_id, people, session["user"]["id"], data.get("note"))
+    except OccupancyError as e:
+        db.session.rollback()
+        body = {"error": str(e)}
+        if e.capacity is not None:
+            body.update(current_occupancy=e.occupancy, capacity=e.capacity,
+                        free_capacity=e.capacity - e.occupancy)
+        return jsonify(body), e.status
+    db.session.commit()
+    return jsonify(result), 200
+
+
+@reliefCampBp.route("/<int:camp_id>/check-in", methods=["POST"])
+@require_roles(CAMP_STAFF_ROLES)
+def camp_check_in(camp_id):
+    """Check `people` (default 1) into a camp; 409 if they do not fit."""
+    return _change_occupancy(camp_id, check_in)
+
+
+@reliefCampBp.route("/<int:camp_id>/check-out", methods=["POST"])
+@require_roles(CAMP_STAFF_ROLES)
+def camp_check_out(camp_id):
+    """Check `people` (default 1) out of a camp; 409 if fewer are checked in."""
+    return _change_occupancy(camp_id, check_out)
+
+
+@reliefCampBp.route("/<int:camp_id>/occupancy", methods=["GET"])
+@require_roles(CAMP_STAFF_ROLES)
+def camp_occupancy_events(camp_id):
+    """Occupancy events of a camp, newest first. Page with ?before_id=<last id>&limit=."""
+    camp = ReliefCamp.query.get_or_404(camp_id)
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 500)
+    events = recent_events(camp_id, limit, request.args.get("before_id", type=int))
+    return jsonify({
+        "camp_id": camp.id,
+        "current_occupancy": camp.current_occupancy or 0,
+        "capacity": camp.capacity,
+        "events": [{
+            "id": e.id,
+            "kind": e.kind,
+            "people": e.people,
+            "occupancy_after": e.occupancy_after,
+            "user_id": e.user_id,
+            "note": e.note,
+            "created_at": e.created_at.isoformat(),
+        } for e in events],
+        "next_before_id": events[-1].id if len(events) == limit else None,
+    }), 200
+
+
 # ----------------------------
 # Delete Camp
 # ----------------------------
@@ -1,5 +1,5 @@
 from flask import Blueprint
 
-reliefRequestBp = Blueprint('reliefRequestBp',__name__)
+reliefRequestBp = Blueprint('reliefRequestBp',__name__, cli_group='reliefRequest')
 
 from .import routes
\ No newline at end of file
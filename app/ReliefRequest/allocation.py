@@ -0,0 +1,127 @@
+# app/ReliefRequest/allocation.py
+"""
+Batch allocation of stock to pending relief requests.
+
+plan_allocation() loads the pending requests and stock of a disaster as plain
+column tuples, then walks the requests oldest first and approves every request
+that can be covered in full from the matching stock pool. Stock never crosses
+disasters, so disaster severity cannot change the outcome of a run and is not
+part of the ordering. apply_allocation() writes the result in one
+transaction: a chunked set-based status UPDATE, one conditional reservation
+UPDATE per stock row, and the per-request holds (see
+app/Resource/reservations.py). Stock is drawn when a request is fulfilled.
+"""
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import update
+from app.models import db, ReliefRequest, Resource, StockReservation
+from app.Resource.stock import InsufficientStock, usable
+from app.Resource.reservations import DEFAULT_TTL, available, adjust_reserved
+from app.Resource.units import normalize_name
+
+UPDATE_CHUNK = 1000
+
+
+class AllocationConflict(Exception):
+    """Requests changed status while the plan was being applied."""
+
+
+def plan_allocation(disaster_id, request_ids=None):
+    """Plan for the disaster's pending requests, or only those in `request_ids`."""
+    query = (db.session.query(ReliefRequest.id, ReliefRequest.resource_needed,
+                              ReliefRequest.quantity, ReliefRequest.created_at)
+             .filter(ReliefRequest.disaster_id == disaster_id, ReliefRequest.status == "Pending"))
+    if request_ids is None:
+        requests = query.order_by(ReliefRequest.created_at, ReliefRequest.id).all()
+    else:
+        ids = sorted(set(request_ids))
+        requests = sorted((row for i in range(0, len(ids), UPDATE_CHUNK)
+                           for row in query.filter(ReliefRequest.id.in_(ids[i:i + UPDATE_CHUNK]))),
+                          key=lambda r: (r.created_at, r.id))
+
+    # Stock pools: resource key -> [[resource_id, available], ...], first-expiring
+    # lots first, then the biggest rows
+    pools = defaultdict(list)
+    stock = (db.session.query(Resource.id, Resource.resource_type, available())
+             .filter(Resource.disaster_id == disaster_id, available() > 0, usable())
+             .order_by(Resource.expires_at.is_(None), Resource.expires_at, available().desc())
+             .all())
+    for resource_id, resource_type, quantity in stock:
+        pools[normalize_name(resource_type)].append([resource_id, quantity])
+    free = {key: sum(q for _, q in rows) for key, rows in pools.items()}
+
+    approved = []
+    draws = defaultdict(int)          # resource_id -> quantity to take
+    holds = []                        # (request_id, resource_id, quantity)
+    allocated = defaultdict(int)      # resource key -> quantity allocated
+    unmet = defaultdict(lambda: {"requests": 0, "quantity": 0})
+
+    for request_id, resource_needed, quantity, _ in requests:
+        key = normalize_name(resource_needed)
+        if quantity <= free.get(key, 0):
+            free[key] -= quantity
+            allocated[key] += quantity
+            approved.append(request_id)
+            remaining = quantity
+            for row in pools[key]:
+                take = min(row[1], remaining)
+                if take:
+                    row[1] -= take
+                    draws[row[0]] += take
+                    holds.append((request_id, row[0], take))
+                    remaining -= take
+                if not remaining:
+                    break
+        else:
+            unmet[key]["requests"] += 1
+            unmet[key]["quantity"] += quantity
+
+    return {
+        "disaster_id": disaster_id,
+        "pending": len(requests),
+        "approved_ids": approved,
+        "draws": dict(draws),
+        "holds": holds,
+        "allocated": [{"resource": k, "quantity": v} for k, v in sorted(allocated.items())],
+        "unmet": [{"resource": k, **v} for k, v in sorted(unmet.items())],
+    }
+
+
+def book_allocation(plan, user_id=None, ttl=DEFAULT_TTL):
+    """Write a plan into the current transaction; the caller commits."""
+    ids = plan["approved_ids"]
+    for i in range(0, len(ids), UPDATE_CHUNK):
+        chunk = ids[i:i + UPDATE_CHUNK]
+        result = db.session.execute(
+            update(ReliefRequest)
+            .where(ReliefRequest.id.in_(chunk), ReliefRequest.status == "Pending")
+            .values(status="Approved", dedupe_key=None, status_changed_at=datetime.utcnow()),
+            execution_options={"synchronize_session": False},
+        )
+        if result.rowcount != len(chunk):
+            raise AllocationConflict("Some requests are no longer pending; re-run the allocation")
+
+    for resource_id, quantity in plan["draws"].items():
+        if not adjust_reserved(resource_id, quantity, guard=True):
+            raise InsufficientStock(f"Resource {resource_id} has less than {quantity} available")
+
+    now = datetime.utcnow()
+    db.session.bulk_insert_mappings(StockReservation, [{
+        "resource_id": resource_id,
+        "relief_request_id": request_id,
+        "quantity": quantity,
+        "status": "active",
+        "expires_at": now + ttl,
+        "created_by": user_id,
+        "created_at": now,
+    } for request_id, resource_id, quantity in plan["holds"]])
+
+
+def apply_allocation(plan, user_id=None, ttl=DEFAULT_TTL):
+    """Approve the planned requests and reserve their stock in one transaction."""
+    try:
+        book_allocation(plan, user_id, ttl)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
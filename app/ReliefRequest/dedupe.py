@@ -0,0 +1,167 @@
+# app/ReliefRequest/dedupe.py
+"""
+Duplicate detection for relief requests.
+
+A resubmission is a Pending request from the same user, for the same disaster
+and the same resource name (trimmed, case-insensitive), created within
+DUPLICATE_WINDOW of an earlier one. Every Pending request stores
+
+    dedupe_key = sha256(user : disaster : resource : window bucket)
+
+in a unique column. Looking for a duplicate is therefore two indexed point
+lookups (this bucket and the previous one), with no scan. The unique index
+also catches two submissions racing each other. The key is cleared once a
+request leaves Pending, so only open requests absorb resubmissions.
+"""
+import hashlib
+from datetime import datetime, timedelta
+from sqlalchemy import event, inspect, func, update, tuple_
+from app.models import db, ReliefRequest, TaskAssignment
+from app.Resource.units import normalize_name
+from .priority import request_part
+
+DUPLICATE_WINDOW = timedelta(hours=6)
+MERGE_CHUNK = 1000
+
+
+def _bucket(moment):
+    return int((moment - datetime(1970, 1, 1)).total_seconds() // DUPLICATE_WINDOW.total_seconds())
+
+
+def dedupe_key(user_id, disaster_id, resource_needed, created_at, bucket=None):
+    bucket = _bucket(created_at) if bucket is None else bucket
+    raw = f"{user_id}:{disaster_id}:{normalize_name(resource_needed)}:{bucket}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def find_duplicate(user_id, disaster_id, resource_needed, now=None):
+    """The open request a new submission would duplicate, or None."""
+    now = now or datetime.utcnow()
+    bucket = _bucket(now)
+    keys = [dedupe_key(user_id, disaster_id, resource_needed, now, b) for b in (bucket, bucket - 1)]
+    return (ReliefRequest.query
+            .filter(ReliefRequest.dedupe_key.in_(keys),
+                    ReliefRequest.created_at >= now - DUPLICATE_WINDOW)
+            .order_by(ReliefRequest.created_at)
+            .first())
+
+
+def merge_into(existing, quantity):
+    """Fold a resubmission into the open request: keep the larger quantity (an int, validated by the caller)."""
+    if quantity > existing.quantity:
+        existing.quantity = quantity
+    return existing
+
+
+# ----------------------------
+# Keeping keys current
+# ----------------------------
+def _refresh_key(target):
+    if target.status == "Pending":
+        target.created_at = target.created_at or datetime.utcnow()
+        target.dedupe_key = dedupe_key(target.user_id, target.disaster_id, target.resource_needed,
+                                       target.created_at)
+    else:
+        target.dedupe_key = None
+
+
+@event.listens_for(ReliefRequest, "before_insert")
+def _key_on_insert(mapper, connection, target):
+    _refresh_key(target)
+
+
+@event.listens_for(ReliefRequest, "before_update")
+def _key_on_update(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes()
+           for name in ("status", "user_id", "disaster_id", "resource_needed")):
+        _refresh_key(target)
+
+
+# ----------------------------
+# Backfill
+# ----------------------------
+def _pending_in_order(page_size):
+    """Pending requests in (user, disaster, resource, created_at, id) order, read page by page.
+
+    Each page starts after the previous page's last key, so the table is never
+    held in memory and no cursor stays open across the merge commits.
+    """
+    name_key = func.lower(func.trim(ReliefRequest.resource_needed))
+    order = (ReliefRequest.user_id, ReliefRequest.disaster_id, name_key, ReliefRequest.created_at,
+             ReliefRequest.id)
+    query = (db.session.query(ReliefRequest.id, ReliefRequest.user_id, ReliefRequest.disaster_id,
+                              ReliefRequest.resource_needed, ReliefRequest.quantity, ReliefRequest.created_at,
+                              ReliefRequest.priority_key, name_key)
+             .filter(ReliefRequest.status == "Pending")
+             .order_by(*order))
+    last = None
+    while True:
+        page = (query.filter(tuple_(*order) > tuple_(*last)) if last else query).limit(page_size).all()
+        yield from page
+        if len(page) < page_size:
+            return
+        request_id, user_id, disaster_id, _, _, created_at, _, name = page[-1]
+        last = (user_id, disaster_id, name, created_at, request_id)
+
+
+def merge_existing_duplicates(batch_size=MERGE_CHUNK):
+    """Merge duplicate Pending requests already in the table and set their keys.
+
+    Pending requests are read as plain tuples in (user, disaster, resource,
+    created_at) order, one keyset page of `batch_size` rows at a time. Each run
+    of requests within DUPLICATE_WINDOW of the first one is merged into that
+    first one: it keeps the largest quantity, the others' tasks are moved onto
+    it, and the others are deleted. Writes go out in batches. Returns
+    (requests kept, duplicates merged).
+    """
+    rows = _pending_in_order(batch_size)
+
+    kept = merged = 0
+    anchor = None
+    anchors, duplicates = {}, {}   # anchor id -> mapping; anchor id -> [duplicate ids]
+
+    def flush():
+        # Clear keys first so re-keyed anchors cannot collide with stale ones
+        ids = list(anchors)
+        db.session.execute(update(ReliefRequest).where(ReliefRequest.id.in_(ids)).values(dedupe_key=None),
+                           execution_options={"synchronize_session": False})
+        for anchor_id, dup_ids in duplicates.items():
+            db.session.execute(update(TaskAssignment).where(TaskAssignment.relief_request_id.in_(dup_ids))
+                               .values(relief_request_id=anchor_id),
+                               execution_options={"synchronize_session": False})
+        dup_ids = [i for ids in duplicates.values() for i in ids]
+        if dup_ids:
+            db.session.query(ReliefRequest).filter(ReliefRequest.id.in_(dup_ids)) \
+                .delete(synchronize_session=False)
+        db.session.bulk_update_mappings(ReliefRequest, list(anchors.values()))
+        db.session.commit()
+        anchors.clear()
+        duplicates.clear()
+
+    for request_id, user_id, disaster_id, resource_needed, quantity, created_at, key, _ in rows:
+        group = (user_id, disaster_id, normalize_name(resource_needed))
+        if anchor and anchor["group"] == group and created_at - anchor["created_at"] <= DUPLICATE_WINDOW:
+            mapping = anchors[anchor["id"]]
+            if quantity > mapping["quantity"]:
+                if mapping.get("priority_key") is not None:
+                    mapping["priority_key"] += request_part(quantity) - request_part(mapping["quantity"])
+                mapping["quantity"] = quantity
+            duplicates.setdefault(anchor["id"], []).append(request_id)
+            merged += 1
+            continue
+
+        if len(anchors) >= batch_size:
+            flush()
+        anchor = {"id": request_id, "group": group, "created_at": created_at}
+        anchors[request_id] = {
+            "id": request_id,
+            "quantity": quantity,
+            "priority_key": key,
+            "dedupe_key": dedupe_key(user_id, disaster_id, resource_needed, created_at),
+        }
+        kept += 1
+
+    if anchors:
+        flush()
+    return kept, merged
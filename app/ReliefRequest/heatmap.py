@@ -0,0 +1,186 @@
+# app/ReliefRequest/heatmap.py
+"""
+Where pending demand is, binned by geohash cell and resource.
+
+Relief requests store the requester's coordinates (from their UserLocation)
+when they are created, plus a geohash kept by app/UserLocation/spatial.py.
+
+The heatmap is served from an in-memory snapshot of the pending requests,
+as (geohash, resource, quantity) per request. Next to it are running bins
+(requests, quantity) per (cell, resource) for every precision up to
+MAX_PRECISION. A read returns the bins at one precision, with no query and
+no pass over the requests.
+
+Commits that touch a request mark it dirty. The next read re-reads only
+the dirty requests and moves their contributions between bins. Bulk
+statements, and every `max_age` seconds (to pick up other workers' writes),
+trigger a full rebuild, which is one query over the pending requests.
+"""
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import Session
+from app.models import db, ReliefRequest, UserLocation
+from app.Resource.units import normalize_name
+from app.UserLocation.spatial import decode, encode, index_model
+
+MAX_PRECISION = 6
+LOCATE_CHUNK = 1000
+
+
+# ----------------------------
+# Capturing coordinates
+# ----------------------------
+@event.listens_for(ReliefRequest, "before_insert")
+def _locate_on_insert(mapper, connection, target):
+    if target.latitude is not None or target.user_id is None:
+        return
+    row = connection.execute(
+        select(UserLocation.latitude, UserLocation.longitude).where(UserLocation.user_id == target.user_id)
+    ).first()
+    if row is not None:
+        target.latitude, target.longitude = row
+
+
+# registered after the listener above so the new coordinates get hashed
+index_model(ReliefRequest)
+
+
+def locate_existing_requests(chunk_size=LOCATE_CHUNK):
+    """Give requests without coordinates their requester's saved location. Returns rows updated."""
+    rows = (db.session.query(ReliefRequest.id, UserLocation.latitude, UserLocation.longitude)
+            .join(UserLocation, UserLocation.user_id == ReliefRequest.user_id)
+            .filter(ReliefRequest.latitude.is_(None),
+                    UserLocation.latitude.isnot(None), UserLocation.longitude.isnot(None))
+            .order_by(ReliefRequest.id)
+            .all())
+    for i in range(0, len(rows), chunk_size):
+        db.session.execute(update(ReliefRequest), [
+            {"id": request_id, "latitude": lat, "longitude": lon, "geohash": encode(lat, lon)}
+            for request_id, lat, lon in rows[i:i + chunk_size]
+        ])
+    db.session.commit()
+    return len(rows)
+
+
+# ----------------------------
+# Snapshot and bins
+# ----------------------------
+def _pending_rows(ids=None):
+    query = (db.session.query(ReliefRequest.id, ReliefRequest.geohash, ReliefRequest.resource_needed,
+                              ReliefRequest.quantity)
+             .filter(ReliefRequest.status == "Pending", ReliefRequest.geohash.isnot(None)))
+    if ids is not None:
+        query = query.filter(ReliefRequest.id.in_(ids))
+    return {request_id: (geohash, normalize_name(resource), quantity or 0)
+            for request_id, geohash, resource, quantity in query}
+
+
+class DemandHeatmap:
+    def __init__(self, max_age=120):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._rows = {}        # request id -> (geohash, resource, quantity)
+        self._bins = {}        # precision -> {(cell, resource): [requests, quantity]}
+        self._dirty = set()
+        self._stale = True
+        self._built_at = 0.0
+
+    def mark_dirty(self, request_ids):
+        with self._lock:
+            self._dirty.update(request_ids)
+
+    def mark_stale(self):
+        with self._lock:
+            self._stale = True
+
+    def _add(self, row, sign):
+        geohash, resource, quantity = row
+        for precision in range(1, MAX_PRECISION + 1):
+            key = (geohash[:precision], resource)
+            bin_ = self._bins[precision].setdefault(key, [0, 0])
+            bin_[0] += sign
+            bin_[1] += sign * quantity
+            if not bin_[0]:
+                del self._bins[precision][key]
+
+    def _refresh(self):
+        if self._stale or time.monotonic() - self._built_at > self.max_age:
+            self._stale = False
+            self._dirty.clear()
+            self._rows = _pending_rows()
+            self._bins = {precision: {} for precision in range(1, MAX_PRECISION + 1)}
+            for row in self._rows.values():
+                self._add(row, 1)
+            self._built_at = time.monotonic()
+        elif self._dirty:
+            dirty, self._dirty = self._dirty, set()
+            fresh = _pending_rows(sorted(dirty))
+            for request_id in dirty:
+                old = self._rows.pop(request_id, None)
+                if old is not None:
+                    self._add(old, -1)
+                if request_id in fresh:
+                    self._rows[request_id] = fresh[request_id]
+                    self._add(fresh[request_id], 1)
+
+    def cells(self, precision, resource=None, box=None):
+        """Bins at `precision`, optionally for one resource and inside (south, west, north, east)."""
+        resource = normalize_name(resource) if resource else None
+        with self._lock:
+            self._refresh()
+            bins = list(self._bins[precision].items())
+        cells = []
+        for (cell, cell_resource), (requests, quantity) in bins:
+            if resource and cell_resource != resource:
+                continue
+            lat, lon = decode(cell)
+            if box and not (box[0] <= lat <= box[2] and box[1] <= lon <= box[3]):
+                continue
+            cells.append({"geohash": cell, "resource": cell_resource, "requests": requests,
+                          "quantity": quantity, "latitude": round(lat, 6), "longitude": round(lon, 6)})
+        cells.sort(key=lambda c: -c["quantity"])
+        return cells
+
+
+demand_heatmap = DemandHeatmap()
+
+
+# ----------------------------
+# SQLAlchemy change tracking
+# ----------------------------
+_INFO_KEY = "demand_heatmap_requests"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, ReliefRequest) and (obj not in session.dirty or any(
+                inspect(obj).attrs[name].history.has_changes()
+                for name in ("status", "geohash", "resource_needed", "quantity"))):
+            session.info.setdefault(_INFO_KEY, set()).add(obj.id)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is ReliefRequest:
+        orm_execute_state.session.info[_INFO_KEY + "_all"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _apply(session):
+    changed = session.info.pop(_INFO_KEY, None)
+    if session.info.pop(_INFO_KEY + "_all", False):
+        demand_heatmap.mark_stale()
+    elif changed:
+        demand_heatmap.mark_dirty(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop(_INFO_KEY, None)
+    session.info.pop(_INFO_KEY + "_all", None)
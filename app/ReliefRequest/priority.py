@@ -0,0 +1,139 @@
+# app/ReliefRequest/priority.py
+"""
+Urgency ranking for relief requests.
+
+    score = disaster part (severity, affected population)
+          + request part (quantity)
+          + AGING_PER_HOUR * hours waited
+
+Waiting time grows at the same rate for every request, so it cannot change
+their relative order. Each request stores
+
+    priority_key = disaster part + request part - AGING_PER_HOUR * hours(created_at)
+
+which never changes with the clock. The live score is
+`priority_key + AGING_PER_HOUR * hours(now)`. "Most urgent pending" is then
+an index range scan on (status, priority_key) instead of a sort.
+
+The key is kept current by mapper events: requests refresh it when their
+quantity or disaster changes. A disaster whose severity or affected population
+changes shifts the keys of its requests with one UPDATE, because the disaster
+part is a plain additive term.
+"""
+import math
+from datetime import datetime
+from sqlalchemy import event, inspect, select, update
+from app.models import db, Disaster, ReliefRequest
+
+SEVERITY_WEIGHTS = {
+    "low": 1, "minor": 1,
+    "medium": 2, "moderate": 2,
+    "high": 3, "major": 3,
+    "severe": 4, "critical": 4, "extreme": 4,
+}
+SEVERITY_POINTS = 10      # per severity level
+POPULATION_POINTS = 5     # per decade of affected population
+QUANTITY_POINTS = 2       # per decade of quantity requested
+AGING_PER_HOUR = 0.1       # a severity level is worth ~4 days of waiting
+AGE_EPOCH = datetime(2020, 1, 1)   # keeps keys small enough for a FLOAT column
+
+
+def _hours(moment):
+    return (moment - AGE_EPOCH).total_seconds() / 3600
+
+
+def _count(value):
+    try:
+        return max(int(value or 0), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def disaster_part(severity, affected_population):
+    level = SEVERITY_WEIGHTS.get((severity or "").strip().lower(), 1)
+    return SEVERITY_POINTS * level + POPULATION_POINTS * math.log10(1 + _count(affected_population))
+
+
+def request_part(quantity):
+    return QUANTITY_POINTS * math.log10(1 + _count(quantity))
+
+
+def priority_key(severity, affected_population, quantity, created_at):
+    return disaster_part(severity, affected_population) + request_part(quantity) \
+        - AGING_PER_HOUR * _hours(created_at)
+
+
+def score(key, now=None):
+    """Live urgency score from a stored priority_key."""
+    if key is None:
+        return None
+    return key + AGING_PER_HOUR * _hours(now or datetime.utcnow())
+
+
+def next_pending(n=10, disaster_id=None):
+    """The `n` most urgent pending requests, read in index order."""
+    query = ReliefRequest.query.filter(ReliefRequest.status == "Pending", ReliefRequest.priority_key.isnot(None))
+    if disaster_id is not None:
+        query = query.filter(ReliefRequest.disaster_id == disaster_id)
+    return query.order_by(ReliefRequest.priority_key.desc()).limit(n).all()
+
+
+# ----------------------------
+# Keeping keys current
+# ----------------------------
+def _disaster_inputs(connection, disaster_id):
+    row = connection.execute(
+        select(Disaster.severity, Disaster.affected_population).where(Disaster.id == disaster_id)
+    ).first()
+    return row if row is not None else (None, None)
+
+
+@event.listens_for(ReliefRequest, "before_insert")
+def _key_on_insert(mapper, connection, target):
+    target.created_at = target.created_at or datetime.utcnow()
+    target.priority_key = priority_key(*_disaster_inputs(connection, target.disaster_id),
+                                       target.quantity, target.created_at)
+
+
+@event.listens_for(ReliefRequest, "before_update")
+def _key_on_update(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.quantity.history.has_changes() or state.attrs.disaster_id.history.has_changes():
+        target.priority_key = priority_key(*_disaster_inputs(connection, target.disaster_id),
+                                           target.quantity, target.created_at)
+
+
+@event.listens_for(Disaster, "after_update")
+def _shift_on_disaster_update(mapper, connection, target):
+    state = inspect(target)
+    severity, population = state.attrs.severity.history, state.attrs.affected_population.history
+    if not (severity.has_changes() or population.has_changes()):
+        return
+    old = disaster_part(severity.deleted[0] if severity.deleted else target.severity,
+                        population.deleted[0] if population.deleted else target.affected_population)
+    shift = disaster_part(target.severity, target.affected_population) - old
+    if shift:
+        table = ReliefRequest.__table__
+        connection.execute(update(table).where(table.c.disaster_id == target.id)
+                           .values(priority_key=table.c.priority_key + shift))
+
+
+# ----------------------------
+# Backfill
+# ----------------------------
+def backfill_priorities(chunk_size=1000):
+    """Compute priority_key for every request, one executemany per chunk."""
+    disasters = {d_id: disaster_part(severity, population) for d_id, severity, population in
+                 db.session.query(Disaster.id, Disaster.severity, Disaster.affected_population)}
+    rows = (db.session.query(ReliefRequest.id, ReliefRequest.disaster_id, ReliefRequest.quantity,
+                             ReliefRequest.created_at)
+            .order_by(ReliefRequest.id)
+            .all())
+    for i in range(0, len(rows), chunk_size):
+        db.session.bulk_update_mappings(ReliefRequest, [{
+            "id": request_id,
+            "priority_key": disasters.get(disaster_id, disaster_part(None, None)) + request_part(quantity)
+                            - AGING_PER_HOUR * _hours(created_at),
+        } for request_id, disaster_id, quantity, created_at in rows[i:i + chunk_size]])
+    db.session.commit()
+    return len(rows)
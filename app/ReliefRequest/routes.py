@@ -1,8 +1,18 @@
-from flask import Blueprint, request, jsonify, session, render_template
-from datetime import datetime
-from app.models import db, ReliefRequest, AuditLog, User
+from flask import Blueprint, request, jsonify, session, render_template, current_app
+from datetime import datetime, timedelta
+from app.models import db, ReliefRequest, AuditLog, User, Disaster
+from app.Resource.stock import InsufficientStock
+from app.Resource.reservations import reserve, release, consume, ReservationError, DEFAULT_TTL
 
 from . import reliefRequestBp
+from .allocation import plan_allocation, apply_allocation, AllocationConflict
+from .priority import score, next_pending, backfill_priorities
+from .transitions import TRANSITIONS, bulk_transition
+from .dedupe import find_duplicate, merge_into, merge_existing_duplicates
+from .heatmap import demand_heatmap, locate_existing_requests, MAX_PRECISION
+from .routing import submit_plan, job_status, RoutingError
+from sqlalchemy.exc import IntegrityError
+import click
 
 # ---------------- Helpers ----------------
 ALLOWED_ROLES = {"admin", "super_admin", "donor", "volunteer", "campManager"}
@@ -17,6 +27,9 @@ def get_current_user():
 def is_admin(role):
     return role in {"admin", "super_admin"}
 
+def is_coordinator(role):
+    return is_admin(role) or role == "campManager"
+
 def can_modify_request(user, request_obj):
     return is_admin(user.role) or (user and request_obj.user_id == user.id)
 
@@ -25,16 +38,32 @@ def log_action(user_id, action, details):
     db.session.add(audit)
     db.session.commit()
 
-def serialize_relief_request(r):
-    return {
+def serialize_relief_request(r, viewer=None):
+    data = {
         "id": r.id,
         "user_id": r.user_id,
         "disaster_id": r.disaster_id,
         "resource_needed": r.resource_needed,
         "quantity": r.quantity,
         "status": r.status,
+        "priority": round(score(r.priority_key), 2) if r.priority_key is not None else None,
         "created_at": r.created_at.isoformat(),
     }
+    # exact positions only for coordinators and the requester; others get the binned /heatmap
+    if viewer is not None and (is_coordinator(viewer.role) or viewer.id == r.user_id):
+        data["latitude"] = r.latitude
+        data["longitude"] = r.longitude
+    return data
+
+def merge_resubmission(user, duplicate, quantity):
+    before = duplicate.quantity
+    merge_into(duplicate, quantity)
+    db.session.commit()
+    log_action(user.id, "MERGE_RELIEF_REQUEST",
+               f"Merged resubmission (quantity {quantity}) into relief request ID {duplicate.id}; "
+               f"quantity {before} -> {duplicate.quantity}")
+    return jsonify({"message": "Matches an open relief request; merged", "id": duplicate.id,
+                    "duplicate": True}), 200
 
 # ---------------- Routes ----------------
 
@@ -51,15 +80,35 @@ def create_relief_request():
     if missing:
         return jsonify({"error": f"Missing required fields: {', '.join(missing)}"}), 400
 
+    try:
+        quantity = int(data["quantity"])
+    except (TypeError, ValueError):
+        return jsonify({"error": "quantity must be a whole number"}), 400
+    if quantity <= 0:
+        return jsonify({"error": "quantity must be positive"}), 400
+
+    # Resubmission of an open request: fold it in instead of adding demand
+    duplicate = find_duplicate(user.id, data["disaster_id"], data["resource_needed"])
+    if duplicate:
+        return merge_resubmission(user, duplicate, quantity)
+
     relief_request = ReliefRequest(
         user_id=user.id,
         disaster_id=data["disaster_id"],
         resource_needed=data["resource_needed"],
-        quantity=data["quantity"],
+        quantity=quantity,
         status=data.get("status", "Pending")
     )
     db.session.add(relief_request)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent submission of the same request won the unique dedupe_key
+        db.session.rollback()
+        duplicate = find_duplicate(user.id, data["disaster_id"], data["resource_needed"])
+        if not duplicate:
+            raise
+        return merge_resubmission(user, duplicate, quantity)
 
     log_action(user.id, "CREATE_RELIEF_REQUEST",
                f"Created relief request ID {relief_request.id} for disaster {relief_request.disaster_id}")
@@ -73,8 +122,92 @@ def get_all_relief_requests():
     if not user:
         return jsonify({"error": "Unauthorized"}), 401
 
-    requests = ReliefRequest.query.all()
-    return jsonify([serialize_relief_request(r) for r in requests]), 200
+    requests = ReliefRequest.query.order_by(ReliefRequest.priority_key.desc(), ReliefRequest.id).all()
+    return jsonify([serialize_relief_request(r, user) for r in requests]), 200
+
+# PENDING DEMAND HEATMAP
+@reliefRequestBp.route("/heatmap", methods=["GET"])
+def get_demand_heatmap():
+    """Pending demand per geohash cell and resource: ?precision= (1-6, default 4), ?resource=, ?bbox=w,s,e,n"""
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    precision = request.args.get("precision", 4, type=int)
+    if not 1 <= precision <= MAX_PRECISION:
+        return jsonify({"error": f"precision must be between 1 and {MAX_PRECISION}"}), 400
+    box = None
+    if request.args.get("bbox"):
+        try:
+            west, south, east, north = (float(v) for v in request.args["bbox"].split(","))
+        except ValueError:
+            return jsonify({"error": "bbox must be west,south,east,north"}), 400
+        box = (south, west, north, east)
+
+    cells = demand_heatmap.cells(precision, request.args.get("resource"), box)
+    return jsonify({
+        "precision": precision,
+        "cells": cells,
+        "requests": sum(c["requests"] for c in cells),
+        "quantity": sum(c["quantity"] for c in cells),
+    }), 200
+
+# DELIVERY ROUTE PLANNING
+@reliefRequestBp.route("/routes/plan", methods=["POST"])
+def plan_delivery_routes():
+    """Plan routes from a camp: {"camp_id", "vehicle_capacity", "request_ids"?}. Returns a job id.
+
+    Without request_ids, the camp's disaster's approved requests are planned.
+    Poll the job on the same worker process (see routing.py).
+    """
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+    if not is_coordinator(user.role):
+        return jsonify({"error": "Forbidden"}), 403
+
+    data = request.get_json() or {}
+    try:
+        camp_id = int(data["camp_id"])
+        capacity = int(data["vehicle_capacity"])
+        request_ids = [int(i) for i in data.get("request_ids") or []]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "camp_id and vehicle_capacity are required integers"}), 400
+    if capacity <= 0:
+        return jsonify({"error": "vehicle_capacity must be positive"}), 400
+
+    try:
+        job_id = submit_plan(camp_id, capacity, request_ids or None,
+                             workers=current_app.config.get("ROUTE_PLANNER_WORKERS", 2))
+    except RoutingError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"job_id": job_id, "status_url": f"/reliefRequest/routes/plan/{job_id}"}), 202
+
+
+@reliefRequestBp.route("/routes/plan/<job_id>", methods=["GET"])
+def get_route_plan(job_id):
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+    if not is_coordinator(user.role):
+        return jsonify({"error": "Forbidden"}), 403
+
+    status = job_status(job_id)
+    if status is None:
+        return jsonify({"error": "Unknown or expired plan (plans are kept by the worker that accepted them)"}), 404
+    return jsonify(status), 200
+
+# MOST URGENT PENDING
+@reliefRequestBp.route("/api/next", methods=["GET"])
+def get_next_relief_requests():
+    """?n= (default 10, max 500) most urgent pending requests, optionally for one ?disaster_id="""
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    n = min(max(request.args.get("n", 10, type=int), 1), 500)
+    requests = next_pending(n, request.args.get("disaster_id", type=int))
+    return jsonify([serialize_relief_request(r, user) for r in requests]), 200
 
 # READ ONE
 @reliefRequestBp.route("/<int:request_id>", methods=["GET"])
@@ -84,7 +217,7 @@ def get_relief_request(request_id):
         return jsonify({"error": "Unauthorized"}), 401
 
     r = ReliefRequest.query.get_or_404(request_id)
-    return jsonify(serialize_relief_request(r)), 200
+    return jsonify(serialize_relief_request(r, user)), 200
 
 # UPDATE
 @reliefRequestBp.route("/<int:request_id>", methods=["PUT"])
@@ -107,7 +240,27 @@ def update_relief_request(request_id):
     r.resource_needed = data.get("resource_needed", r.resource_needed)
     r.quantity = data.get("quantity", r.quantity)
 
-    db.session.commit()
+    # Approved requests hold their stock; fulfilling draws it, going back to Pending frees it
+    try:
+        changed = (r.resource_needed, r.quantity) != (old_data["resource_needed"], old_data["quantity"])
+        if old_data["status"] == "Approved" and (r.status != "Approved" or changed) and r.status != "Fulfilled":
+            release(r.id)
+        if r.status == "Approved" and (old_data["status"] == "Pending" or (old_data["status"] == "Approved" and changed)):
+            ttl = timedelta(hours=float(data["hold_hours"])) if data.get("hold_hours") else DEFAULT_TTL
+            reserve(r.resource_needed, r.disaster_id, int(r.quantity), r.id, user.id, ttl)
+        if r.status == "Fulfilled" and old_data["status"] != "Fulfilled":
+            if changed or not consume(r.id, user.id):
+                # Hold lapsed or request edited: reserve afresh and draw at once
+                release(r.id)
+                reserve(r.resource_needed, r.disaster_id, int(r.quantity), r.id, user.id)
+                consume(r.id, user.id)
+        db.session.commit()
+    except (ReservationError, InsufficientStock) as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 409
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "An open request for this resource already exists"}), 409
 
     log_action(user.id, "UPDATE_RELIEF_REQUEST",
                f"Updated relief request ID {r.id}. Old: {old_data}, New: "
@@ -115,6 +268,82 @@ def update_relief_request(request_id):
 
     return jsonify({"message": "Relief request updated successfully"}), 200
 
+# BATCH ALLOCATION (admin)
+@reliefRequestBp.route("/allocate", methods=["POST"])
+def allocate_relief_requests():
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+    if not is_admin(user.role):
+        return jsonify({"error": "Forbidden: admin only"}), 403
+
+    data = request.get_json() or {}
+    disaster_id = data.get("disaster_id")
+    if not disaster_id:
+        return jsonify({"error": "Missing required field: disaster_id"}), 400
+    Disaster.query.get_or_404(disaster_id)
+
+    plan = plan_allocation(disaster_id)
+    response = {
+        "disaster_id": disaster_id,
+        "dry_run": bool(data.get("dry_run")),
+        "pending": plan["pending"],
+        "approved": len(plan["approved_ids"]),
+        "approved_ids": plan["approved_ids"],
+        "allocated": plan["allocated"],
+        "unmet": plan["unmet"],
+    }
+    if data.get("dry_run") or not plan["approved_ids"]:
+        return jsonify(response), 200
+
+    try:
+        apply_allocation(plan, user_id=user.id)
+    except (AllocationConflict, InsufficientStock) as e:
+        return jsonify({"error": str(e)}), 409
+
+    log_action(user.id, "ALLOCATE_RELIEF_REQUESTS",
+               f"Approved {len(plan['approved_ids'])} of {plan['pending']} pending requests "
+               f"for disaster {disaster_id}")
+    return jsonify(response), 200
+
+# BULK STATUS TRANSITION (admin)
+@reliefRequestBp.route("/bulk-status", methods=["POST"])
+def bulk_update_status():
+    """Body: {"status": "Approved"|"Fulfilled", "ids": [...]} and/or {"filter": {...}}"""
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+    if not is_admin(user.role):
+        return jsonify({"error": "Forbidden: admin only"}), 403
+
+    data = request.get_json() or {}
+    target = data.get("status")
+    if target not in TRANSITIONS:
+        return jsonify({"error": f"status must be one of {list(TRANSITIONS)}"}), 400
+    ids, filters = data.get("ids"), data.get("filter") or {}
+    if ids is None and not filters:
+        return jsonify({"error": "Provide ids or a filter"}), 400
+
+    try:
+        selection = {
+            "ids": [int(i) for i in ids] if ids is not None else None,
+            "disaster_id": int(filters["disaster_id"]) if filters.get("disaster_id") else None,
+            "resource_needed": filters.get("resource_needed"),
+            "created_after": datetime.fromisoformat(filters["created_after"]) if filters.get("created_after") else None,
+            "created_before": datetime.fromisoformat(filters["created_before"]) if filters.get("created_before") else None,
+        }
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid ids or filter values"}), 400
+
+    try:
+        result = bulk_transition(target, user_id=user.id, **selection)
+    except (AllocationConflict, InsufficientStock) as e:
+        return jsonify({"error": str(e)}), 409
+
+    log_action(user.id, "BULK_UPDATE_RELIEF_REQUEST_STATUS",
+               f"{result['from']} -> {result['to']}: {result['changed']} of {result['matched']} matched requests")
+    return jsonify(result), 200
+
 # DELETE
 @reliefRequestBp.route("/<int:request_id>", methods=["DELETE"])
 def delete_relief_request(request_id):
@@ -126,6 +355,7 @@ def delete_relief_request(request_id):
     if not can_modify_request(user, r):
         return jsonify({"error": "Forbidden: You can only delete your own requests"}), 403
 
+    release(r.id)
     db.session.delete(r)
     db.session.commit()
     log_action(user.id, "DELETE_RELIEF_REQUEST", f"Deleted relief request ID {r.id}")
@@ -136,3 +366,22 @@ def delete_relief_request(request_id):
 @reliefRequestBp.route("/", methods=["GET"])
 def resources_page():
     return render_template("reliefrequest.html")
+
+# ---------------- CLI ----------------
+@reliefRequestBp.cli.command("backfill-priority")
+def backfill_priority_command():
+    """Recompute the stored priority key of every relief request."""
+    click.echo(f"Updated priority of {backfill_priorities()} relief requests")
+
+
+@reliefRequestBp.cli.command("merge-duplicates")
+def merge_duplicates_command():
+    """Merge duplicate pending requests created before duplicate detection and key the rest."""
+    kept, merged = merge_existing_duplicates()
+    click.echo(f"Merged {merged} duplicate relief requests into {kept} open requests")
+
+
+@reliefRequestBp.cli.command("locate-requests")
+def locate_requests_command():
+    """Give requests without coordinates their requester's saved location."""
+    click.echo(f"Located {locate_existing_requests()} relief requests")
@@ -0,0 +1,219 @@
+# app/ReliefRequest/routing.py
+"""
+Delivery route planning from a relief camp to approved requests.
+
+plan_routes() is a pure function over plain tuples:
+
+  1. a haversine distance matrix over the depot and all stops, built row by
+     row from precomputed radians and cosines;
+  2. capacity-split nearest neighbour: from the depot, keep driving to the
+     nearest stop whose quantity still fits in the vehicle, and go back to
+     the depot when none does. A stop larger than a whole vehicle gets a
+     route of its own and is flagged;
+  3. 2-opt on every route: reverse any segment that shortens it, until no
+     reversal helps or the time budget runs out. Reversing a segment does
+     not change the route's load.
+
+Planning runs in a process pool (spawn start method, because the web
+process has background threads), so a few hundred stops never block a web
+worker. submit_plan() returns a job id; job_status() reports the result
+once it is ready.
+
+Jobs live in the memory of the web process that accepted them, for JOB_TTL.
+Under a server with several worker processes, a poll that lands on another
+worker gets 404, so route /reliefRequest/routes/plan/* with sticky sessions
+or run the planner in a single worker process.
+"""
+import math
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from app.models import db, ReliefCamp, ReliefRequest
+
+EARTH_RADIUS_KM = 6371.0
+TIME_BUDGET = 10.0     # seconds of 2-opt per plan
+JOB_TTL = 3600         # seconds a finished plan is kept
+MAX_STOPS = 2000
+
+
+class RoutingError(Exception):
+    """The depot or the stops cannot be planned."""
+
+
+# ----------------------------
+# Planning (runs in worker processes)
+# ----------------------------
+def distance_matrix(points):
+    """Haversine distances in km between all (lat, lon) points."""
+    lats = [math.radians(lat) for lat, _ in points]
+    lons = [math.radians(lon) for _, lon in points]
+    coss = [math.cos(lat) for lat in lats]
+    matrix = []
+    for i in range(len(points)):
+        lat_i, lon_i, cos_i = lats[i], lons[i], coss[i]
+        matrix.append([
+            2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(
+                math.sin((lat_j - lat_i) / 2) ** 2 + cos_i * cos_j * math.sin((lon_j - lon_i) / 2) ** 2)))
+            for lat_j, lon_j, cos_j in zip(lats, lons, coss)
+        ])
+    return matrix
+
+
+def _route_length(route, d):
+    return sum(d[a][b] for a, b in zip(route, route[1:]))
+
+
+def nearest_neighbour(d, quantities, capacity):
+    """Routes as index lists [0, stop, ..., 0]; index 0 is the depot."""
+    unvisited = set(range(1, len(d)))
+    routes = []
+    while unvisited:
+        route, load, here = [0], 0, 0
+        while True:
+            row = d[here]
+            fits = [j for j in unvisited if load + quantities[j] <= capacity]
+            if not fits:
+                break
+            here = min(fits, key=row.__getitem__)
+            unvisited.remove(here)
+            route.append(here)
+            load += quantities[here]
+        if len(route) == 1:
+            # larger than a whole vehicle: deliver it on its own
+            here = min(unvisited, key=d[0].__getitem__)
+            unvisited.remove(here)
+            route.append(here)
+        route.append(0)
+        routes.append(route)
+    return routes
+
+
+def two_opt(route, d, deadline):
+    """Improve a closed route in place by segment reversals."""
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        for i in range(1, len(route) - 2):
+            a, b = route[i - 1], route[i]
+            row_a = d[a]
+            for j in range(i + 1, len(route) - 1):
+                c, e = route[j], route[j + 1]
+                if row_a[c] + d[b][e] < row_a[b] + d[c][e] - 1e-9:
+                    route[i:j + 1] = route[i:j + 1][::-1]
+                    b = route[i]
+                    improved = True
+    return route
+
+
+def plan_routes(depot, stops, capacity, time_budget=TIME_BUDGET):
+    """Plan delivery routes.
+
+    depot: (lat, lon). stops: [(stop id, lat, lon, quantity)]. Returns a dict
+    with the routes as stop ids in delivery order, their loads and lengths.
+    """
+    started = time.monotonic()
+    d = distance_matrix([depot] + [(lat, lon) for _, lat, lon, _ in stops])
+    quantities = [0] + [quantity for *_, quantity in stops]
+    routes = nearest_neighbour(d, quantities, capacity)
+    constructed = sum(_route_length(r, d) for r in routes)
+
+    deadline = started + time_budget
+    for route in routes:
+        two_opt(route, d, deadline)
+
+    planned = []
+    for route in routes:
+        load = sum(quantities[i] for i in route)
+        planned.append({
+            "stops": [stops[i - 1][0] for i in route[1:-1]],
+            "load": load,
+            "over_capacity": load > capacity,
+            "distance_km": round(_route_length(route, d), 3),
+        })
+    total = sum(r["distance_km"] for r in planned)
+    return {
+        "routes": planned,
+        "vehicles": len(planned),
+        "distance_km": round(total, 3),
+        "nearest_neighbour_km": round(constructed, 3),
+        "seconds": round(time.monotonic() - started, 3),
+    }
+
+
+# ----------------------------
+# Jobs (web process)
+# ----------------------------
+_pool = None
+_jobs = {}
+_lock = threading.Lock()
+
+
+def _executor(workers):
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def load_stops(camp_id, request_ids=None):
+    """Depot coordinates and (request id, lat, lon, quantity) stops for a plan."""
+    camp = db.session.get(ReliefCamp, camp_id)
+    if camp is None:
+        raise RoutingError("Relief camp not found")
+    if camp.latitude is None or camp.longitude is None:
+        raise RoutingError("Relief camp has no coordinates")
+
+    query = (db.session.query(ReliefRequest.id, ReliefRequest.latitude, ReliefRequest.longitude,
+                              ReliefRequest.quantity)
+             .filter(ReliefRequest.status == "Approved", ReliefRequest.latitude.isnot(None)))
+    if request_ids:
+        query = query.filter(ReliefRequest.id.in_(request_ids))
+    elif camp.disaster_id is not None:
+        query = query.filter(ReliefRequest.disaster_id == camp.disaster_id)
+    else:
+        raise RoutingError("Relief camp has no disaster; pass request_ids to plan")
+    stops = [tuple(row) for row in query.order_by(ReliefRequest.id).limit(MAX_STOPS + 1)]
+    if not stops:
+        raise RoutingError("No approved requests with coordinates to deliver")
+    if len(stops) > MAX_STOPS:
+        raise RoutingError(f"At most {MAX_STOPS} stops per plan")
+    return (camp.latitude, camp.longitude), stops
+
+
+def submit_plan(camp_id, capacity, request_ids=None, workers=2):
+    """Queue a plan in the process pool; returns the job id."""
+    depot, stops = load_stops(camp_id, request_ids)
+    future = _executor(workers).submit(plan_routes, depot, stops, capacity)
+    job_id = uuid.uuid4().hex
+    now = time.monotonic()
+    with _lock:
+        for old_id in [j for j, job in _jobs.items() if now - job["submitted"] > JOB_TTL]:
+            del _jobs[old_id]
+        _jobs[job_id] = {"future": future, "submitted": now, "camp_id": camp_id,
+                         "stops": {stop[0]: stop for stop in stops}}
+    return job_id
+
+
+def job_status(job_id):
+    """None for unknown jobs; otherwise a dict with state and, when done, the routes."""
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is None:
+        return None
+    future = job["future"]
+    status = {"job_id": job_id, "camp_id": job["camp_id"], "stop_count": len(job["stops"])}
+    if not future.done():
+        return dict(status, state="running")
+    error = future.exception()
+    if error is not None:
+        return dict(status, state="failed", error=str(error))
+    result = dict(future.result())
+    stops = job["stops"]
+    result["routes"] = [dict(route, stops=[{"request_id": request_id, "latitude": stops[request_id][1],
+                                            "longitude": stops[request_id][2], "quantity": stops[request_id][3]}
+                                           for request_id in route["stops"]])
+                        for route in result["routes"]]
+    return dict(status, state="done", **result)
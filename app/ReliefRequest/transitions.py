@@ -0,0 +1,116 @@
+# app/ReliefRequest/transitions.py
+"""
+Bulk status transitions for relief requests.
+
+Requests move one step at a time: Pending -> Approved -> Fulfilled. A bulk
+transition selects the requests in the source status (by id list and/or
+filter) and moves them in one transaction with set-based statements:
+
+  * Approved: the selection is planned per disaster with plan_allocation(),
+    so approved requests get stock holds exactly like a batch allocation run.
+    Requests the stock cannot cover stay Pending.
+  * Fulfilled: requests holding active reservations are flipped with chunked
+    UPDATEs, their holds are consumed with one UPDATE per chunk, and stock is
+    drawn with one ledger entry per stock row. Requests whose holds lapsed
+    stay Approved.
+"""
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import update, func
+from app.models import db, ReliefRequest, StockReservation
+from app.Resource.stock import adjust_stock
+from app.Resource.reservations import adjust_reserved
+from .allocation import plan_allocation, book_allocation, AllocationConflict, UPDATE_CHUNK
+
+# target status -> status a request must be in
+TRANSITIONS = {"Approved": "Pending", "Fulfilled": "Approved"}
+
+
+def select_requests(source, ids=None, disaster_id=None, resource_needed=None,
+                    created_after=None, created_before=None):
+    """(id, disaster_id) of the requests in `source` status matching the selection."""
+    query = db.session.query(ReliefRequest.id, ReliefRequest.disaster_id).filter(ReliefRequest.status == source)
+    if disaster_id is not None:
+        query = query.filter(ReliefRequest.disaster_id == disaster_id)
+    if resource_needed:
+        query = query.filter(func.lower(func.trim(ReliefRequest.resource_needed)) == resource_needed.strip().lower())
+    if created_after is not None:
+        query = query.filter(ReliefRequest.created_at >= created_after)
+    if created_before is not None:
+        query = query.filter(ReliefRequest.created_at < created_before)
+    if ids is None:
+        return query.all()
+    ids = sorted(set(ids))
+    return [row for i in range(0, len(ids), UPDATE_CHUNK)
+            for row in query.filter(ReliefRequest.id.in_(ids[i:i + UPDATE_CHUNK])).all()]
+
+
+def _approve(selected, user_id):
+    by_disaster = defaultdict(set)
+    for request_id, disaster_id in selected:
+        by_disaster[disaster_id].add(request_id)
+
+    changed = 0
+    for disaster_id, request_ids in by_disaster.items():
+        plan = plan_allocation(disaster_id, request_ids)
+        book_allocation(plan, user_id)
+        changed += len(plan["approved_ids"])
+    return changed, {"insufficient_stock": len(selected) - changed}
+
+
+def _fulfil(selected, user_id):
+    ids = [request_id for request_id, _ in selected]
+    now = datetime.utcnow()
+    note = f"bulk fulfilment {now:%Y-%m-%d %H:%M}"
+    changed = 0
+    draws = defaultdict(int)
+
+    for i in range(0, len(ids), UPDATE_CHUNK):
+        chunk = ids[i:i + UPDATE_CHUNK]
+        holds = (db.session.query(StockReservation.relief_request_id, StockReservation.resource_id,
+                                  StockReservation.quantity)
+                 .filter(StockReservation.relief_request_id.in_(chunk), StockReservation.status == "active")
+                 .all())
+        covered = sorted({request_id for request_id, _, _ in holds})
+        if not covered:
+            continue
+
+        result = db.session.execute(
+            update(ReliefRequest)
+            .where(ReliefRequest.id.in_(covered), ReliefRequest.status == "Approved")
+            .values(status="Fulfilled", status_changed_at=now),
+            execution_options={"synchronize_session": False},
+        )
+        consumed = db.session.execute(
+            update(StockReservation)
+            .where(StockReservation.relief_request_id.in_(covered), StockReservation.status == "active")
+            .values(status="consumed", closed_at=now),
+            execution_options={"synchronize_session": False},
+        )
+        if result.rowcount != len(covered) or consumed.rowcount != len(holds):
+            raise AllocationConflict("Some requests or reservations changed meanwhile; try again")
+
+        changed += len(covered)
+        for _, resource_id, quantity in holds:
+            draws[resource_id] += quantity
+
+    for resource_id, quantity in draws.items():
+        adjust_reserved(resource_id, -quantity)
+        adjust_stock(resource_id, -quantity, "allocation_out", user_id=user_id, note=note, strict=True)
+    return changed, {"no_active_reservation": len(ids) - changed}
+
+
+def bulk_transition(target, user_id=None, **selection):
+    """Move the selected requests to `target` in one transaction; returns counts."""
+    source = TRANSITIONS[target]
+    selected = select_requests(source, **selection)
+    try:
+        if target == "Approved":
+            changed, skipped = _approve(selected, user_id)
+        else:
+            changed, skipped = _fulfil(selected, user_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return {"from": source, "to": target, "matched": len(selected), "changed": changed, "skipped": skipped}
@@ -1,5 +1,5 @@
 from flask import Blueprint
 
-resourceBp = Blueprint('resourceBp',__name__)
+resourceBp = Blueprint('resourceBp',__name__, cli_group='resources')
 
 from .import routes
\ No newline at end of file
@@ -0,0 +1,235 @@
+# app/Resource/bulk_import.py
+"""
+Streaming bulk import of stock entries and donations from CSV or NDJSON.
+
+Records are parsed one at a time and validated, then handled in batches of
+`batch_size`:
+
+  * donations are written with one multi-row INSERT per batch;
+  * stock effects are summed per (disaster, type, unit, expiry) and applied
+    with one adjust_stock() per distinct key, which is the set-wise form of
+    update_resource_stock(). Stock entries add to the matching stock row
+    instead of creating a row each;
+  * donation totals get one bump per distinct total row.
+
+Each batch commits on its own. Rows that fail validation are reported with
+their line number and skipped; a batch the database rejects is retried row by
+row so only the offending rows are reported.
+"""
+import csv
+import io
+import json
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import insert
+from app.models import db, Donation, Disaster, AuditLog
+from .stock import ensure_stock, adjust_stock
+from .units import convert, normalize_name
+
+KINDS = ("resources", "donations")
+FORMATS = ("csv", "ndjson")
+MAX_REPORTED_ERRORS = 1000
+
+
+class RowError(ValueError):
+    pass
+
+
+# ----------------------------
+# Parsing
+# ----------------------------
+def iter_records(stream, fmt):
+    """Yield (line_number, dict) from a binary stream without reading it all."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_number, None
+                continue
+            yield line_number, record if isinstance(record, dict) else None
+
+
+# ----------------------------
+# Validation
+# ----------------------------
+def _text(record, field, required=False):
+    value = record.get(field)
+    value = str(value).strip() if value is not None else ""
+    if required and not value:
+        raise RowError(f"{field} is required")
+    return value or None
+
+
+def _number(record, field, cast, required=False):
+    value = record.get(field)
+    if value is None or str(value).strip() == "":
+        if required:
+            raise RowError(f"{field} is required")
+        return None
+    try:
+        number = cast(value)
+    except (TypeError, ValueError):
+        raise RowError(f"{field} must be numeric")
+    if number < 0:
+        raise RowError(f"{field} cannot be negative")
+    return number
+
+
+def _datetime(record, field):
+    value = _text(record, field)
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        raise RowError(f"{field} must be an ISO date/time")
+
+
+def validate_resource(record):
+    resource_type = _text(record, "resource_type", required=True)
+    return {
+        "name": _text(record, "name") or resource_type,
+        "resource_type": resource_type,
+        "quantity": _number(record, "quantity", int, required=True),
+        "unit": _text(record, "unit"),
+        "disaster_id": _number(record, "disaster_id", int),
+        "expires_at": _datetime(record, "expires_at"),
+    }
+
+
+def validate_donation(record):
+    donated_at = _datetime(record, "donated_at") or datetime.utcnow()
+    row = {
+        "donor_name": _text(record, "donor_name", required=True),
+        "resource_type": _text(record, "resource_type"),
+        "quantity": _number(record, "quantity", int) or 0,
+        "unit": _text(record, "unit"),
+        "amount": _number(record, "amount", float) or 0,
+        "disaster_id": _number(record, "disaster_id", int),
+        "donated_by": _number(record, "donated_by", int),
+        "donated_at": donated_at,
+    }
+    if not row["resource_type"] and not row["amount"]:
+        raise RowError("either resource_type or amount is required")
+    # Core INSERT skips the ORM hooks in units.py, so normalize here
+    canonical, factor = convert(row["resource_type"], row["unit"])
+    row["canonical_unit"] = canonical
+    row["unit_factor"] = factor
+    row["normalized_quantity"] = row["quantity"] * factor if factor is not None else None
+    return row
+
+
+VALIDATORS = {"resources": validate_resource, "donations": validate_donation}
+
+
+# ----------------------------
+# Batch writes
+# ----------------------------
+def _apply_stock(rows, movement_type, user_id, note):
+    """One atomic stock adjustment per distinct (disaster, type, unit, expiry)."""
+    totals = defaultdict(int)
+    names = {}
+    for row in rows:
+        if not row.get("resource_type"):
+            continue
+        key = (row["disaster_id"], row["resource_type"], row["unit"], row.get("expires_at"))
+        totals[key] += row["quantity"] or 0
+        names.setdefault(key, row.get("name") or row.get("donor_name"))
+
+    for key, quantity in totals.items():
+        disaster_id, resource_type, unit, expires_at = key
+        resource_id = ensure_stock(resource_type, disaster_id, name=names[key], unit=unit,
+                                   added_by=user_id, expires_at=expires_at)
+        if quantity:
+            adjust_stock(resource_id, quantity, movement_type, user_id=user_id, note=note)
+
+
+def _write_batch(kind, rows, user_id, note):
+    from app.Donation.totals import apply_contributions
+
+    if kind == "donations":
+        db.session.execute(insert(Donation), rows)
+        _apply_stock(rows, "donation_in", user_id, note)
+        apply_contributions([{
+            "disaster_id": row["disaster_id"] or 0,
+            "donor_id": row["donated_by"],
+            "donor_name": row["donor_name"],
+            "resource_type": normalize_name(row["resource_type"]) or "money",
+            "day": row["donated_at"].date(),
+            "donated_at": row["donated_at"],
+            "amount": row["amount"],
+            "quantity": row["normalized_quantity"] or 0,
+        } for row in rows])
+    else:
+        _apply_stock(rows, "adjustment", user_id, note)
+
+
+def import_records(kind, records, user_id=None, batch_size=1000):
+    """Import (line_number, record) pairs; returns a summary with per-row errors."""
+    validate = VALIDATORS[kind]
+    note = f"bulk import {datetime.utcnow():%Y-%m-%d %H:%M}"
+    known_disasters = set()
+    summary = {"kind": kind, "imported": 0, "failed": 0, "errors": []}
+
+    def fail(line_number, message):
+        summary["failed"] += 1
+        if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+            summary["errors"].append({"line": line_number, "error": message})
+
+    def flush(batch):
+        # Check unknown disaster ids for the whole batch in one query
+        wanted = {row["disaster_id"] for _, row in batch if row["disaster_id"]} - known_disasters
+        if wanted:
+            known_disasters.update(d for (d,) in db.session.query(Disaster.id).filter(Disaster.id.in_(wanted)))
+        good = []
+        for line_number, row in batch:
+            if row["disaster_id"] and row["disaster_id"] not in known_disasters:
+                fail(line_number, f"disaster {row['disaster_id']} does not exist")
+            else:
+                good.append((line_number, row))
+        if not good:
+            return
+        try:
+            _write_batch(kind, [row for _, row in good], user_id, note)
+            db.session.commit()
+            summary["imported"] += len(good)
+            return
+        except Exception:
+            db.session.rollback()
+        # The database rejected the batch: redo it row by row to find the culprits
+        for line_number, row in good:
+            try:
+                _write_batch(kind, [row], user_id, note)
+                db.session.commit()
+                summary["imported"] += 1
+            except Exception as e:
+                db.session.rollback()
+                fail(line_number, f"rejected by database: {e.__class__.__name__}")
+
+    batch = []
+    for line_number, record in records:
+        if record is None:
+            fail(line_number, "malformed record")
+            continue
+        try:
+            batch.append((line_number, validate(record)))
+        except RowError as e:
+            fail(line_number, str(e))
+            continue
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    summary["errors"].sort(key=lambda error: error["line"])
+    db.session.add(AuditLog(user_id=user_id, action="BULK_IMPORT",
+                            details=f"Imported {summary['imported']} {kind} ({summary['failed']} rejected)"))
+    db.session.commit()
+    return summary
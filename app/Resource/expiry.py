@@ -0,0 +1,262 @@
+# app/Resource/expiry.py
+"""
+Expiry tracking for perishable stock lots.
+
+Resources with an `expires_at` date go through two events: an "expiring soon"
+notification `warn_before` ahead of time, and being marked `is_expired` once
+due. Available-stock queries filter with stock.usable(), so an expired lot
+drops out of the figures the moment it is due, whether or not it has been
+marked yet.
+
+ExpiryScheduler keeps the upcoming events in a min-heap and a background thread
+sleeps until the earliest one is due. It never scans `resources`: every
+`horizon` it loads the lots due soon through the index on expires_at, and
+commits made in this process push their lots in directly. Firing an event is a
+conditional UPDATE, so several workers running a scheduler (or the
+`flask resources expire-stock` command) never warn or expire a lot twice.
+
+Web processes only start the thread when EXPIRY_SCHEDULER is set. Otherwise
+run `flask resources scheduler` as one dedicated process, or
+`flask resources expire-stock` from cron. A separate scheduler only sees lots
+that other processes commit when it next loads, at most `horizon` later.
+
+The same heap releases stock reservations when their hold runs out
+(reservations.py).
+"""
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import event, inspect, update
+from sqlalchemy.orm import Session
+from app.models import db, Resource, User, Notification, StockReservation
+from .reservations import release_expired
+
+log = logging.getLogger(__name__)
+
+ADMIN_ROLES = ("admin", "super_admin")
+WARN = "warn"
+EXPIRE = "expire"
+HOLD = "hold"
+
+
+# ----------------------------
+# Firing events
+# ----------------------------
+def _recipients(resource_row, admin_ids):
+    return set(admin_ids) | ({resource_row.added_by} if resource_row.added_by else set())
+
+
+def _notify(rows, type_, message, now):
+    if not rows:
+        return
+    admin_ids = [uid for (uid,) in db.session.query(User.id).filter(User.role.in_(ADMIN_ROLES))]
+    db.session.bulk_insert_mappings(Notification, [{
+        "user_id": user_id,
+        "type": type_,
+        "related_id": row.id,
+        "message": message(row)[:255],
+        "is_read": False,
+        "created_at": now,
+    } for row in rows for user_id in _recipients(row, admin_ids)])
+
+
+def _describe(row):
+    return f"{row.name} ({row.quantity} {row.unit or ''}".rstrip() + f") for disaster #{row.disaster_id}"
+
+
+def _claim(resource_ids, *conditions, **values):
+    """Conditionally update each lot; return the ids this call won."""
+    won = []
+    for resource_id in resource_ids:
+        result = db.session.execute(
+            update(Resource).where(Resource.id == resource_id, *conditions).values(**values),
+            execution_options={"synchronize_session": False},
+        )
+        if result.rowcount:
+            won.append(resource_id)
+    return won
+
+
+def fire(ids, kind, now=None, warn_before=timedelta(hours=48)):
+    """Warn about or expire the given lots, or release the given holds, if due. Returns rows handled."""
+    now = now or datetime.utcnow()
+    if kind == HOLD:
+        released = release_expired(ids, now)
+        db.session.commit()
+        return released
+    if kind == WARN:
+        won = _claim(ids,
+                     Resource.expiry_warned_at.is_(None),
+                     Resource.is_expired.is_(False),
+                     Resource.expires_at <= now + warn_before,
+                     expiry_warned_at=now)
+        type_, message = "stock_expiring", lambda r: f"Expiring {r.expires_at:%Y-%m-%d %H:%M}: {_describe(r)}"
+    else:
+        won = _claim(ids,
+                     Resource.is_expired.is_(False),
+                     Resource.expires_at <= now,
+                     is_expired=True)
+        type_, message = "stock_expired", lambda r: f"Expired and withdrawn from stock: {_describe(r)}"
+
+    rows = (db.session.query(Resource.id, Resource.name, Resource.quantity, Resource.unit,
+                             Resource.disaster_id, Resource.added_by, Resource.expires_at)
+            .filter(Resource.id.in_(won)).all()) if won else []
+    _notify(rows, type_, message, now)
+    db.session.commit()
+    return len(won)
+
+
+def due_lots(until, warned=None):
+    """Ids and expiry of unexpired lots due by `until` (range scan on expires_at)."""
+    query = (db.session.query(Resource.id, Resource.expires_at, Resource.expiry_warned_at)
+             .filter(Resource.expires_at.isnot(None), Resource.expires_at <= until,
+                     Resource.is_expired.is_(False)))
+    if warned is False:
+        query = query.filter(Resource.expiry_warned_at.is_(None))
+    return query.order_by(Resource.expires_at).all()
+
+
+def due_holds(until):
+    """Ids and expiry of active reservations due by `until` (ix_stock_reservations_status_expires)."""
+    return (db.session.query(StockReservation.id, StockReservation.expires_at)
+            .filter(StockReservation.status == "active", StockReservation.expires_at <= until)
+            .all())
+
+
+def expire_due(now=None, warn_before=timedelta(hours=48)):
+    """One-shot pass for cron/CLI: returns (warned, expired, holds released)."""
+    now = now or datetime.utcnow()
+    warned = fire([r.id for r in due_lots(now + warn_before, warned=False)], WARN, now, warn_before)
+    expired = fire([r.id for r in due_lots(now)], EXPIRE, now, warn_before)
+    released = fire(None, HOLD, now)
+    return warned, expired, released
+
+
+# ----------------------------
+# Scheduler
+# ----------------------------
+class ExpiryScheduler:
+    def __init__(self, warn_before=timedelta(hours=48), horizon=timedelta(minutes=10)):
+        self.warn_before = warn_before
+        self.horizon = horizon
+        self._cond = threading.Condition()
+        self._heap = []            # (when, kind, resource or reservation id)
+        self._queued = set()
+        self._loaded_until = None  # events later than this are left for the next load
+        self._thread = None
+
+    def start(self, app):
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, args=(app,), name="expiry-scheduler", daemon=True)
+            self._thread.start()
+
+    def run(self, app):
+        """Run the scheduler loop in the calling thread (a dedicated worker process)."""
+        self._run(app)
+
+    def schedule(self, resource_id, expires_at, warned=False):
+        if expires_at is None:
+            return
+        with self._cond:
+            if not warned:
+                self._push(expires_at - self.warn_before, WARN, resource_id)
+            self._push(expires_at, EXPIRE, resource_id)
+            self._cond.notify()
+
+    def schedule_hold(self, reservation_id, expires_at):
+        with self._cond:
+            self._push(expires_at, HOLD, reservation_id)
+            self._cond.notify()
+
+    def _push(self, when, kind, resource_id):
+        if self._loaded_until is None or when > self._loaded_until:
+            return
+        entry = (when, kind, resource_id)
+        if entry not in self._queued:
+            self._queued.add(entry)
+            heapq.heappush(self._heap, entry)
+
+    def _load(self, now):
+        until = now + self.horizon
+        lots = due_lots(until + self.warn_before)
+        holds = due_holds(until)
+        db.session.rollback()  # end the read transaction
+        with self._cond:
+            self._loaded_until = until
+            for resource_id, expires_at, warned_at in lots:
+                if warned_at is None:
+                    self._push(expires_at - self.warn_before, WARN, resource_id)
+                self._push(expires_at, EXPIRE, resource_id)
+            for reservation_id, expires_at in holds:
+                self._push(expires_at, HOLD, reservation_id)
+        return until
+
+    def _pop_due(self, now):
+        due = {WARN: [], EXPIRE: [], HOLD: []}
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                self._queued.discard(entry)
+                due[entry[1]].append(entry[2])
+        return due
+
+    def _run(self, app):
+        with app.app_context():
+            next_load = datetime.utcnow()
+            while True:
+                try:
+                    now = datetime.utcnow()
+                    if now >= next_load:
+                        next_load = self._load(now)
+                    due = self._pop_due(now)
+                    for kind in (WARN, EXPIRE, HOLD):
+                        if due[kind]:
+                            fire(due[kind], kind, now, self.warn_before)
+                except Exception:
+                    db.session.rollback()
+                    log.exception("expiry scheduler pass failed")
+                finally:
+                    db.session.remove()
+
+                with self._cond:
+                    wake = min(next_load, self._heap[0][0]) if self._heap else next_load
+                    timeout = (wake - datetime.utcnow()).total_seconds()
+                    if timeout > 0:
+                        self._cond.wait(timeout)
+
+
+expiry_scheduler = ExpiryScheduler()
+
+
+# ----------------------------
+# Scheduling lots and holds committed by this process
+# ----------------------------
+_INFO_KEY = "expiry_lots"
+_HOLDS_KEY = "expiry_holds"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect(session, flush_context):
+    for obj in (*session.new, *session.dirty):
+        if isinstance(obj, Resource) and obj.expires_at is not None \
+                and (obj in session.new or inspect(obj).attrs.expires_at.history.has_changes()):
+            session.info.setdefault(_INFO_KEY, {})[obj.id] = obj.expires_at
+        elif isinstance(obj, StockReservation) and obj in session.new:
+            session.info.setdefault(_HOLDS_KEY, {})[obj.id] = obj.expires_at
+
+
+@event.listens_for(Session, "after_commit")
+def _schedule(session):
+    for resource_id, expires_at in session.info.pop(_INFO_KEY, {}).items():
+        expiry_scheduler.schedule(resource_id, expires_at)
+    for reservation_id, expires_at in session.info.pop(_HOLDS_KEY, {}).items():
+        expiry_scheduler.schedule_hold(reservation_id, expires_at)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop(_INFO_KEY, None)
+    session.info.pop(_HOLDS_KEY, None)
@@ -0,0 +1,202 @@
+# app/Resource/gaps.py
+"""
+Supply-versus-demand gap analysis per disaster and resource.
+
+Demand comes from relief requests (by status), supply from stock rows, and
+pledges from donations. Expired lots do not count as supply. Supply and
+pledges are summed as normalized quantities (the type's canonical unit, see
+units.py), which request quantities are taken to be in. Each side is
+computed with one GROUP BY over all disasters. Results are cached per
+disaster. Commits that touch a request, stock row, donation or ledger row
+mark only that disaster dirty, and the next read recomputes just the dirty
+disasters.
+
+The commit hooks only see writes made by this process, so the cache is also
+fully rebuilt every `max_age` seconds to pick up other workers' writes.
+"""
+import threading
+import time
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+from app.models import db, Disaster, ReliefRequest, Resource, Donation, StockMovement
+from .stock import usable
+
+REQUEST_STATUSES = ("Pending", "Approved", "Fulfilled")
+OPEN_STATUSES = ("Pending", "Approved")
+
+
+def resource_key(column):
+    """SQL expression used to match request names against stock/donation types."""
+    return func.lower(func.trim(column))
+
+
+# ----------------------------
+# Computation
+# ----------------------------
+def compute_gaps(disaster_ids=None):
+    """Return {disaster_id: {resource: row}} for the given disasters (all if None)."""
+    def scoped(query, column):
+        return query.filter(column.in_(disaster_ids)) if disaster_ids is not None else query
+
+    result = {}
+
+    def row(disaster_id, resource):
+        by_resource = result.setdefault(disaster_id, {})
+        return by_resource.setdefault(resource, {
+            "resource": resource,
+            "requested": {status: 0 for status in REQUEST_STATUSES},
+            "in_stock": 0,
+            "pledged": 0,
+        })
+
+    request_key = resource_key(ReliefRequest.resource_needed)
+    demand = scoped(db.session.query(
+        ReliefRequest.disaster_id, request_key, ReliefRequest.status, func.sum(ReliefRequest.quantity)
+    ), ReliefRequest.disaster_id).group_by(ReliefRequest.disaster_id, request_key, ReliefRequest.status)
+    for disaster_id, resource, status, qty in demand:
+        row(disaster_id, resource)["requested"][status] = int(qty or 0)
+
+    stock_key = resource_key(Resource.resource_type)
+    stock = scoped(db.session.query(
+        Resource.disaster_id, stock_key, func.sum(Resource.normalized_quantity)
+    ), Resource.disaster_id).filter(Resource.disaster_id.isnot(None), usable()) \
+        .group_by(Resource.disaster_id, stock_key)
+    for disaster_id, resource, qty in stock:
+        row(disaster_id, resource)["in_stock"] = round(float(qty or 0), 3)
+
+    donation_key = resource_key(Donation.resource_type)
+    pledged = scoped(db.session.query(
+        Donation.disaster_id, donation_key, func.sum(Donation.normalized_quantity)
+    ), Donation.disaster_id).filter(Donation.disaster_id.isnot(None), Donation.resource_type.isnot(None)) \
+        .group_by(Donation.disaster_id, donation_key)
+    for disaster_id, resource, qty in pledged:
+        row(disaster_id, resource)["pledged"] = round(float(qty or 0), 3)
+
+    for by_resource in result.values():
+        for r in by_resource.values():
+            r["open_demand"] = sum(r["requested"][s] for s in OPEN_STATUSES)
+            r["gap"] = r["in_stock"] - r["open_demand"]
+            r["status"] = "shortage" if r["gap"] < 0 else "surplus" if r["gap"] > 0 else "balanced"
+
+    # Disasters that had rows before but have none now must still be overwritten
+    for disaster_id in disaster_ids or ():
+        result.setdefault(disaster_id, {})
+    return result
+
+
+# ----------------------------
+# Cache
+# ----------------------------
+class GapCache:
+    """Per-disaster gaps. Recomputation runs outside the lock, so reads never
+    wait behind another thread's rebuild; they serve the last result instead."""
+
+    def __init__(self, max_age=60):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._gaps = {}
+        self._dirty = set()
+        self._stale = True     # full recompute needed
+        self._built_at = 0.0
+        self._generation = 0   # bumped by every full rebuild
+
+    def mark_dirty(self, disaster_ids):
+        with self._lock:
+            self._dirty.update(disaster_ids)
+
+    def mark_stale(self):
+        with self._lock:
+            self._stale = True
+
+    def get(self):
+        with self._lock:
+            full = self._stale or time.monotonic() - self._built_at > self.max_age
+            if full:
+                self._stale = False
+                self._dirty.clear()
+            dirty, self._dirty = (set(), self._dirty) if full else (self._dirty, set())
+            generation = self._generation
+
+        if full:
+            try:
+                gaps = compute_gaps()
+            except Exception:
+                self.mark_stale()
+                raise
+            with self._lock:
+                self._gaps = gaps
+                self._built_at = time.monotonic()
+                self._generation += 1
+                return dict(self._gaps)
+
+        if dirty:
+            try:
+                fresh = compute_gaps(dirty)
+            except Exception:
+                self.mark_dirty(dirty)
+                raise
+            with self._lock:
+                if self._generation != generation:
+                    # a full rebuild swapped in meanwhile; recompute these on the next read
+                    self._dirty.update(dirty)
+                else:
+                    for disaster_id, by_resource in fresh.items():
+                        if by_resource:
+                            self._gaps[disaster_id] = by_resource
+                        else:
+                            self._gaps.pop(disaster_id, None)
+        with self._lock:
+            return dict(self._gaps)
+
+
+gap_cache = GapCache()
+
+
+# ----------------------------
+# SQLAlchemy change tracking
+# ----------------------------
+_WATCHED = (ReliefRequest, Resource, Donation, StockMovement)
+_INFO_KEY = "gap_cache_disasters"
+
+
+def _disaster_ids(obj):
+    """Current and previous disaster_id of a changed object."""
+    history = inspect(obj).attrs.disaster_id.history
+    return {d for d in (obj.disaster_id, *history.deleted) if d is not None}
+
+
+@event.listens_for(Session, "after_flush")
+def _collect(session, flush_context):
+    changed = session.info.setdefault(_INFO_KEY, set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, _WATCHED):
+            changed.update(_disaster_ids(obj))
+        elif isinstance(obj, Disaster) and obj in session.deleted:
+            changed.add(obj.id)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or not issubclass(mapper.class_, _WATCHED):
+        return
+    if orm_execute_state.execution_options.get("stock_ledger"):
+        return  # the matching StockMovement row carries the disaster id
+    orm_execute_state.session.info[_INFO_KEY + "_all"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _apply(session):
+    changed = session.info.pop(_INFO_KEY, None)
+    if session.info.pop(_INFO_KEY + "_all", False):
+        gap_cache.mark_stale()
+    elif changed:
+        gap_cache.mark_dirty(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop(_INFO_KEY, None)
+    session.info.pop(_INFO_KEY + "_all", None)
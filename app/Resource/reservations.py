@@ -0,0 +1,129 @@
+# app/Resource/reservations.py
+"""
+Stock reservations: time-limited holds on part of a resource's stock.
+
+Resource.reserved_quantity is the running sum of active holds, so
+available stock is `quantity - reserved_quantity` and taking a hold is one
+conditional UPDATE:
+
+    UPDATE resources SET reserved_quantity = reserved_quantity + :q
+    WHERE id = :id AND quantity - reserved_quantity >= :q
+
+Two coordinators approving against the same pallets cannot both succeed. The
+loser's UPDATE matches no row. Each hold also gets a StockReservation row with
+an expiry; closing a hold (consume, release or expire) first flips that row
+out of "active" with a conditional UPDATE, then gives the quantity back, so a
+hold is never returned twice. Expired holds are released by the expiry
+scheduler (see expiry.py). Callers commit.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app.models import db, Resource, StockReservation
+from .stock import adjust_stock, usable
+from .gaps import resource_key
+from .units import normalize_name
+
+DEFAULT_TTL = timedelta(hours=24)
+
+
+class ReservationError(Exception):
+    """Not enough available stock to place the hold."""
+
+
+def available():
+    """SQL expression for stock not held by active reservations."""
+    return Resource.quantity - Resource.reserved_quantity
+
+
+def adjust_reserved(resource_id, delta, guard=False):
+    """Move reserved_quantity by `delta`; with `guard`, only if that much is free and usable."""
+    stmt = update(Resource).where(Resource.id == resource_id)
+    if guard:
+        stmt = stmt.where(available() >= delta, usable())
+    # gaps.py does not count reserved_quantity, so like adjust_stock() this
+    # bulk UPDATE must not make the gap cache rebuild everything
+    result = db.session.execute(
+        stmt.values(reserved_quantity=Resource.reserved_quantity + delta),
+        execution_options={"synchronize_session": False, "stock_ledger": True},
+    )
+    return result.rowcount == 1
+
+
+def hold(resource_id, quantity, relief_request_id=None, user_id=None, ttl=DEFAULT_TTL, now=None):
+    """Reserve `quantity` of one resource row; False if it does not have that much free."""
+    if not adjust_reserved(resource_id, quantity, guard=True):
+        return False
+    now = now or datetime.utcnow()
+    db.session.add(StockReservation(resource_id=resource_id, relief_request_id=relief_request_id,
+                                    quantity=quantity, status="active", expires_at=now + ttl,
+                                    created_by=user_id, created_at=now))
+    return True
+
+
+def reserve(resource_type, disaster_id, quantity, relief_request_id=None, user_id=None, ttl=DEFAULT_TTL):
+    """Hold `quantity` of a resource type across the disaster's stock rows, first-expiring first.
+
+    Raises ReservationError if the free stock is short. Holds already taken in
+    this call are undone when the caller rolls back.
+    """
+    rows = (db.session.query(Resource.id, available())
+            .filter(Resource.disaster_id == disaster_id,
+                    resource_key(Resource.resource_type) == normalize_name(resource_type),
+                    available() > 0, usable())
+            .order_by(Resource.expires_at.is_(None), Resource.expires_at, available().desc())
+            .all())
+    remaining = quantity
+    for resource_id, free in rows:
+        take = min(free, remaining)
+        if hold(resource_id, take, relief_request_id, user_id, ttl):
+            remaining -= take
+        if not remaining:
+            return quantity
+    raise ReservationError(f"Only {quantity - remaining} of {quantity} {resource_type} available to reserve")
+
+
+def _close(reservations, status, now):
+    """Flip active holds to `status` and give their quantity back. Returns the holds closed."""
+    closed = []
+    for reservation_id, resource_id, quantity in reservations:
+        result = db.session.execute(
+            update(StockReservation)
+            .where(StockReservation.id == reservation_id, StockReservation.status == "active")
+            .values(status=status, closed_at=now),
+            execution_options={"synchronize_session": False},
+        )
+        if result.rowcount:
+            adjust_reserved(resource_id, -quantity)
+            closed.append((reservation_id, resource_id, quantity))
+    return closed
+
+
+def _active(*criteria):
+    return (db.session.query(StockReservation.id, StockReservation.resource_id, StockReservation.quantity)
+            .filter(StockReservation.status == "active", *criteria)
+            .all())
+
+
+def release(relief_request_id):
+    """Drop a request's active holds. Returns the quantity released."""
+    closed = _close(_active(StockReservation.relief_request_id == relief_request_id), "released", datetime.utcnow())
+    return sum(q for _, _, q in closed)
+
+
+def consume(relief_request_id, user_id=None):
+    """Turn a request's active holds into stock withdrawals. Returns the quantity drawn."""
+    drawn = 0
+    for _, resource_id, quantity in _close(_active(StockReservation.relief_request_id == relief_request_id),
+                                           "consumed", datetime.utcnow()):
+        drawn += -adjust_stock(resource_id, -quantity, "allocation_out", user_id=user_id,
+                               relief_request_id=relief_request_id, note="reservation consumed", strict=True)
+    return drawn
+
+
+def release_expired(reservation_ids=None, now=None):
+    """Release holds past their expiry (optionally only the given ids). Returns holds released."""
+    now = now or datetime.utcnow()
+    criteria = [StockReservation.expires_at <= now]
+    if reservation_ids is not None:
+        criteria.append(StockReservation.id.in_(reservation_ids))
+    return len(_close(_active(*criteria), "expired", now))
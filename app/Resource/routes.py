@@ -1,8 +1,15 @@
-from flask import Blueprint, request, jsonify, session, render_template
-from app.models import db, Resource, Donation, AuditLog, User
-from datetime import datetime
+from flask import Blueprint, request, jsonify, session, render_template, current_app
+from app.models import db, Resource, Donation, AuditLog, User, StockMovement, Disaster
+from datetime import datetime, timedelta
+from sqlalchemy import func
+import click
 
 from . import resourceBp
+from .stock import adjust_stock, ledger_quantity, take_snapshots, usable
+from .gaps import gap_cache
+from .units import backfill_units
+from .expiry import expiry_scheduler, expire_due
+from .bulk_import import KINDS, FORMATS, iter_records, import_records
 
 ALLOWED_ROLES = {"admin", "super_admin", "donor", "volunteer", "campManager", "victim"}
 ADMIN_ROLES = {"admin", "super_admin"}  # can manage all resources
@@ -27,10 +34,14 @@ def serialize_resource(resource: Resource):
         "id": resource.id,
         "name": resource.name,
         "quantity": resource.quantity,
+        "reserved_quantity": resource.reserved_quantity,
+        "available": resource.quantity - (resource.reserved_quantity or 0),
         "resource_type": resource.resource_type,
         "unit": resource.unit,
         "disaster_id": resource.disaster_id,
         "added_by": resource.added_by,
+        "expires_at": resource.expires_at.isoformat() if resource.expires_at else None,
+        "is_expired": resource.is_expired,
         "created_at": resource.created_at.isoformat(),
         "updated_at": resource.updated_at.isoformat() if resource.updated_at else None,
     }
@@ -52,13 +63,17 @@ def create_resource():
     try:
         new_resource = Resource(
             name=data["name"],
-            quantity=data["quantity"],
+            quantity=0,
             resource_type=data["resource_type"],
             unit=data.get("unit"),
             disaster_id=data.get("disaster_id"),
             added_by=int(user_session["id"]),
+            expires_at=datetime.fromisoformat(data["expires_at"]) if data.get("expires_at") else None,
         )
         db.session.add(new_resource)
+        db.session.flush()
+        adjust_stock(new_resource.id, int(data["quantity"]), "adjustment",
+                     user_id=new_resource.added_by, note="initial stock")
         db.session.commit()
         log_action(new_resource.added_by, "CREATE_RESOURCE", f"Created resource ID {new_resource.id}")
         return jsonify({"message": "Resource created successfully", "id": new_resource.id}), 201
@@ -99,6 +114,65 @@ def get_resources():
         print(traceback.format_exc())
         return jsonify({"error": str(e)}), 500
 
+# SUPPLY vs DEMAND GAPS
+@resourceBp.route("/api/gaps", methods=["GET"])
+def get_resource_gaps():
+    """Per-disaster shortages/surpluses. Optional ?disaster_id= and ?status=shortage|surplus|balanced"""
+    user_session, resp, status = get_current_user()
+    if not user_session:
+        return resp, status
+
+    disaster_id = request.args.get("disaster_id", type=int)
+    only = request.args.get("status")
+
+    gaps = gap_cache.get()
+    if disaster_id is not None:
+        gaps = {disaster_id: gaps.get(disaster_id, {})}
+
+    names = dict(db.session.query(Disaster.id, Disaster.name).filter(Disaster.id.in_(gaps)).all())
+    result = []
+    for d_id, by_resource in sorted(gaps.items()):
+        rows = [r for r in by_resource.values() if not only or r["status"] == only]
+        if only and not rows:
+            continue
+        result.append({
+            "disaster_id": d_id,
+            "disaster_name": names.get(d_id),
+            "shortages": sum(1 for r in by_resource.values() if r["status"] == "shortage"),
+            "resources": sorted(rows, key=lambda r: r["gap"]),
+        })
+    return jsonify(result), 200
+
+# STOCK & DONATION TOTALS IN CANONICAL UNITS
+@resourceBp.route("/api/totals", methods=["GET"])
+def get_resource_totals():
+    user_session, resp, status = get_current_user()
+    if not user_session:
+        return resp, status
+
+    disaster_id = request.args.get("disaster_id", type=int)
+    totals = {}
+
+    def bucket(d_id, resource_type, unit):
+        return totals.setdefault((d_id, resource_type, unit), {
+            "disaster_id": d_id, "resource_type": resource_type, "unit": unit,
+            "in_stock": 0.0, "donated": 0.0,
+        })
+
+    for model, field in ((Resource, "in_stock"), (Donation, "donated")):
+        type_key = func.lower(model.resource_type)
+        query = db.session.query(model.disaster_id, type_key, model.canonical_unit,
+                                 func.sum(model.normalized_quantity)) \
+            .filter(model.normalized_quantity.isnot(None))
+        if model is Resource:
+            query = query.filter(usable())
+        if disaster_id is not None:
+            query = query.filter(model.disaster_id == disaster_id)
+        for d_id, resource_type, unit, total in query.group_by(model.disaster_id, type_key, model.canonical_unit):
+            bucket(d_id, resource_type, unit)[field] = float(total or 0)
+
+    return jsonify(sorted(totals.values(), key=lambda t: (t["disaster_id"] or 0, t["resource_type"]))), 200
+
 # GET SINGLE RESOURCE
 @resourceBp.route("/resource/<int:resource_id>", methods=["GET"])
 def get_resource(resource_id):
@@ -124,9 +198,19 @@ def update_resource(resource_id):
 
     data = request.get_json() or {}
     try:
-        for field in ["name", "quantity", "resource_type", "unit", "disaster_id"]:
+        for field in ["name", "resource_type", "unit", "disaster_id"]:
             if field in data:
                 setattr(r, field, data[field])
+        if "expires_at" in data:
+            r.expires_at = datetime.fromisoformat(data["expires_at"]) if data["expires_at"] else None
+            # A new date starts the warn/expire cycle over
+            r.expiry_warned_at = None
+            r.is_expired = False
+        if "quantity" in data:
+            # Absolute set from the UI: lock the row, book the difference
+            current = db.session.query(Resource.quantity).filter_by(id=r.id).with_for_update().scalar()
+            adjust_stock(r.id, int(data["quantity"]) - current, "adjustment",
+                         user_id=int(user_session["id"]), note="manual stock update")
         db.session.commit()
         log_action(int(user_session["id"]), "UPDATE_RESOURCE", f"Updated resource ID {r.id}")
         return jsonify({"message": "Resource updated successfully"}), 200
@@ -134,6 +218,36 @@ def update_resource(resource_id):
         db.session.rollback()
         return jsonify({"error": str(e)}), 400
 
+# STOCK LEDGER FOR A RESOURCE
+@resourceBp.route("/resource/<int:resource_id>/ledger", methods=["GET"])
+def get_resource_ledger(resource_id):
+    user_session, resp, status = get_current_user()
+    if not user_session:
+        return resp, status
+
+    r = Resource.query.get_or_404(resource_id)
+    limit = min(request.args.get("limit", 100, type=int), 1000)
+    movements = (StockMovement.query
+                 .filter_by(resource_id=r.id)
+                 .order_by(StockMovement.id.desc())
+                 .limit(limit)
+                 .all())
+    return jsonify({
+        "resource_id": r.id,
+        "quantity": r.quantity,
+        "ledger_quantity": ledger_quantity(r.id),
+        "movements": [{
+            "id": m.id,
+            "movement_type": m.movement_type,
+            "delta": m.delta,
+            "donation_id": m.donation_id,
+            "relief_request_id": m.relief_request_id,
+            "user_id": m.user_id,
+            "note": m.note,
+            "created_at": m.created_at.isoformat(),
+        } for m in movements],
+    }), 200
+
 # DELETE RESOURCE
 @resourceBp.route("/resource/<int:resource_id>", methods=["DELETE"])
 def delete_resource(resource_id):
@@ -156,6 +270,44 @@ def delete_resource(resource_id):
         db.session.rollback()
         return jsonify({"error": str(e)}), 400
 
+# BULK IMPORT (CSV / NDJSON)
+@resourceBp.route("/import", methods=["POST"])
+def bulk_import():
+    user_session, resp, status = get_current_user()
+    if not user_session:
+        return resp, status
+    if user_session.get("role", "").lower() not in ADMIN_ROLES:
+        return jsonify({"error": "Forbidden"}), 403
+
+    kind = request.args.get("kind", "resources")
+    upload = request.files.get("file")
+    default_format = "ndjson" if upload and upload.filename.lower().endswith((".ndjson", ".jsonl")) else "csv"
+    fmt = request.args.get("format", default_format)
+    if kind not in KINDS or fmt not in FORMATS:
+        return jsonify({"error": f"kind must be one of {list(KINDS)}, format one of {list(FORMATS)}"}), 400
+
+    stream = upload.stream if upload else request.stream
+    summary = import_records(kind, iter_records(stream, fmt), user_id=int(user_session["id"]))
+    return jsonify(summary), 200
+
+# EXPIRING STOCK
+@resourceBp.route("/api/expiring", methods=["GET"])
+def get_expiring_resources():
+    """Lots expiring within ?days= (default 7), soonest first. ?include_expired=1 adds expired lots."""
+    user_session, resp, status = get_current_user()
+    if not user_session:
+        return resp, status
+
+    days = request.args.get("days", 7, type=int)
+    query = Resource.query.filter(Resource.expires_at.isnot(None),
+                                  Resource.expires_at <= datetime.utcnow() + timedelta(days=days))
+    if not request.args.get("include_expired", type=int):
+        query = query.filter(usable())
+    disaster_id = request.args.get("disaster_id", type=int)
+    if disaster_id is not None:
+        query = query.filter(Resource.disaster_id == disaster_id)
+    return jsonify([serialize_resource(r) for r in query.order_by(Resource.expires_at).all()]), 200
+
 # FRONTEND PAGE
 @resourceBp.route("/", methods=["GET"])
 def resources_page():
@@ -163,3 +315,56 @@ def resources_page():
     if not user_session:
         return "Unauthorized", 401
     return render_template("resources.html")
+
+
+# ---------------- Expiry scheduler ----------------
+@resourceBp.before_app_request
+def start_expiry_scheduler():
+    # opt-in: every web worker would otherwise run its own scheduler thread
+    if current_app.config.get("EXPIRY_SCHEDULER", False):
+        expiry_scheduler.start(current_app._get_current_object())
+
+
+# ---------------- CLI ----------------
+@resourceBp.cli.command("snapshot")
+def snapshot_command():
+    """Write stock snapshot rows for resources that moved since the last run."""
+    written = take_snapshots()
+    click.echo(f"Wrote {written} stock snapshots")
+
+
+@resourceBp.cli.command("normalize-units")
+def normalize_units_command():
+    """Backfill canonical units and normalized quantities on resources and donations."""
+    for model in (Resource, Donation):
+        click.echo(f"{model.__tablename__}: {backfill_units(model)} rows normalized")
+
+
+@resourceBp.cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--kind", type=click.Choice(KINDS), default="resources")
+@click.option("--format", "fmt", type=click.Choice(FORMATS), default=None,
+              help="Defaults to ndjson for .ndjson/.jsonl files, csv otherwise.")
+@click.option("--user-id", type=int, default=None, help="User recorded on stock movements and the audit log.")
+def import_command(path, kind, fmt, user_id):
+    """Bulk import resources or donations from a CSV or NDJSON file."""
+    fmt = fmt or ("ndjson" if path.lower().endswith((".ndjson", ".jsonl")) else "csv")
+    with open(path, "rb") as stream:
+        summary = import_records(kind, iter_records(stream, fmt), user_id=user_id)
+    click.echo(f"Imported {summary['imported']} {kind}, rejected {summary['failed']}")
+    for error in summary["errors"][:20]:
+        click.echo(f"  line {error['line']}: {error['error']}")
+
+
+@resourceBp.cli.command("scheduler")
+def scheduler_command():
+    """Run the expiry scheduler in the foreground, as one dedicated process."""
+    click.echo("Expiry scheduler running; Ctrl+C to stop")
+    expiry_scheduler.run(current_app._get_current_object())
+
+
+@resourceBp.cli.command("expire-stock")
+def expire_stock_command():
+    """Send due expiry warnings, mark expired lots and release lapsed reservations (for cron)."""
+    warned, expired, released = expire_due()
+    click.echo(f"Warned about {warned} lots, expired {expired} lots, released {released} reservations")
@@ -0,0 +1,202 @@
+# app/Resource/stock.py
+"""
+Stock ledger helpers.
+
+Every change to Resource.quantity goes through adjust_stock(), which applies the
+delta with a single `UPDATE resources SET quantity = quantity + :d` (no
+read-modify-write) and appends a StockMovement row in the same transaction.
+Callers commit.
+
+The quantity column is the fast path; the ledger plus periodic StockSnapshot rows
+lets the level be re-derived and audited.
+"""
+import hashlib
+from datetime import datetime, timedelta
+from sqlalchemy import update, func, or_
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Resource, StockMovement, StockSnapshot
+
+MOVEMENT_TYPES = {"donation_in", "allocation_out", "adjustment"}
+
+
+class InsufficientStock(Exception):
+    """Raised by adjust_stock(strict=True) when a decrement would go below zero."""
+
+
+def usable(now=None):
+    """Filter for stock that can still be handed out (not past its expiry date)."""
+    return or_(Resource.expires_at.is_(None), Resource.expires_at > (now or datetime.utcnow()))
+
+
+def find_stock(resource_type, disaster_id, unit=None, expires_at=None):
+    """Id of the stock row for (disaster, type), via ix_resources_disaster_type.
+
+    When `unit` is given only a row counted in that unit matches, so stock kept
+    in "tons" never absorbs a donation counted in "kg". Perishable lots only
+    merge with lots of the same expiry date.
+    """
+    query = db.session.query(Resource.id).filter(Resource.disaster_id == disaster_id,
+                                                 Resource.resource_type == resource_type,
+                                                 Resource.expires_at.is_(None) if expires_at is None
+                                                 else Resource.expires_at == expires_at)
+    if unit and unit.strip():
+        query = query.filter(func.lower(Resource.unit) == unit.strip().lower())
+    return query.order_by(Resource.id).limit(1).scalar()
+
+
+def adjust_stock(resource_id, delta, movement_type, user_id=None, donation_id=None,
+                 relief_request_id=None, note=None, name=None, strict=False):
+    """Atomically add `delta` to a resource and record it. Returns the delta applied.
+
+    Decrements never take stock below zero or into quantities held by active
+    reservations (see reservations.py): if there is not enough, the free stock
+    is drained and the ledger records what was actually removed, or
+    InsufficientStock is raised when `strict` is set.
+    """
+    if movement_type not in MOVEMENT_TYPES:
+        raise ValueError(f"Unknown movement type: {movement_type}")
+
+    resource_type, disaster_id = db.session.query(Resource.resource_type, Resource.disaster_id) \
+        .filter(Resource.id == resource_id).one()
+
+    # The StockMovement row below records which disaster moved, so caches keyed
+    # by disaster can skip treating this bulk UPDATE as "anything changed"
+    options = {"synchronize_session": False, "stock_ledger": True}
+
+    applied = delta
+    # normalized_quantity is moved by the same delta (see units.py); NULL factors stay NULL
+    values = {
+        "quantity": Resource.quantity + delta,
+        "normalized_quantity": Resource.normalized_quantity + delta * Resource.unit_factor,
+    }
+    if name:
+        values["name"] = name
+
+    stmt = update(Resource).where(Resource.id == resource_id)
+    if delta < 0:
+        stmt = stmt.where(Resource.quantity - Resource.reserved_quantity + delta >= 0)
+    result = db.session.execute(stmt.values(**values), execution_options=options)
+
+    if result.rowcount == 0 and delta < 0:
+        if strict:
+            raise InsufficientStock(f"Resource {resource_id} has less than {-delta} available")
+        free = (db.session.query(Resource.quantity - Resource.reserved_quantity)
+                .filter(Resource.id == resource_id)
+                .with_for_update()
+                .scalar()) or 0
+        applied = -max(free, 0)
+        db.session.execute(
+            update(Resource).where(Resource.id == resource_id).values(
+                quantity=Resource.quantity + applied,
+                normalized_quantity=Resource.normalized_quantity + applied * Resource.unit_factor,
+            ),
+            execution_options=options,
+        )
+
+    db.session.add(StockMovement(
+        resource_id=resource_id,
+        disaster_id=disaster_id,
+        resource_type=resource_type,
+        movement_type=movement_type,
+        delta=applied,
+        donation_id=donation_id,
+        relief_request_id=relief_request_id,
+        user_id=user_id,
+        note=note,
+        created_at=datetime.utcnow(),
+    ))
+    return applied
+
+
+def stock_key(resource_type, disaster_id, unit=None, expires_at=None):
+    unit = unit.strip().lower() if unit and unit.strip() else ""
+    raw = f"{disaster_id}:{resource_type}:{unit}:{expires_at.isoformat() if expires_at else ''}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def ensure_stock(resource_type, disaster_id, name=None, unit=None, added_by=None, expires_at=None):
+    """Return the stock row id for (disaster, type, unit), creating an empty row if needed.
+
+    The new row carries a unique stock_key; if a concurrent first donation
+    created it meanwhile, the insert fails under a savepoint and that row is
+    used instead.
+    """
+    resource_id = find_stock(resource_type, disaster_id, unit, expires_at)
+    if resource_id is None:
+        res = Resource(
+            name=name or "Unknown",
+            resource_type=resource_type,
+            quantity=0,
+            unit=unit,
+            disaster_id=disaster_id,
+            added_by=added_by,
+            expires_at=expires_at,
+            stock_key=stock_key(resource_type, disaster_id, unit, expires_at),
+        )
+        try:
+            with db.session.begin_nested():
+                db.session.add(res)
+            resource_id = res.id
+        except IntegrityError:
+            # Another transaction created the row first
+            resource_id = find_stock(resource_type, disaster_id, unit, expires_at)
+    return resource_id
+
+
+# ----------------------------
+# Derived stock & snapshots
+# ----------------------------
+def latest_snapshot(resource_id):
+    return (StockSnapshot.query
+            .filter_by(resource_id=resource_id)
+            .order_by(StockSnapshot.last_movement_id.desc())
+            .first())
+
+
+def ledger_quantity(resource_id):
+    """Stock level re-derived from the latest snapshot plus later ledger rows."""
+    snapshot = latest_snapshot(resource_id)
+    base, after = (snapshot.quantity, snapshot.last_movement_id) if snapshot else (0, 0)
+    delta = (db.session.query(func.coalesce(func.sum(StockMovement.delta), 0))
+             .filter(StockMovement.resource_id == resource_id, StockMovement.id > after)
+             .scalar())
+    return base + int(delta)
+
+
+def take_snapshots(settle_seconds=60):
+    """Snapshot every resource that moved since the last run. Returns rows written.
+
+    Ledger rows younger than `settle_seconds` are left for the next run so a
+    transaction still in flight cannot commit an id below the snapshot mark.
+    """
+    last_run = db.session.query(func.max(StockSnapshot.last_movement_id)).scalar() or 0
+    settled = datetime.utcnow() - timedelta(seconds=settle_seconds)
+    upto = (db.session.query(func.max(StockMovement.id))
+            .filter(StockMovement.created_at < settled)
+            .scalar()) or 0
+    if upto <= last_run:
+        return 0
+
+    deltas = dict(db.session.query(StockMovement.resource_id, func.sum(StockMovement.delta))
+                  .filter(StockMovement.id > last_run, StockMovement.id <= upto)
+                  .group_by(StockMovement.resource_id)
+                  .all())
+
+    latest = (db.session.query(StockSnapshot.resource_id, func.max(StockSnapshot.last_movement_id).label("m"))
+              .filter(StockSnapshot.resource_id.in_(deltas))
+              .group_by(StockSnapshot.resource_id)
+              .subquery())
+    bases = dict(db.session.query(StockSnapshot.resource_id, StockSnapshot.quantity)
+                 .join(latest, (StockSnapshot.resource_id == latest.c.resource_id)
+                       & (StockSnapshot.last_movement_id == latest.c.m))
+                 .all())
+
+    now = datetime.utcnow()
+    db.session.bulk_insert_mappings(StockSnapshot, [{
+        "resource_id": resource_id,
+        "quantity": bases.get(resource_id, 0) + int(delta),
+        "last_movement_id": upto,
+        "taken_at": now,
+    } for resource_id, delta in deltas.items()])
+    db.session.commit()
+    return len(deltas)
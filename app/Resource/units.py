@@ -0,0 +1,121 @@
+# app/Resource/units.py
+"""
+Unit registry and normalized quantities for resources and donations.
+
+Each row stores the canonical unit for its resource type, the factor that
+converts its own unit into that canonical unit, and
+normalized_quantity = quantity * unit_factor. This lets SUM/GROUP BY over stock
+and donations run in SQL.
+
+Rows whose unit cannot be converted to the type's canonical unit (for example
+water counted in "bottles") get NULLs, so they are left out of totals rather
+than summed wrongly.
+"""
+from sqlalchemy import event, inspect, update
+from app.models import db, Resource, Donation
+
+# alias -> (base unit, factor to base unit)
+UNIT_ALIASES = {
+    # mass
+    "kg": ("kg", 1), "kgs": ("kg", 1), "kilo": ("kg", 1), "kilos": ("kg", 1),
+    "kilogram": ("kg", 1), "kilograms": ("kg", 1),
+    "g": ("kg", 0.001), "gm": ("kg", 0.001), "gram": ("kg", 0.001), "grams": ("kg", 0.001),
+    "t": ("kg", 1000), "ton": ("kg", 1000), "tons": ("kg", 1000),
+    "tonne": ("kg", 1000), "tonnes": ("kg", 1000),
+    "lb": ("kg", 0.453592), "lbs": ("kg", 0.453592), "pound": ("kg", 0.453592), "pounds": ("kg", 0.453592),
+    # volume
+    "l": ("l", 1), "ltr": ("l", 1), "ltrs": ("l", 1), "liter": ("l", 1), "liters": ("l", 1),
+    "litre": ("l", 1), "litres": ("l", 1),
+    "ml": ("l", 0.001), "milliliter": ("l", 0.001), "milliliters": ("l", 0.001),
+    "gal": ("l", 3.78541), "gallon": ("l", 3.78541), "gallons": ("l", 3.78541),
+    # counts
+    "unit": ("unit", 1), "units": ("unit", 1), "pc": ("unit", 1), "pcs": ("unit", 1),
+    "piece": ("unit", 1), "pieces": ("unit", 1), "item": ("unit", 1), "items": ("unit", 1),
+    "nos": ("unit", 1),
+    "pack": ("pack", 1), "packs": ("pack", 1), "packet": ("pack", 1), "packets": ("pack", 1),
+    "box": ("box", 1), "boxes": ("box", 1),
+    "kit": ("kit", 1), "kits": ("kit", 1),
+}
+
+# resource type -> canonical unit
+CANONICAL_UNITS = {
+    "food": "kg", "rice": "kg", "flour": "kg", "grain": "kg", "sugar": "kg", "lentils": "kg",
+    "water": "l", "milk": "l", "fuel": "l",
+    "medicine": "unit", "medical": "unit", "blanket": "unit", "blankets": "unit",
+    "tent": "unit", "tents": "unit", "clothes": "unit", "clothing": "unit",
+}
+
+
+def normalize_name(value):
+    return (value or "").strip().lower()
+
+
+def convert(resource_type, unit):
+    """Return (canonical_unit, factor) for a row, or (None, None) if not convertible."""
+    if not normalize_name(resource_type):
+        return None, None
+    canonical = CANONICAL_UNITS.get(normalize_name(resource_type))
+    unit = normalize_name(unit)
+
+    if not unit:
+        # No unit given: assume it was entered in the type's canonical unit
+        return (canonical, 1.0) if canonical else ("unit", 1.0)
+
+    base, factor = UNIT_ALIASES.get(unit, (unit, 1))
+    if canonical and base != canonical:
+        return None, None
+    return base, float(factor)
+
+
+# ----------------------------
+# Fill on write
+# ----------------------------
+def _fill(target, quantity):
+    canonical, factor = convert(target.resource_type, target.unit)
+    target.canonical_unit = canonical
+    target.unit_factor = factor
+    target.normalized_quantity = quantity * factor if factor is not None else None
+
+
+def _fill_on_insert(mapper, connection, target):
+    _fill(target, target.quantity or 0)
+
+
+def _fill_on_update(mapper, connection, target):
+    # Stock quantities move through bulk UPDATEs, so the loaded value may be
+    # stale; unless the ORM itself is writing quantity, let SQL supply it.
+    if inspect(target).attrs.quantity.history.has_changes():
+        _fill(target, target.quantity or 0)
+    else:
+        _fill(target, mapper.class_.quantity)
+
+
+for _model in (Resource, Donation):
+    event.listen(_model, "before_insert", _fill_on_insert)
+    event.listen(_model, "before_update", _fill_on_update)
+
+
+# ----------------------------
+# Backfill
+# ----------------------------
+def backfill_units(model):
+    """Normalize every row of `model` with one UPDATE per distinct (type, unit) pair."""
+    pairs = db.session.query(model.resource_type, model.unit).distinct().all()
+    updated = 0
+    for resource_type, unit in pairs:
+        canonical, factor = convert(resource_type, unit)
+        unit_match = model.unit.is_(None) if unit is None else model.unit == unit
+        type_match = model.resource_type.is_(None) if resource_type is None else model.resource_type == resource_type
+        result = db.session.execute(
+            update(model)
+            .where(type_match, unit_match)
+            .values(
+                canonical_unit=canonical,
+                unit_factor=factor,
+                normalized_quantity=model.quantity * factor if factor is not None else None,
+            ),
+            execution_options={"synchronize_session": False},
+        )
+        updated += result.rowcount
+    db.session.commit()
+    return updated
@@ -1,5 +1,5 @@
 from flask import Blueprint
 
-userLocationBp = Blueprint('userLocationBp',__name__)
+userLocationBp = Blueprint('userLocationBp',__name__, cli_group='location')
 
 from .import routes
\ No newline at end of file
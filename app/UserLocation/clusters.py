@@ -0,0 +1,195 @@
+# app/UserLocation/clusters.py
+"""
+Grid clusters of located rows for the map.
+
+Clusters are geohash cells. A zoom level maps to the cluster precision
+whose cells are roughly 32-64 px wide on screen. Clusters are computed and
+cached per tile. A tile is the geohash cell TILE_DEPTH characters coarser
+than the clusters (32 x 32 cluster cells), so one tile is
+
+    SELECT substr(geohash, 1, :p), count(*), avg(latitude), avg(longitude)
+    WHERE geohash >= :tile AND geohash < :next_tile
+    GROUP BY 1
+
+which is one index range scan (see spatial.in_cell). A map view asks for the few tiles covering
+its bounding box, and most of them come from the cache.
+
+A committed change to a location invalidates, at every precision, only the
+tiles holding its old and new geohash. Bulk statements and role changes
+drop the affected layers. The commit hooks only see this process's writes,
+so tiles also expire after `max_age` seconds.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+from app.models import db, User, UserLocation, ReliefCamp
+from .spatial import GEOHASH_PRECISION, box_cells, box_prefixes, in_cell
+
+TILE_DEPTH = 2
+MAX_CLUSTER_PRECISION = GEOHASH_PRECISION - 1
+MAX_TILES = 64
+
+
+def _volunteers(query):
+    return query.join(User, User.id == UserLocation.user_id).filter(User.role == "volunteer")
+
+
+# layer name -> (model, extra filtering of the base query)
+LAYERS = {
+    "volunteers": (UserLocation, _volunteers),
+    "users": (UserLocation, None),
+    "camps": (ReliefCamp, None),
+}
+
+
+def cluster_precision(zoom):
+    """Geohash precision whose cells are 32-64 px wide at a web-map zoom level."""
+    # a cell is 360 / 2**lon_bits degrees wide and the map is 256 * 2**zoom px around
+    return min(max(math.ceil(2 * (int(zoom) + 2) / 5), 1), MAX_CLUSTER_PRECISION)
+
+
+def tile_precision(precision):
+    return max(precision - TILE_DEPTH, 0)
+
+
+def tiles_for_box(south, west, north, east, precision):
+    """Tile prefixes covering a bounding box; None if there would be more than MAX_TILES."""
+    tp = tile_precision(precision)
+    if tp == 0:
+        return [""]
+    (first_row, last_row), (first_col, last_col) = box_cells(south, west, north, east, tp)
+    if (last_row - first_row + 1) * (last_col - first_col + 1) > MAX_TILES:
+        return None
+    return box_prefixes(south, west, north, east, tp)
+
+
+def compute_tile(layer, precision, tile):
+    model, scope = LAYERS[layer]
+    cell = func.substr(model.geohash, 1, precision)
+    query = (db.session.query(cell, func.count(model.id), func.avg(model.latitude), func.avg(model.longitude))
+             .filter(in_cell(model.geohash, tile)))
+    if scope is not None:
+        query = scope(query)
+    return [{
+        "geohash": geohash,
+        "count": count,
+        "latitude": round(float(lat), 6),
+        "longitude": round(float(lon), 6),
+    } for geohash, count, lat, lon in query.group_by(cell)]
+
+
+# ----------------------------
+# Cache
+# ----------------------------
+class ClusterCache:
+    def __init__(self, max_age=300, max_tiles=20000):
+        self.max_age = max_age
+        self.max_tiles = max_tiles
+        self._lock = threading.Lock()
+        self._tiles = OrderedDict()   # (layer, precision, tile) -> (built_at, clusters)
+
+    def get(self, layer, precision, tile):
+        key = (layer, precision, tile)
+        with self._lock:
+            entry = self._tiles.get(key)
+            if entry and time.monotonic() - entry[0] <= self.max_age:
+                self._tiles.move_to_end(key)
+                return entry[1]
+        clusters = compute_tile(layer, precision, tile)
+        with self._lock:
+            self._tiles[key] = (time.monotonic(), clusters)
+            self._tiles.move_to_end(key)
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+        return clusters
+
+    def invalidate(self, layers, geohashes):
+        """Drop the tiles of `layers` that contain any of `geohashes`, at every precision."""
+        with self._lock:
+            for geohash in geohashes:
+                for precision in range(1, MAX_CLUSTER_PRECISION + 1):
+                    tile = geohash[:tile_precision(precision)]
+                    for layer in layers:
+                        self._tiles.pop((layer, precision, tile), None)
+
+    def drop_layers(self, layers):
+        with self._lock:
+            for key in [k for k in self._tiles if k[0] in layers]:
+                del self._tiles[key]
+
+
+cluster_cache = ClusterCache()
+
+
+def clusters_in_box(layer, south, west, north, east, zoom):
+    """Clusters of `layer` in a bounding box at a zoom level; None if the box is too big for the zoom."""
+    precision = cluster_precision(zoom)
+    if east < west:
+        east += 360.0   # box crosses the antimeridian
+    tiles = tiles_for_box(south, west, north, east, precision)
+    if tiles is None:
+        return None
+    span = east - west
+    clusters = []
+    for tile in tiles:
+        clusters.extend(c for c in cluster_cache.get(layer, precision, tile)
+                        if south <= c["latitude"] <= north
+                        and (span >= 360.0 or (c["longitude"] - west) % 360.0 <= span))
+    return {"precision": precision, "tiles": len(tiles), "clusters": clusters}
+
+
+# ----------------------------
+# SQLAlchemy change tracking
+# ----------------------------
+_INFO_KEY = "cluster_cache_geohashes"
+
+
+def layers_of(model):
+    return {name for name, (layer_model, _) in LAYERS.items() if layer_model is model}
+
+
+@event.listens_for(Session, "after_flush")
+def _collect(session, flush_context):
+    changed = session.info.setdefault(_INFO_KEY, {})
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (UserLocation, ReliefCamp)):
+            history = inspect(obj).attrs.geohash.history
+            if obj in session.dirty and not history.has_changes():
+                continue
+            geohashes = {g for g in (obj.geohash, *history.deleted) if g}
+            changed.setdefault(type(obj), set()).update(geohashes)
+        elif isinstance(obj, User) and inspect(obj).attrs.role.history.has_changes():
+            session.info[_INFO_KEY + "_all"] = session.info.get(_INFO_KEY + "_all", set()) | {"volunteers"}
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ not in (UserLocation, ReliefCamp, User):
+        return
+    if orm_execute_state.execution_options.get("location_ingest"):
+        return  # the ingest flush invalidates the tiles it touched itself
+    layers = layers_of(mapper.class_) if mapper.class_ is not User else {"volunteers"}
+    session = orm_execute_state.session
+    session.info[_INFO_KEY + "_all"] = session.info.get(_INFO_KEY + "_all", set()) | layers
+
+
+@event.listens_for(Session, "after_commit")
+def _apply(session):
+    changed = session.info.pop(_INFO_KEY, None)
+    dropped = session.info.pop(_INFO_KEY + "_all", None)
+    if dropped:
+        cluster_cache.drop_layers(dropped)
+    for model, geohashes in (changed or {}).items():
+        cluster_cache.invalidate(layers_of(model), geohashes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop(_INFO_KEY, None)
+    session.info.pop(_INFO_KEY + "_all", None)
@@ -0,0 +1,190 @@
+# app/UserLocation/geocode.py
+"""
+Offline geocoding of free-text locations.
+
+Place names are resolved against a gazetteer file loaded from disk. Nothing
+goes over the network. The file is GAZETTEER_PATH from the app config, or
+the bundled gazetteer.csv. Two formats are read:
+
+  * CSV with a header: name, latitude, longitude[, aliases separated by "|"]
+  * a GeoNames dump (.txt/.tsv, tab separated); when two places share a
+    name, the more populous one wins
+
+A location is tried whole, then as each whole comma-separated part from the
+first (most specific) to the last, and only then as word runs of up to
+MAX_WORDS words, longest first, starting from the last part. The first
+gazetteer hit is used. So "Delhi Road, Mumbai" resolves to Mumbai, not to
+the road's namesake, and "Relief camp near Kochi" still finds Kochi. Results
+for normalized strings are kept in an LRU cache, since the same few place
+names repeat across disasters, camps and volunteers.
+
+Disaster, ReliefCamp and VolunteerProfile rows get latitude/longitude when
+their location is written. Coordinates set explicitly in the same flush are
+kept.
+"""
+import csv
+import os
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, update
+from app.models import db, Disaster, ReliefCamp, VolunteerProfile
+
+BUNDLED_GAZETTEER = os.path.join(os.path.dirname(__file__), "gazetteer.csv")
+GEOCODED_MODELS = (Disaster, ReliefCamp, VolunteerProfile)
+CACHE_SIZE = 4096
+MAX_WORDS = 4
+
+_gazetteer = None
+_lock = threading.Lock()
+
+
+def normalize_place(text):
+    """Lowercase ASCII words separated by single spaces; commas are kept."""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode().lower()
+    text = re.sub(r"[^a-z0-9,]+", " ", text)
+    return ",".join(" ".join(part.split()) for part in text.split(",")).strip(", ")
+
+
+# ----------------------------
+# Gazetteer
+# ----------------------------
+def _read_csv(handle):
+    for row in csv.DictReader(handle):
+        names = [row["name"]] + [a for a in (row.get("aliases") or "").split("|") if a.strip()]
+        yield names, float(row["latitude"]), float(row["longitude"]), 0
+
+
+def _read_geonames(handle):
+    for line in handle:
+        cols = line.rstrip("\n").split("\t")
+        if len(cols) < 15:
+            continue
+        names = [cols[1], cols[2]] + [a for a in cols[3].split(",") if a]
+        yield names, float(cols[4]), float(cols[5]), int(cols[14] or 0)
+
+
+def load_gazetteer(path):
+    """Read a gazetteer file into {normalized name: (lat, lon)}."""
+    reader = _read_geonames if path.endswith((".txt", ".tsv")) else _read_csv
+    places, population = {}, {}
+    with open(path, newline="", encoding="utf-8") as handle:
+        for names, lat, lon, pop in reader(handle):
+            for name in names:
+                key = normalize_place(name).replace(",", " ")
+                if key and (key not in places or pop > population[key]):
+                    places[key] = (lat, lon)
+                    population[key] = pop
+    return places
+
+
+def gazetteer():
+    global _gazetteer
+    if _gazetteer is None:
+        with _lock:
+            if _gazetteer is None:
+                path = current_app.config.get("GAZETTEER_PATH") if has_app_context() else None
+                _gazetteer = load_gazetteer(path or BUNDLED_GAZETTEER)
+    return _gazetteer
+
+
+def reload_gazetteer():
+    """Forget the loaded gazetteer and cached lookups (e.g. after changing the file)."""
+    global _gazetteer
+    with _lock:
+        _gazetteer = None
+    _lookup.cache_clear()
+
+
+# ----------------------------
+# Lookups
+# ----------------------------
+def _candidates(normalized):
+    """Whole text, then whole comma parts (most specific first), then word n-grams.
+
+    N-grams start from the last part: leading parts are usually streets or
+    landmarks, which are often named after other places ("Delhi Road, Mumbai").
+    """
+    yield normalized.replace(",", " ")
+    parts = [p.strip() for p in normalized.split(",") if p.strip()]
+    yield from parts
+    for part in reversed(parts):
+        words = part.split()
+        for size in range(min(MAX_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                yield " ".join(words[start:start + size])
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _lookup(normalized):
+    places = gazetteer()
+    for candidate in _candidates(normalized):
+        if candidate in places:
+            return places[candidate]
+    return None
+
+
+def geocode(text):
+    """(latitude, longitude) for a free-text location, or None if no place matches."""
+    normalized = normalize_place(text)
+    return _lookup(normalized) if normalized else None
+
+
+# ----------------------------
+# Resolving on write
+# ----------------------------
+def _resolve(target):
+    coords = geocode(target.location)
+    target.latitude, target.longitude = coords if coords else (None, None)
+
+
+def _on_insert(mapper, connection, target):
+    if target.latitude is None and target.longitude is None:
+        _resolve(target)
+
+
+def _on_update(mapper, connection, target):
+    attrs = inspect(target).attrs
+    if attrs.location.history.has_changes() and not (attrs.latitude.history.has_changes()
+                                                      or attrs.longitude.history.has_changes()):
+        _resolve(target)
+
+
+for _model in GEOCODED_MODELS:
+    event.listen(_model, "before_insert", _on_insert)
+    event.listen(_model, "before_update", _on_update)
+
+
+# ----------------------------
+# Backfill
+# ----------------------------
+def backfill_coordinates(models=GEOCODED_MODELS, refresh=False):
+    """Geocode existing rows, one lookup and one UPDATE per distinct location string.
+
+    Only rows without coordinates are touched unless `refresh` is set. The
+    UPDATEs bypass the mapper events, so geohashes of indexed tables are not
+    set here; the `geocode` command recomputes them afterwards.
+    Returns {table name: (rows updated, distinct locations left unresolved)}.
+    """
+    report = {}
+    for model in models:
+        pending = [] if refresh else [model.latitude.is_(None)]
+        locations = [loc for (loc,) in db.session.query(model.location).distinct()
+                     .filter(model.location.isnot(None), *pending)]
+        updated = unresolved = 0
+        for location in locations:
+            coords = geocode(location)
+            if coords is None:
+                unresolved += 1
+                continue
+            result = db.session.execute(
+                update(model).where(model.location == location, *pending)
+                .values(latitude=coords[0], longitude=coords[1]),
+                execution_options={"synchronize_session": False},
+            )
+            updated += result.rowcount
+        db.session.commit()
+        report[model.__tablename__] = (updated, unresolved)
+    return report
@@ -0,0 +1,164 @@
+# app/UserLocation/history.py
+"""
+Location history in hourly, delta-encoded buckets.
+
+Each user gets one LocationTrack row per hour with any points. Points are
+(seconds into the hour, lat * 1e5, lon * 1e5), which is about 1 m of
+precision. Each point is stored as the difference from the previous point,
+as three zigzag varints. Consecutive pings are close in time and space, so
+a point usually takes 4-7 bytes instead of a row of its own.
+
+The row also keeps the last point, so appending never decodes the blob,
+and the hour's bounding box, so an area query only decodes buckets that
+overlap the area:
+
+  * trajectory(user, t1, t2) reads that user's buckets in [t1, t2] through
+    the (user_id, bucket_start) unique index;
+  * present_in_area(box, t1, t2) reads buckets in [t1, t2] through the
+    (bucket_start, min_lat) index, skips those whose box misses the area,
+    and decodes only the rest.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from sqlalchemy import insert, update, tuple_
+from app.models import db, LocationTrack
+
+SCALE = 100000
+APPEND_CHUNK = 500
+
+
+def bucket_of(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+# ----------------------------
+# Encoding
+# ----------------------------
+def _put_varint(value, out):
+    value = value * 2 if value >= 0 else -value * 2 - 1   # zigzag
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_points(points, previous=(0, 0, 0)):
+    """Delta-encode (offset, lat_e5, lon_e5) triples, starting from `previous`."""
+    out = bytearray()
+    for point in points:
+        for value, before in zip(point, previous):
+            _put_varint(value - before, out)
+        previous = point
+    return bytes(out)
+
+
+def decode_points(blob):
+    values, shift, value = [], 0, 0
+    for byte in blob:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append(value >> 1 if not value & 1 else -(value >> 1) - 1)
+        shift = value = 0
+    points, previous = [], (0, 0, 0)
+    for i in range(0, len(values), 3):
+        previous = tuple(before + delta for before, delta in zip(previous, values[i:i + 3]))
+        points.append(previous)
+    return points
+
+
+def _expand(bucket_start, blob):
+    """(recorded_at, lat, lon) for a bucket's points, in time order."""
+    return sorted((bucket_start + timedelta(seconds=offset), lat / SCALE, lon / SCALE)
+                  for offset, lat, lon in decode_points(blob))
+
+
+# ----------------------------
+# Appending
+# ----------------------------
+def append_points(points):
+    """Add (user_id, recorded_at, lat, lon) points to the history. Callers commit.
+
+    Existing buckets are read FOR UPDATE, so two appends to the same hour
+    (the ping flusher and POST /userLocation/) serialize instead of one
+    overwriting the other's points. Two concurrent first points of an hour
+    make one caller fail on uq_location_track_bucket; retry it.
+    """
+    by_bucket = defaultdict(list)
+    for user_id, recorded_at, lat, lon in points:
+        bucket = bucket_of(recorded_at)
+        by_bucket[(user_id, bucket)].append((int((recorded_at - bucket).total_seconds()),
+                                             round(lat * SCALE), round(lon * SCALE)))
+    keys = sorted(by_bucket)
+    for i in range(0, len(keys), APPEND_CHUNK):
+        chunk = keys[i:i + APPEND_CHUNK]
+        existing = {(row.user_id, row.bucket_start): row for row in
+                    db.session.query(LocationTrack.id, LocationTrack.user_id, LocationTrack.bucket_start,
+                                     LocationTrack.points, LocationTrack.point_count, LocationTrack.last_offset,
+                                     LocationTrack.last_lat, LocationTrack.last_lon, LocationTrack.min_lat,
+                                     LocationTrack.max_lat, LocationTrack.min_lon, LocationTrack.max_lon)
+                    .filter(tuple_(LocationTrack.user_id, LocationTrack.bucket_start).in_(chunk))
+                    .with_for_update()}
+        updates, inserts = [], []
+        for key in chunk:
+            new = sorted(by_bucket[key])
+            lats = [lat / SCALE for _, lat, _ in new]
+            lons = [lon / SCALE for _, _, lon in new]
+            row = existing.get(key)
+            if row is None:
+                inserts.append({
+                    "user_id": key[0], "bucket_start": key[1], "points": encode_points(new),
+                    "point_count": len(new), "last_offset": new[-1][0], "last_lat": new[-1][1],
+                    "last_lon": new[-1][2], "min_lat": min(lats), "max_lat": max(lats),
+                    "min_lon": min(lons), "max_lon": max(lons),
+                })
+                continue
+            updates.append({
+                "id": row.id,
+                "points": row.points + encode_points(new, (row.last_offset, row.last_lat, row.last_lon)),
+                "point_count": row.point_count + len(new),
+                "last_offset": new[-1][0], "last_lat": new[-1][1], "last_lon": new[-1][2],
+                "min_lat": min(row.min_lat, *lats), "max_lat": max(row.max_lat, *lats),
+                "min_lon": min(row.min_lon, *lons), "max_lon": max(row.max_lon, *lons),
+            })
+        if updates:
+            db.session.execute(update(LocationTrack), updates)
+        if inserts:
+            db.session.execute(insert(LocationTrack), inserts)
+
+
+# ----------------------------
+# Queries
+# ----------------------------
+def trajectory(user_id, start, end):
+    """(recorded_at, lat, lon) points of one user between `start` and `end`, in time order."""
+    rows = (db.session.query(LocationTrack.bucket_start, LocationTrack.points)
+            .filter(LocationTrack.user_id == user_id,
+                    LocationTrack.bucket_start >= bucket_of(start),
+                    LocationTrack.bucket_start <= end)
+            .order_by(LocationTrack.bucket_start))
+    return [point for bucket_start, blob in rows for point in _expand(bucket_start, blob)
+            if start <= point[0] <= end]
+
+
+def present_in_area(south, west, north, east, start, end):
+    """Users with a point inside the box between `start` and `end`.
+
+    Returns {user_id: {"first_seen", "last_seen", "points"}}.
+    """
+    rows = (db.session.query(LocationTrack.user_id, LocationTrack.bucket_start, LocationTrack.points)
+            .filter(LocationTrack.bucket_start >= bucket_of(start),
+                    LocationTrack.bucket_start <= end,
+                    LocationTrack.min_lat <= north, LocationTrack.max_lat >= south,
+                    LocationTrack.min_lon <= east, LocationTrack.max_lon >= west))
+    seen = {}
+    for user_id, bucket_start, blob in rows:
+        for recorded_at, lat, lon in _expand(bucket_start, blob):
+            if not (start <= recorded_at <= end and south <= lat <= north and west <= lon <= east):
+                continue
+            entry = seen.setdefault(user_id, {"first_seen": recorded_at, "last_seen": recorded_at, "points": 0})
+            entry["first_seen"] = min(entry["first_seen"], recorded_at)
+            entry["last_seen"] = max(entry["last_seen"], recorded_at)
+            entry["points"] += 1
+    return seen
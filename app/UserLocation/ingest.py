@@ -0,0 +1,261 @@
+# app/UserLocation/ingest.py
+"""
+Buffered ingestion of location pings.
+
+Devices post pings in batches. A ping is not written on arrival. It goes
+into an in-memory buffer that keeps only the newest point per user, so a
+volunteer pinging every few seconds costs one row write per flush, not one
+per ping. A background thread flushes the buffer every `interval` seconds,
+or sooner once `max_pending` users are waiting. The buffer belongs to one
+process, so the thread only runs where LOCATION_INGEST is set; elsewhere the
+pings route flushes each batch itself. A flush is:
+
+  * one SELECT of the users' current rows per chunk,
+  * one executemany UPDATE by primary key for users who already have a row,
+    and one multi-row INSERT for the rest,
+  * one commit.
+
+Points older than what is already stored are skipped, so a late batch
+cannot move a user backwards. Every flushed point, late or not, is also
+appended to the location history (history.py) in the same commit. The flush
+invalidates exactly the map tiles it touched (see clusters.py). If the
+database is unavailable, the points go back into the buffer unless newer
+ones have arrived meanwhile. Any other failure (say, a user deleted after
+their ping was buffered) is narrowed down by writing the batch in halves;
+the points that still fail on their own are dropped and counted, so one bad
+row cannot block every later flush.
+
+metrics() reports throughput, coalescing and lag: how long the oldest
+buffered ping has been waiting.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from app.models import db, UserLocation
+from .spatial import encode
+from .clusters import cluster_cache, layers_of
+from .history import append_points
+
+log = logging.getLogger(__name__)
+
+FLUSH_CHUNK = 1000
+THROUGHPUT_WINDOW = 60   # seconds
+DROPPED_KEPT = 100       # user ids of recently dropped points shown in metrics()
+
+
+def valid_point(lat, lon):
+    return -90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0
+
+
+def write_locations(points):
+    """Upsert {user_id: (recorded_at, lat, lon)} into user_locations.
+
+    Returns (rows written, geohashes touched). Callers commit.
+    """
+    written, touched = 0, set()
+    user_ids = sorted(points)
+    for i in range(0, len(user_ids), FLUSH_CHUNK):
+        chunk = user_ids[i:i + FLUSH_CHUNK]
+        rows = (db.session.query(UserLocation.user_id, UserLocation.id, UserLocation.geohash,
+                                 UserLocation.updated_at)
+                .filter(UserLocation.user_id.in_(chunk)))
+        existing = {user_id: (row_id, geohash, updated_at)
+                    for user_id, row_id, geohash, updated_at in rows}
+        updates, inserts = [], []
+        for user_id in chunk:
+            recorded_at, lat, lon = points[user_id]
+            geohash = encode(lat, lon)
+            row = {"latitude": lat, "longitude": lon, "geohash": geohash, "updated_at": recorded_at}
+            if user_id in existing:
+                row_id, old_geohash, updated_at = existing[user_id]
+                if updated_at is not None and updated_at > recorded_at:
+                    continue
+                updates.append(dict(row, id=row_id))
+                touched.update(g for g in (old_geohash, geohash) if g)
+            else:
+                inserts.append(dict(row, user_id=user_id))
+                touched.add(geohash)
+        if updates:
+            db.session.execute(update(UserLocation), updates,
+                               execution_options={"location_ingest": True})
+        if inserts:
+            db.session.execute(insert(UserLocation), inserts,
+                               execution_options={"location_ingest": True})
+        written += len(updates) + len(inserts)
+    return written, touched
+
+
+class LocationIngestor:
+    def __init__(self, interval=2.0, max_pending=5000):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._cond = threading.Condition()
+        self._pending = {}     # user_id -> (recorded_at, lat, lon, first received (monotonic))
+        self._thread = None
+        self._flush_lock = threading.Lock()
+        self._counts = {"received": 0, "rejected": 0, "coalesced": 0, "written": 0, "stale": 0,
+                        "dropped": 0, "flushes": 0, "failed_flushes": 0}
+        self._recent = deque()  # (monotonic, rows written)
+        self._dropped = deque(maxlen=DROPPED_KEPT)
+        self._last_flush = None
+
+    def start(self, app):
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, args=(app,),
+                                            name="location-ingest", daemon=True)
+            self._thread.start()
+
+    def submit(self, pings):
+        """Buffer (user_id, lat, lon, recorded_at) pings. Returns (accepted, rejected)."""
+        accepted = rejected = 0
+        now = time.monotonic()
+        with self._cond:
+            for user_id, lat, lon, recorded_at in pings:
+                self._counts["received"] += 1
+                if not valid_point(lat, lon):
+                    rejected += 1
+                    continue
+                accepted += 1
+                current = self._pending.get(user_id)
+                if current is not None:
+                    self._counts["coalesced"] += 1
+                    if current[0] > recorded_at:
+                        continue
+                    self._pending[user_id] = (recorded_at, lat, lon, current[3])
+                else:
+                    self._pending[user_id] = (recorded_at, lat, lon, now)
+            self._counts["rejected"] += rejected
+            if len(self._pending) >= self.max_pending:
+                self._cond.notify()
+        return accepted, rejected
+
+    def flush(self):
+        """Write everything buffered now. Needs an app context; returns rows written."""
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            started = time.monotonic()
+            points = {user_id: entry[:3] for user_id, entry in batch.items()}
+            dropped = requeued = ()
+            try:
+                try:
+                    written, touched = self._write(points)
+                except IntegrityError:
+                    # a user's first row (or hour of history) was inserted elsewhere meanwhile
+                    db.session.rollback()
+                    written, touched = self._write(points)
+            except OperationalError:
+                db.session.rollback()
+                self._requeue(batch)
+                with self._cond:
+                    self._counts["failed_flushes"] += 1
+                raise
+            except Exception:
+                db.session.rollback()
+                log.exception("location flush failed; retrying %d users in parts", len(points))
+                written, touched, dropped, requeued = self._write_parts(batch)
+            cluster_cache.invalidate(layers_of(UserLocation), touched)
+
+            finished = time.monotonic()
+            with self._cond:
+                self._counts["written"] += written
+                self._counts["stale"] += len(points) - written - len(dropped) - len(requeued)
+                self._counts["dropped"] += len(dropped)
+                self._dropped.extend(dropped)
+                self._counts["flushes"] += 1
+                self._recent.append((finished, written))
+                self._last_flush = {
+                    "at": datetime.utcnow().isoformat(),
+                    "rows": written,
+                    "duration_ms": round((finished - started) * 1000, 2),
+                    "lag_seconds": round(finished - min(entry[3] for entry in batch.values()), 3),
+                }
+            return written
+
+    @staticmethod
+    def _write(points):
+        written, touched = write_locations(points)
+        append_points((user_id, recorded_at, lat, lon)
+                      for user_id, (recorded_at, lat, lon) in points.items())
+        db.session.commit()
+        return written, touched
+
+    def _write_parts(self, batch):
+        """Write a failing batch in halves. A single user whose point still fails is
+        dropped; if the database becomes unavailable meanwhile, the part being
+        written is requeued.
+
+        Returns (rows written, geohashes touched, dropped user ids, requeued user ids).
+        """
+        points = {user_id: entry[:3] for user_id, entry in batch.items()}
+        try:
+            written, touched = self._write(points)
+            return written, touched, [], []
+        except OperationalError:
+            db.session.rollback()
+            self._requeue(batch)
+            return 0, set(), [], list(batch)
+        except Exception:
+            db.session.rollback()
+            if len(batch) == 1:
+                log.warning("dropping location point of user %s that cannot be written", *batch)
+                return 0, set(), list(batch), []
+        user_ids = sorted(batch)
+        half = len(user_ids) // 2
+        written, touched, dropped, requeued = 0, set(), [], []
+        for part in (user_ids[:half], user_ids[half:]):
+            result = self._write_parts({user_id: batch[user_id] for user_id in part})
+            part_written, part_touched, part_dropped, part_requeued = result
+            written += part_written
+            touched |= part_touched
+            dropped += part_dropped
+            requeued += part_requeued
+        return written, touched, dropped, requeued
+
+    def _requeue(self, batch):
+        with self._cond:
+            for user_id, entry in batch.items():
+                current = self._pending.get(user_id)
+                if current is None:
+                    self._pending[user_id] = entry
+                elif current[0] < entry[0]:
+                    self._pending[user_id] = entry[:3] + (min(current[3], entry[3]),)
+
+    def metrics(self):
+        now = time.monotonic()
+        with self._cond:
+            while self._recent and now - self._recent[0][0] > THROUGHPUT_WINDOW:
+                self._recent.popleft()
+            oldest = min((entry[3] for entry in self._pending.values()), default=None)
+            return dict(self._counts,
+                        pending=len(self._pending),
+                        lag_seconds=round(now - oldest, 3) if oldest is not None else 0.0,
+                        rows_per_second=round(
+                            sum(n for _, n in self._recent) / THROUGHPUT_WINDOW, 2),
+                        last_flush=self._last_flush,
+                        recently_dropped_users=list(self._dropped),
+                        flusher_running=bool(self._thread and self._thread.is_alive()))
+
+    def _run(self, app):
+        with app.app_context():
+            while True:
+                with self._cond:
+                    if len(self._pending) < self.max_pending:
+                        self._cond.wait(self.interval)
+                try:
+                    self.flush()
+                except Exception:
+                    log.exception("location flush failed")
+                finally:
+                    db.session.remove()
+
+
+location_ingestor = LocationIngestor()
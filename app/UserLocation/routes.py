@@ -1,6 +1,22 @@
-from flask import request, jsonify, session
-from app.models import db, UserLocation, AuditLog
+from flask import request, jsonify, session, current_app
+from datetime import datetime, timedelta, timezone
+from app.models import db, UserLocation, AuditLog, User, VolunteerProfile, ReliefCamp
 from . import userLocationBp
+from .geocode import GEOCODED_MODELS, backfill_coordinates
+from .spatial import within_radius, nearest, backfill_geohashes
+from .clusters import LAYERS, cluster_cache, clusters_in_box, layers_of
+from .ingest import location_ingestor
+from .history import append_points, trajectory, present_in_area
+from sqlalchemy.exc import IntegrityError
+import click
+
+COORDINATOR_ROLES = {"admin", "super_admin", "campManager"}
+MAX_RADIUS_KM = 500
+MAX_RESULTS = 500
+PUBLIC_LAYERS = {"camps"}
+MAX_PINGS = 1000
+MAX_HISTORY_WINDOW = timedelta(days=7)
+MAX_AREA_WINDOW = timedelta(days=1)
 
 # ----------------------------
 # Audit Log Helper
@@ -14,19 +30,7 @@ def log_action(user_id, action, details=""):
 # ----------------------------
 # Create or Update User Location
 # ----------------------------
-@userLocationBp.route('/', methods=['POST'])
-def update_or_create_location():
-    # Get logged-in user from session
-    user_session = session.get("user")
-    if not user_session:
-        return jsonify({"message": "Unauthorized"}), 401
-
-    user_id = int(user_session["id"])  # stored as string in session
-    data = request.get_json()
-
-    if not data or "latitude" not in data or "longitude" not in data:
-        return jsonify({"message": "Invalid request"}), 400
-
+def _save_location(user_id, data):
     # Check if location exists
     location = UserLocation.query.filter_by(user_id=user_id).first()
 
@@ -47,11 +51,33 @@ def update_or_create_location():
         action_type = "CREATE_LOCATION"
         details = f"Created location: ({data['latitude']}, {data['longitude']})"
 
+    # Location, history point and audit row go out in one commit
     db.session.add(location)
+    append_points([(user_id, datetime.utcnow(), float(data["latitude"]), float(data["longitude"]))])
+    db.session.add(AuditLog(user_id=user_id, action=action_type, details=details))
     db.session.commit()
+    return location
 
-    # Log action
-    log_action(user_id, action_type, details)
+
+@userLocationBp.route('/', methods=['POST'])
+def update_or_create_location():
+    # Get logged-in user from session
+    user_session = session.get("user")
+    if not user_session:
+        return jsonify({"message": "Unauthorized"}), 401
+
+    user_id = int(user_session["id"])  # stored as string in session
+    data = request.get_json()
+
+    if not data or "latitude" not in data or "longitude" not in data:
+        return jsonify({"message": "Invalid request"}), 400
+
+    try:
+        location = _save_location(user_id, data)
+    except IntegrityError:
+        # the user's first location (or hour of history) was written concurrently
+        db.session.rollback()
+        location = _save_location(user_id, data)
 
     return jsonify({
         "message": "📍 Location saved successfully",
@@ -80,3 +106,285 @@ def get_location():
         "longitude": location.longitude,
         "last_updated": location.updated_at
     })
+
+
+# ----------------------------
+# Batched Location Pings
+# ----------------------------
+@userLocationBp.before_app_request
+def start_location_ingestor():
+    # opt-in: the buffer is per process, so without the flusher pings are written in the request
+    if current_app.config.get("LOCATION_INGEST", False):
+        location_ingestor.start(current_app._get_current_object())
+
+
+def parse_utc(text):
+    """Naive UTC datetime from ISO 8601; an offset is converted, a naive time is taken as UTC."""
+    moment = datetime.fromisoformat(text)
+    return moment.astimezone(timezone.utc).replace(tzinfo=None) if moment.tzinfo else moment
+
+
+def _parse_ping(ping, default_user_id, now):
+    lat, lon = float(ping["latitude"]), float(ping["longitude"])
+    recorded_at = ping.get("recorded_at")
+    recorded_at = parse_utc(recorded_at) if recorded_at else now
+    return int(ping.get("user_id", default_user_id)), lat, lon, min(recorded_at, now)
+
+
+@userLocationBp.route('/pings', methods=['POST'])
+def ingest_pings():
+    """Queue location pings: {"pings": [{"latitude", "longitude", "recorded_at"?}, ...]}.
+
+    Only the newest ping per user is kept until the next flush. With
+    LOCATION_INGEST off the batch is flushed before responding (200), else it
+    waits for the background flusher (202). Admins may post pings for other
+    users by giving user_id.
+    """
+    user_session = session.get("user")
+    if not user_session:
+        return jsonify({"message": "Unauthorized"}), 401
+    user_id = int(user_session["id"])
+
+    pings = (request.get_json(silent=True) or {}).get("pings")
+    if not isinstance(pings, list) or not pings:
+        return jsonify({"message": "pings must be a non-empty list"}), 400
+    if len(pings) > MAX_PINGS:
+        return jsonify({"message": f"At most {MAX_PINGS} pings per request"}), 400
+
+    now = datetime.utcnow()
+    try:
+        parsed = [_parse_ping(p, user_id, now) for p in pings]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"message": "Each ping needs numeric latitude and longitude; recorded_at is ISO 8601"}), 400
+
+    others = {p[0] for p in parsed} - {user_id}
+    if others:
+        if user_session.get("role") not in {"admin", "super_admin"}:
+            return jsonify({"message": "Forbidden"}), 403
+        known = {uid for (uid,) in db.session.query(User.id).filter(User.id.in_(others))}
+        if known != others:
+            return jsonify({"message": f"Unknown user ids: {sorted(others - known)}"}), 400
+
+    accepted, rejected = location_ingestor.submit(parsed)
+    if not current_app.config.get("LOCATION_INGEST", False):
+        written = location_ingestor.flush()
+        return jsonify({"accepted": accepted, "rejected": rejected, "written": written}), 200
+    return jsonify({"accepted": accepted, "rejected": rejected}), 202
+
+
+@userLocationBp.route('/pings/metrics', methods=['GET'])
+def ingest_metrics():
+    user_session = session.get("user")
+    if not user_session:
+        return jsonify({"message": "Unauthorized"}), 401
+    if user_session.get("role") not in COORDINATOR_ROLES:
+        return jsonify({"message": "Forbidden"}), 403
+    return jsonify(location_ingestor.metrics())
+
+
+# ----------------------------
+# Location History
+# ----------------------------
+def _window(max_window):
+    """(start, end) from ?from=&to= (ISO 8601); defaults to the last 24 hours."""
+    end = request.args.get("to")
+    end = parse_utc(end) if end else datetime.utcnow()
+    start = request.args.get("from")
+    start = parse_utc(start) if start else end - timedelta(days=1)
+    if start > end or end - start > max_window:
+        raise ValueError
+    return start, end
+
+
+@userLocationBp.route('/history/<int:user_id>', methods=['GET'])
+def location_history(user_id):
+    """Trajectory of one user between ?from= and ?to= (at most 7 days)."""
+    user_session = session.get("user")
+    if not user_session:
+        return jsonify({"message": "Unauthorized"}), 401
+    if int(user_session["id"]) != user_id and user_session.get("role") not in COORDINATOR_ROLES:
+        return jsonify({"message": "Forbidden"}), 403
+    try:
+        start, end = _window(MAX_HISTORY_WINDOW)
+    except ValueError:
+        return jsonify({"message": "from/to must be ISO 8601, in order, at most 7 days apart"}), 400
+
+    points = trajectory(user_id, start, end)
+    return jsonify({
+        "user_id": user_id,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "count": len(points),
+        "points": [{"recorded_at": t.isoformat(), "latitude": lat, "longitude": lon} for t, lat, lon in points],
+    })
+
+
+@userLocationBp.route('/history/area', methods=['GET'])
+def location_history_area():
+    """Users seen inside ?bbox=west,south,east,north between ?from= and ?to= (at most 1 day)."""
+    user_session = session.get("user")
+    if not user_session:
+        return jsonify({"message": "Unauthorized"}), 401
+    if user_session.get("role") not in COORDINATOR_ROLES:
+        return jsonify({"message": "Forbidden"}), 403
+    try:
+        west, south, east, north = (float(v) for v in request.args["bbox"].split(","))
+        start, end = _window(MAX_AREA_WINDOW)
+    except (KeyError, ValueError):
+        return jsonify({"message": "bbox=west,south,east,north is required; from/to at most 1 day apart"}), 400
+
+    seen = present_in_area(south, west, north, east, start, end)
+    names = dict(db.session.query(User.id, User.name).filter(User.id.in_(seen))) if seen else {}
+    return jsonify({
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "users": [{
+            "user_id": user_id,
+            "name": names.get(user_id),
+            "first_seen": entry["first_seen"].isoformat(),
+            "last_seen": entry["last_seen"].isoformat(),
+            "points": entry["points"],
+        } for user_id, entry in sorted(seen.items(), key=lambda item: item[1]["first_seen"])],
+    })
+
+
+# ----------------------------
+# Nearby Users
+# ----------------------------
+def _origin(user_id):
+    """Point to search from: ?lat=&lon=, or the caller's own saved location."""
+    lat, lon = request.args.get("lat", type=float), request.args.get("lon", type=float)
+    if lat is not None and lon is not None:
+        return lat, lon
+    own = UserLocation.query.filter_by(user_id=user_id).first()
+    if own and own.latitude is not None and own.longitude is not None:
+        return own.latitude, own.longitude
+    return None
+
+
+def _people_query():
+    query = (db.session.query(UserLocation.user_id, UserLocation.latitude, UserLocation.longitude,
+                              UserLocation.updated_at, User.name, User.role)
+             .join(User, User.id == UserLocation.user_id))
+    roles = [r.strip() for r in request.args.get("role", "").split(",") if r.strip()]
+    if roles:
+        query = query.filter(User.role.in_(roles))
+    if request.args.get("available", "").lower() in {"1", "true", "yes"}:
+        query = query.join(VolunteerProfile, VolunteerProfile.user_id == UserLocation.user_id) \
+                     .filter(VolunteerProfile.availability.is_(True))
+    return query
+
+
+def _serialize_nearby(row, distance):
+    return {
+        "user_id": row.user_id,
+        "name": row.name,
+        "role": row.role,
+        "latitude": row.latitude,
+        "longitude": row.longitude,
+        "distance_km": round(distance, 3),
+        "last_updated": row.updated_at,
+    }
+
+
+@userLocationBp.route('/nearby', methods=['GET'])
+def users_nearby():
+    """Users within ?radius_km= of a point; filter with ?role=volunteer,donor&available=1."""
+    user_session = session.get("user")
+    if not user_session:
+        return jsonify({"message": "Unauthorized"}), 401
+    if user_session.get("role") not in COORDINATOR_ROLES:
+        return jsonify({"message": "Forbidden"}), 403
+
+    origin = _origin(int(user_session["id"]))
+    if origin is None:
+        return jsonify({"message": "lat and lon are required"}), 400
+    radius = request.args.get("radius_km", 10, type=float)
+    if not 0 < radius <= MAX_RADIUS_KM:
+        return jsonify({"message": f"radius_km must be between 0 and {MAX_RADIUS_KM}"}), 400
+    limit = min(request.args.get("limit", 100, type=int), MAX_RESULTS)
+
+    found = within_radius(_people_query(), UserLocation, origin[0], origin[1], radius, limit)
+    return jsonify({
+        "origin": {"latitude": origin[0], "longitude": origin[1]},
+        "radius_km": radius,
+        "users": [_serialize_nearby(row, distance) for row, distance in found],
+    })
+
+
+@userLocationBp.route('/nearest', methods=['GET'])
+def users_nearest():
+    """The ?k= users nearest to a point, with the same filters as /nearby."""
+    user_session = session.get("user")
+    if not user_session:
+        return jsonify({"message": "Unauthorized"}), 401
+    if user_session.get("role") not in COORDINATOR_ROLES:
+        return jsonify({"message": "Forbidden"}), 403
+
+    origin = _origin(int(user_session["id"]))
+    if origin is None:
+        return jsonify({"message": "lat and lon are required"}), 400
+    k = min(max(request.args.get("k", 10, type=int), 1), MAX_RESULTS)
+
+    found = nearest(_people_query(), UserLocation, origin[0], origin[1], k)
+    return jsonify({
+        "origin": {"latitude": origin[0], "longitude": origin[1]},
+        "users": [_serialize_nearby(row, distance) for row, distance in found],
+    })
+
+
+# ----------------------------
+# Map Clusters
+# ----------------------------
+@userLocationBp.route('/clusters', methods=['GET'])
+def map_clusters():
+    """Grid clusters for a map view: ?layer=camps&bbox=west,south,east,north&zoom=8"""
+    user_session = session.get("user")
+    if not user_session:
+        return jsonify({"message": "Unauthorized"}), 401
+
+    layer = request.args.get("layer", "volunteers")
+    if layer not in LAYERS:
+        return jsonify({"message": f"layer must be one of: {', '.join(sorted(LAYERS))}"}), 400
+    if layer not in PUBLIC_LAYERS and user_session.get("role") not in COORDINATOR_ROLES:
+        return jsonify({"message": "Forbidden"}), 403
+
+    try:
+        west, south, east, north = (float(v) for v in request.args["bbox"].split(","))
+        zoom = int(request.args.get("zoom", 5))
+    except (KeyError, ValueError):
+        return jsonify({"message": "bbox=west,south,east,north and an integer zoom are required"}), 400
+    if south > north or not 0 <= zoom <= 22:
+        return jsonify({"message": "Invalid bbox or zoom"}), 400
+
+    result = clusters_in_box(layer, south, west, north, east, zoom)
+    if result is None:
+        return jsonify({"message": "Bounding box too large for this zoom level"}), 400
+    result["layer"] = layer
+    result["total"] = sum(c["count"] for c in result["clusters"])
+    return jsonify(result)
+
+
+# ----------------------------
+# CLI
+# ----------------------------
+@userLocationBp.cli.command("geocode")
+@click.option("--refresh", is_flag=True, help="Re-resolve rows that already have coordinates.")
+def geocode_command(refresh):
+    """Resolve disaster, camp and volunteer locations against the gazetteer."""
+    report = backfill_coordinates(refresh=refresh)
+    for table, (updated, unresolved) in report.items():
+        click.echo(f"{table}: {updated} rows geocoded, {unresolved} locations not found")
+    # the backfill writes coordinates with bulk UPDATEs, which skip the
+    # geohash mapper events, so rehash the geocoded tables that are indexed
+    for model in GEOCODED_MODELS:
+        if hasattr(model, "geohash") and report[model.__tablename__][0]:
+            click.echo(f"{model.__tablename__}: indexed {backfill_geohashes(model)} rows")
+            cluster_cache.drop_layers(layers_of(model))
+
+
+@userLocationBp.cli.command("index")
+def index_command():
+    """Recompute the geohash of every saved user location and relief camp."""
+    for model in (UserLocation, ReliefCamp):
+        click.echo(f"{model.__tablename__}: indexed {backfill_geohashes(model)} rows")
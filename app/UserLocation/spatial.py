@@ -0,0 +1,255 @@
+# app/UserLocation/spatial.py
+"""
+Radius and nearest-neighbour lookups over stored coordinates.
+
+Located rows carry a geohash of their position (GEOHASH_PRECISION
+characters, about 5 m) in an indexed column. Points in the same geohash
+cell share that cell's prefix, so "everything in a cell" is one index range
+scan up to the next cell's prefix:
+
+    geohash >= 'tdr9' AND geohash < 'tdrb'
+
+The bound is built from the geohash alphabet itself. Digits and lowercase
+letters sort the same way under every collation (MySQL's accent/case
+insensitive ones included), whereas a sentinel such as '{' does not.
+
+A radius query covers the circle's bounding box with the finest cells that
+need no more than MAX_COVER_CELLS range scans. The candidates are then
+filtered by exact haversine distance. Nearest-k looks at the 3 x 3 block of
+cells around the point, from fine cells to coarser ones, until it has k
+candidates. If they do not all lie within the distance the block is
+guaranteed to cover, one radius query out to the k-th candidate settles the
+answer.
+
+Geohashes are set by mapper events whenever latitude/longitude change, so
+the index follows location updates without any rebuild. User locations and
+relief camps are indexed this way.
+"""
+import math
+from sqlalchemy import event, inspect, or_, and_, update
+from app.models import db, UserLocation, ReliefCamp
+from . import geocode  # noqa: F401  camp coordinates must be resolved before they are hashed
+
+GEOHASH_PRECISION = 9
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+KNN_START_PRECISION = 6
+MAX_COVER_CELLS = 32
+BACKFILL_CHUNK = 1000
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+# ----------------------------
+# Geohash
+# ----------------------------
+def encode(lat, lon, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def decode(geohash):
+    """(lat, lon) of the centre of a geohash cell."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = BASE32.index(char)
+        for bit in (16, 8, 4, 2, 1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if value & bit:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def cell_degrees(precision):
+    """(height, width) of a geohash cell in degrees."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def cell_km(precision, lat):
+    """Smaller side of a cell at latitude `lat`, in km."""
+    height, width = cell_degrees(precision)
+    return min(height * KM_PER_DEGREE, width * KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+
+
+def block(lat, lon, precision):
+    """Geohash prefixes of the 3 x 3 cells around a point."""
+    height, width = cell_degrees(precision)
+    prefixes = set()
+    for dlat in (-height, 0, height):
+        for dlon in (-width, 0, width):
+            cell_lat = min(max(lat + dlat, -90.0), 90.0 - 1e-9)
+            cell_lon = (lon + dlon + 180.0) % 360.0 - 180.0
+            prefixes.add(encode(cell_lat, cell_lon, precision))
+    return sorted(prefixes)
+
+
+def next_prefix(prefix):
+    """Smallest prefix that sorts after every geohash in `prefix`'s cell; None if none does."""
+    prefix = prefix.rstrip(BASE32[-1])
+    if not prefix:
+        return None
+    return prefix[:-1] + BASE32[BASE32.index(prefix[-1]) + 1]
+
+
+def in_cell(column, prefix):
+    """SQL condition: `column` starts with the geohash `prefix`, as one index range."""
+    if not prefix:
+        return column.isnot(None)
+    upper = next_prefix(prefix)
+    return and_(column >= prefix, column < upper) if upper else column >= prefix
+
+
+def in_cells(column, prefixes):
+    """SQL condition: `column` lies in any of the given geohash cells."""
+    return or_(*[in_cell(column, prefix) for prefix in prefixes])
+
+
+def box_cells(south, west, north, east, precision):
+    """(row, column) ranges of the cells at `precision` covering a lat/lon box."""
+    height, width = cell_degrees(precision)
+    rows = (math.floor((max(south, -90.0) + 90.0) / height),
+            math.floor((min(north, 90.0 - 1e-9) + 90.0) / height))
+    columns = (math.floor((west + 180.0) / width), math.floor((east + 180.0) / width))
+    return rows, columns
+
+
+def box_prefixes(south, west, north, east, precision):
+    """Geohash prefixes of the cells at `precision` covering a lat/lon box."""
+    height, width = cell_degrees(precision)
+    (first_row, last_row), (first_col, last_col) = box_cells(south, west, north, east, precision)
+    wrap = round(360.0 / width)
+    return sorted({encode(-90.0 + (row + 0.5) * height, -180.0 + (col % wrap + 0.5) * width, precision)
+                   for row in range(first_row, last_row + 1)
+                   for col in range(first_col, last_col + 1)})
+
+
+def cover(lat, lon, radius_km):
+    """Geohash prefixes of the cells covering a circle's bounding box, or None for "everywhere".
+
+    Uses the finest precision that needs at most MAX_COVER_CELLS cells.
+    """
+    # widths shrink towards the poles; size the box for the far edge of the circle
+    edge = min(abs(lat) + radius_km / KM_PER_DEGREE, 90.0)
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(edge)), 1e-6))
+    if dlon >= 180.0:
+        return None
+    box = (lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        (first_row, last_row), (first_col, last_col) = box_cells(*box, precision)
+        if (last_row - first_row + 1) * (last_col - first_col + 1) <= MAX_COVER_CELLS:
+            return box_prefixes(*box, precision)
+    return None
+
+
+# ----------------------------
+# Queries
+# ----------------------------
+def _ranked(rows, lat, lon, limit=None, within_km=None):
+    ranked = []
+    for row in rows:
+        distance = haversine_km(lat, lon, row.latitude, row.longitude)
+        if within_km is None or distance <= within_km:
+            ranked.append((row, distance))
+    ranked.sort(key=lambda pair: pair[1])
+    return ranked[:limit] if limit is not None else ranked
+
+
+def within_radius(query, model, lat, lon, radius_km, limit=None):
+    """(row, distance_km) for rows of `query` within `radius_km`, nearest first.
+
+    `query` must select the model's latitude and longitude columns.
+    """
+    prefixes = cover(lat, lon, radius_km)
+    if prefixes:
+        query = query.filter(in_cells(model.geohash, prefixes))
+    return _ranked(query.filter(model.geohash.isnot(None)).all(), lat, lon, limit, radius_km)
+
+
+def nearest(query, model, lat, lon, k=10):
+    """The `k` rows of `query` nearest to a point, as (row, distance_km)."""
+    query = query.filter(model.geohash.isnot(None))
+    for precision in range(KNN_START_PRECISION, 0, -1):
+        ranked = _ranked(query.filter(in_cells(model.geohash, block(lat, lon, precision))).all(), lat, lon)
+        if len(ranked) < k:
+            continue
+        covered = cell_km(precision, min(abs(lat) + cell_degrees(precision)[0], 90.0))
+        if ranked[k - 1][1] <= covered:
+            return ranked[:k]
+        # k candidates are known, so the answer lies within the k-th one's distance
+        return within_radius(query, model, lat, lon, ranked[k - 1][1], k)
+    return _ranked(query.all(), lat, lon, k)
+
+
+# ----------------------------
+# Keeping geohashes current
+# ----------------------------
+def _refresh_geohash(target):
+    if target.latitude is None or target.longitude is None:
+        target.geohash = None
+    else:
+        target.geohash = encode(float(target.latitude), float(target.longitude))
+
+
+def _on_insert(mapper, connection, target):
+    _refresh_geohash(target)
+
+
+def _on_update(mapper, connection, target):
+    attrs = inspect(target).attrs
+    if attrs.latitude.history.has_changes() or attrs.longitude.history.has_changes():
+        _refresh_geohash(target)
+
+
+def index_model(model):
+    """Keep `model.geohash` in step with its latitude/longitude."""
+    event.listen(model, "before_insert", _on_insert)
+    event.listen(model, "before_update", _on_update)
+
+
+index_model(UserLocation)
+index_model(ReliefCamp)
+
+
+def backfill_geohashes(model, chunk_size=BACKFILL_CHUNK):
+    """Set geohash on rows that have coordinates; one executemany per chunk."""
+    rows = (db.session.query(model.id, model.latitude, model.longitude)
+            .filter(model.latitude.isnot(None), model.longitude.isnot(None))
+            .order_by(model.id)
+            .all())
+    db.session.execute(update(model).where(or_(model.latitude.is_(None), model.longitude.is_(None)))
+                       .values(geohash=None), execution_options={"synchronize_session": False})
+    for i in range(0, len(rows), chunk_size):
+        db.session.bulk_update_mappings(model, [
+            {"id": row_id, "geohash": encode(lat, lon)} for row_id, lat, lon in rows[i:i + chunk_size]
+        ])
+    db.session.commit()
+    return len(rows)
@@ -1,5 +1,5 @@
 from flask import Blueprint
 
-dashboard_bp = Blueprint('dashboardBp', __name__)
+dashboard_bp = Blueprint('dashboardBp', __name__, cli_group='dashboard')
 
 from . import routes
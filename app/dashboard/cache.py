@@ -0,0 +1,111 @@
+# app/dashboard/cache.py
+"""
+Short-TTL cache for the dashboard with write-driven invalidation.
+
+Entries live in process memory. Any commit that touched one of the watched models
+(through the ORM unit of work or a bulk UPDATE/DELETE) bumps the cache generation,
+which makes every entry stale at once.
+
+Stampede protection: when an entry is stale, the first thread to take the key's
+lock recomputes it while the other threads keep serving the stale value. Threads
+only wait when there is nothing cached yet.
+"""
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class DashboardCache:
+    def __init__(self, ttl=30, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}          # key -> (value, stored_at, generation)
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _fresh(self, entry):
+        return (entry is not None
+                and entry[2] == self._generation
+                and time.monotonic() - entry[1] < self.ttl)
+
+    def get_or_compute(self, key, compute):
+        entry = self._entries.get(key)
+        if self._fresh(entry):
+            return entry[0]
+
+        lock = self._key_lock(key)
+        if not lock.acquire(blocking=entry is None):
+            # Someone else is already recomputing; serve the stale copy meanwhile
+            return entry[0]
+        try:
+            entry = self._entries.get(key)
+            if self._fresh(entry):
+                return entry[0]
+            generation = self._generation
+            value = compute()
+            self._store(key, (value, time.monotonic(), generation))
+            return value
+        finally:
+            lock.release()
+
+    def _store(self, key, entry):
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                oldest = min(self._entries, key=lambda k: self._entries[k][1])
+                self._entries.pop(oldest)
+                self._key_locks.pop(oldest, None)
+            self._entries[key] = entry
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+
+dashboard_cache = DashboardCache()
+
+
+# ----------------------------
+# SQLAlchemy invalidation hooks
+# ----------------------------
+_INFO_KEY = "dashboard_cache_dirty"
+
+
+def watch_models(cache, models):
+    """Invalidate `cache` after any commit that wrote one of `models`."""
+    models = tuple(models)
+
+    def touches_watched(mapper):
+        return mapper is not None and issubclass(mapper.class_, models)
+
+    @event.listens_for(Session, "after_flush")
+    def _collect(session, flush_context):
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            if isinstance(obj, models):
+                session.info[_INFO_KEY] = True
+                return
+
+    @event.listens_for(Session, "do_orm_execute")
+    def _collect_bulk(orm_execute_state):
+        if ((orm_execute_state.is_update or orm_execute_state.is_delete)
+                and touches_watched(orm_execute_state.bind_mapper)):
+            orm_execute_state.session.info[_INFO_KEY] = True
+
+    @event.listens_for(Session, "after_commit")
+    def _invalidate(session):
+        if session.info.pop(_INFO_KEY, False):
+            cache.invalidate()
+
+    @event.listens_for(Session, "after_rollback")
+    def _discard(session):
+        session.info.pop(_INFO_KEY, None)
@@ -0,0 +1,227 @@
+# app/dashboard/rollups.py
+"""
+Hourly / daily rollups for the dashboard trend charts.
+
+Each refresh recomputes a window of buckets with one GROUP BY per metric (a range
+scan on the indexed timestamp column) and replaces the matching `metric_rollups`
+rows inside a single transaction, so it is safe to re-run at any time. Schedule
+`flask dashboard rollup` every few minutes; the series endpoint only ever reads
+the rollup table.
+
+Request-status counts are bucketed by when the request was created, so a
+status change on an older request lands outside the trailing window. Such
+requests carry `status_changed_at` (kept by the listener below and by the
+bulk status updates), and a refresh also recomputes the created_at buckets
+of every request whose status changed within its window.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, inspect
+from app.models import db, MetricRollup, User, ReliefRequest, Donation, TaskAssignment
+
+GRANULARITIES = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+
+# ----------------------------
+# Bucket helpers
+# ----------------------------
+def truncate(ts, granularity):
+    """Floor a datetime to the start of its hour / day bucket."""
+    ts = ts.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        ts = ts.replace(hour=0)
+    return ts
+
+
+def _bucket_expr(column, granularity):
+    """SQL expression flooring `column` to its bucket, per database dialect."""
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        return func.date_trunc(granularity, column)
+    fmt = "%Y-%m-%d 00:00:00" if granularity == "day" else "%Y-%m-%d %H:00:00"
+    if dialect == "sqlite":
+        return func.strftime(fmt, column)
+    return func.date_format(column, fmt)
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.strptime(str(value)[:19], "%Y-%m-%d %H:%M:%S")
+
+
+# ----------------------------
+# Metric definitions
+# ----------------------------
+# Every metric yields rows of (bucket, disaster_id, status, count, total) for
+# one granularity; refresh_rollups() adds the time-window filter.
+def _relief_requests_query(granularity):
+    bucket = _bucket_expr(ReliefRequest.created_at, granularity)
+    query = db.session.query(
+        bucket,
+        ReliefRequest.disaster_id,
+        ReliefRequest.status,
+        func.count(ReliefRequest.id),
+        func.coalesce(func.sum(ReliefRequest.quantity), 0),
+    ).group_by(bucket, ReliefRequest.disaster_id, ReliefRequest.status)
+    return query, ReliefRequest.created_at
+
+
+def _donations_query(granularity):
+    bucket = _bucket_expr(Donation.donated_at, granularity)
+    query = db.session.query(
+        bucket,
+        Donation.disaster_id,
+        db.literal(""),
+        func.count(Donation.id),
+        func.coalesce(func.sum(Donation.amount), 0),
+    ).group_by(bucket, Donation.disaster_id)
+    return query, Donation.donated_at
+
+
+def _new_users_query(granularity):
+    bucket = _bucket_expr(User.created_at, granularity)
+    query = db.session.query(
+        bucket,
+        db.literal(0),
+        db.literal(""),
+        func.count(User.id),
+        db.literal(0),
+    ).group_by(bucket)
+    return query, User.created_at
+
+
+def _tasks_completed_query(granularity):
+    bucket = _bucket_expr(TaskAssignment.completed_at, granularity)
+    query = db.session.query(
+        bucket,
+        ReliefRequest.disaster_id,
+        db.literal(""),
+        func.count(TaskAssignment.id),
+        db.literal(0),
+    ).join(ReliefRequest, TaskAssignment.relief_request_id == ReliefRequest.id) \
+     .filter(TaskAssignment.status == "Completed") \
+     .group_by(bucket, ReliefRequest.disaster_id)
+    return query, TaskAssignment.completed_at
+
+
+METRICS = {
+    "relief_requests": _relief_requests_query,
+    "donations": _donations_query,
+    "new_users": _new_users_query,
+    "tasks_completed": _tasks_completed_query,
+}
+
+# metric -> column recording when an already-bucketed row last changed
+RESTATED_BY = {
+    "relief_requests": ReliefRequest.status_changed_at,
+}
+
+
+@event.listens_for(ReliefRequest, "before_update")
+def _stamp_status_change(mapper, connection, target):
+    if inspect(target).attrs.status.history.has_changes():
+        target.status_changed_at = datetime.utcnow()
+
+
+# ----------------------------
+# Refresh job
+# ----------------------------
+def _replace_buckets(metric, granularity, window_start, window_end):
+    """Recompute one metric's buckets in [window_start, window_end). Returns rows written."""
+    query, ts_column = METRICS[metric](granularity)
+    rows = query.filter(ts_column >= window_start, ts_column < window_end).all()
+
+    MetricRollup.query.filter(
+        MetricRollup.metric == metric,
+        MetricRollup.granularity == granularity,
+        MetricRollup.bucket_start >= window_start,
+        MetricRollup.bucket_start < window_end,
+    ).delete(synchronize_session=False)
+
+    now = datetime.utcnow()
+    db.session.bulk_insert_mappings(MetricRollup, [{
+        "metric": metric,
+        "granularity": granularity,
+        "bucket_start": _as_datetime(bucket_start),
+        "disaster_id": disaster_id or 0,
+        "status": status or "",
+        "count": count,
+        "total": float(total or 0),
+        "refreshed_at": now,
+    } for bucket_start, disaster_id, status, count, total in rows])
+    return len(rows)
+
+
+def _restated_buckets(metric, granularity, window_start, window_end):
+    """Buckets before the window holding rows of `metric` that changed inside it."""
+    changed_column = RESTATED_BY.get(metric)
+    if changed_column is None:
+        return []
+    _, ts_column = METRICS[metric](granularity)
+    bucket = _bucket_expr(ts_column, granularity)
+    rows = (db.session.query(bucket)
+            .select_from(changed_column.class_)
+            .filter(changed_column >= window_start, changed_column < window_end, ts_column < window_start)
+            .distinct()
+            .all())
+    return sorted(_as_datetime(b) for b, in rows)
+
+
+def refresh_rollups(start, end=None, granularities=("hour", "day"), metrics=None):
+    """Recompute every bucket overlapping [start, end), plus older buckets restated by
+    status changes in that window, and commit. Returns rows written."""
+    end = end or datetime.utcnow()
+    written = 0
+
+    for granularity in granularities:
+        window_start = truncate(start, granularity)
+        window_end = truncate(end, granularity) + GRANULARITIES[granularity]
+
+        for metric in metrics or METRICS:
+            for bucket_start in _restated_buckets(metric, granularity, window_start, window_end):
+                written += _replace_buckets(metric, granularity, bucket_start,
+                                            bucket_start + GRANULARITIES[granularity])
+            written += _replace_buckets(metric, granularity, window_start, window_end)
+
+    db.session.commit()
+    return written
+
+
+# ----------------------------
+# Reads
+# ----------------------------
+def get_series(metric, granularity="day", start=None, end=None, disaster_id=None, by=None):
+    """Read a series from the rollup table, optionally split by `status` or `disaster`."""
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=30)
+
+    columns = [MetricRollup.bucket_start]
+    if by == "status":
+        columns.append(MetricRollup.status)
+    elif by == "disaster":
+        columns.append(MetricRollup.disaster_id)
+
+    query = db.session.query(
+        *columns,
+        func.sum(MetricRollup.count),
+        func.sum(MetricRollup.total),
+    ).filter(
+        MetricRollup.metric == metric,
+        MetricRollup.granularity == granularity,
+        MetricRollup.bucket_start >= truncate(start, granularity),
+        MetricRollup.bucket_start < end,
+    )
+    if disaster_id is not None:
+        query = query.filter(MetricRollup.disaster_id == disaster_id)
+
+    rows = query.group_by(*columns).order_by(MetricRollup.bucket_start).all()
+
+    series = []
+    for row in rows:
+        point = {"bucket": row[0].isoformat(), "count": int(row[-2] or 0), "total": float(row[-1] or 0)}
+        if by == "status":
+            point["status"] = row[1]
+        elif by == "disaster":
+            point["disaster_id"] = row[1]
+        series.append(point)
+    return series
@@ -1,13 +1,24 @@
-from flask import Blueprint, render_template
-from datetime import datetime
+from flask import Blueprint, render_template, request, jsonify, session
+from datetime import datetime, timedelta
 from sqlalchemy import func
+import click
 from app.models import db, User, Disaster, ReliefRequest, Resource, TaskAssignment
 
 from . import dashboard_bp
+from .rollups import METRICS, GRANULARITIES, get_series, refresh_rollups
+from .cache import dashboard_cache, watch_models
 
+MAX_SERIES_DAYS = 366
 
-@dashboard_bp.route("/", methods=["GET"])
-def dashboard_home():
+watch_models(dashboard_cache, [User, Disaster, ReliefRequest, Resource, TaskAssignment])
+
+
+@dashboard_bp.record_once
+def _configure_cache(state):
+    dashboard_cache.ttl = state.app.config.get("DASHBOARD_CACHE_TTL", 30)
+
+
+def build_dashboard_data():
     today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
 
     # Stats
@@ -23,11 +34,17 @@ def dashboard_home():
     total_resources = Resource.query.count()
     total_tasks = TaskAssignment.query.count()
 
-    # Recent disasters
-    recent_disasters = Disaster.query.order_by(Disaster.reported_on.desc()).limit(5).all()
+    # Recent disasters (plain dicts so they can outlive the request's session)
+    recent_disasters = [{
+        "id": d.id,
+        "name": d.name,
+        "severity": d.severity,
+        "location": d.location,
+        "reported_on": d.reported_on,
+    } for d in Disaster.query.order_by(Disaster.reported_on.desc()).limit(5).all()]
 
     # Package everything into a dict
-    data = {
+    return {
         "total_users": total_users,
         "new_users_today": new_users_today,
         "total_disasters": total_disasters,
@@ -39,4 +56,58 @@ def dashboard_home():
         "recent_disasters": recent_disasters,
     }
 
-    return render_template("dashboard.html", data=data)
+
+@dashboard_bp.route("/", methods=["GET"])
+def dashboard_home():
+    # The page embeds the viewer's name/email/role, so rendered HTML is cached per viewer
+    user = session.get("user") or {}
+    html_key = ("html", user.get("id"), user.get("role"))
+
+    def render():
+        data = dashboard_cache.get_or_compute("data", build_dashboard_data)
+        return render_template("dashboard.html", data=data)
+
+    return dashboard_cache.get_or_compute(html_key, render)
+
+
+@dashboard_bp.route("/api/series", methods=["GET"])
+def dashboard_series():
+    """Trend data read from the pre-aggregated rollup table.
+
+    Query params: metric (required), granularity=day|hour, days (default 30),
+    disaster_id, by=status|disaster.
+    """
+    metric = request.args.get("metric")
+    granularity = request.args.get("granularity", "day")
+    by = request.args.get("by")
+
+    if metric not in METRICS:
+        return jsonify({"error": f"metric must be one of: {', '.join(METRICS)}"}), 400
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": "granularity must be 'day' or 'hour'"}), 400
+    if by not in (None, "status", "disaster"):
+        return jsonify({"error": "by must be 'status' or 'disaster'"}), 400
+
+    try:
+        days = min(int(request.args.get("days", 30)), MAX_SERIES_DAYS)
+        disaster_id = int(request.args["disaster_id"]) if request.args.get("disaster_id") else None
+    except ValueError:
+        return jsonify({"error": "days and disaster_id must be numeric"}), 400
+
+    end = datetime.utcnow()
+    series = get_series(metric, granularity, start=end - timedelta(days=days), end=end,
+                        disaster_id=disaster_id, by=by)
+    return jsonify({"metric": metric, "granularity": granularity, "series": series}), 200
+
+
+# ----------------------------
+# CLI: flask dashboard rollup
+# ----------------------------
+@dashboard_bp.cli.command("rollup")
+@click.option("--hours", default=2, show_default=True, help="Trailing window to recompute.")
+@click.option("--days", default=0, help="Recompute this many days instead (backfill).")
+def rollup_command(hours, days):
+    """Refresh the hourly/daily dashboard rollups. Run from cron."""
+    window = timedelta(days=days) if days else timedelta(hours=hours)
+    written = refresh_rollups(datetime.utcnow() - window)
+    click.echo(f"Wrote {written} rollup rows")
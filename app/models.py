@@ -14,7 +14,7 @@ class User(db.Model):
     phone = db.Column(db.String(15), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(20), default="victim", nullable=False)  # admin | volunteer | donor | victim
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
 
     # Relationships
     location = db.relationship("UserLocation", back_populates="user", uselist=False, cascade="all, delete")
@@ -49,6 +49,7 @@ class UserLocation(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False, unique=True)
     latitude = db.Column(db.Float, nullable=True)
     longitude = db.Column(db.Float, nullable=True)
+    geohash = db.Column(db.String(12), nullable=True, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     user = db.relationship("User", back_populates="location")
@@ -57,6 +58,37 @@ class UserLocation(db.Model):
         return f"<UserLocation user_id={self.user_id} | ({self.latitude}, {self.longitude})>"
 
 
+class LocationTrack(db.Model):
+    """One user's location history for one hour, as a delta-encoded blob.
+
+    `points` holds (seconds into the bucket, lat * 1e5, lon * 1e5) triples as
+    zigzag varint deltas from the previous point (see UserLocation/history.py).
+    The last point and the bounding box are kept in columns so appends need no
+    decoding and area queries can skip buckets that are elsewhere.
+    """
+    __tablename__ = "location_tracks"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "bucket_start", name="uq_location_track_bucket"),
+        db.Index("ix_location_tracks_bucket_lat", "bucket_start", "min_lat"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    point_count = db.Column(db.Integer, nullable=False, default=0)
+    points = db.Column(db.LargeBinary, nullable=False)
+    last_offset = db.Column(db.Integer, nullable=False)
+    last_lat = db.Column(db.Integer, nullable=False)
+    last_lon = db.Column(db.Integer, nullable=False)
+    min_lat = db.Column(db.Float, nullable=False)
+    max_lat = db.Column(db.Float, nullable=False)
+    min_lon = db.Column(db.Float, nullable=False)
+    max_lon = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f"<LocationTrack user_id={self.user_id} {self.bucket_start} ({self.point_count} points)>"
+
+
 
 class Disaster(db.Model):
     __tablename__ = "disasters"
@@ -66,11 +98,13 @@ class Disaster(db.Model):
     name = db.Column(db.String(120), nullable=False, index=True)
     type = db.Column(db.String(50), nullable=False, index=True)
     location = db.Column(db.String(200), nullable=False, index=True)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
     severity = db.Column(db.String(20), nullable=False, default="Low", index=True)
     affected_population = db.Column(db.Integer, nullable=True)
     description = db.Column(db.Text, nullable=True)
 
-    reported_on = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    reported_on = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     updated_on = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     reported_by = db.Column(
@@ -139,6 +173,10 @@ class Disaster(db.Model):
 
 class ReliefRequest(db.Model):
     __tablename__ = "relief_requests"
+    __table_args__ = (
+        # "next N most urgent pending" reads this index in order
+        db.Index("ix_relief_requests_status_priority", "status", "priority_key"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -151,7 +189,17 @@ class ReliefRequest(db.Model):
         nullable=False,
         index=True
     )
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    # Urgency rank kept by app/ReliefRequest/priority.py
+    priority_key = db.Column(db.Float, nullable=True)
+    # Set while Pending; see app/ReliefRequest/dedupe.py
+    dedupe_key = db.Column(db.String(64), nullable=True, unique=True)
+    # Requester's position when the request was made; see app/ReliefRequest/heatmap.py
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    geohash = db.Column(db.String(12), nullable=True, index=True)
+    # Last status change; the dashboard rollups re-count the created_at bucket of requests changed since
+    status_changed_at = db.Column(db.DateTime, nullable=True, index=True)
 
     requester = db.relationship("User", back_populates="relief_requests")
     disaster = db.relationship("Disaster", back_populates="relief_requests")
@@ -163,12 +211,30 @@ class ReliefRequest(db.Model):
 
 class Resource(db.Model):
     __tablename__ = "resources"
+    __table_args__ = (
+        # stock lookups always go by (disaster, type)
+        db.Index("ix_resources_disaster_type", "disaster_id", "resource_type"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     resource_type = db.Column(db.String(50), nullable=False)
     unit = db.Column(db.String(50), nullable=True)
+    # Filled on write by app/Resource/units.py
+    canonical_unit = db.Column(db.String(50), nullable=True)
+    unit_factor = db.Column(db.Float, nullable=True)
+    normalized_quantity = db.Column(db.Float, nullable=True)
+
+    # Perishable lots; see app/Resource/expiry.py
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)
+    expiry_warned_at = db.Column(db.DateTime, nullable=True)
+    is_expired = db.Column(db.Boolean, default=False, nullable=False)
+    # Sum of active StockReservation holds; available = quantity - reserved_quantity
+    reserved_quantity = db.Column(db.Integer, default=0, nullable=False)
+    # Set on rows created by app/Resource/stock.py ensure_stock(); unique so two
+    # first donations for the same (disaster, type, unit, expiry) share one row
+    stock_key = db.Column(db.String(64), nullable=True, unique=True)
 
     disaster_id = db.Column(db.Integer, db.ForeignKey("disasters.id"), nullable=True)
     added_by = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
@@ -191,10 +257,14 @@ class Donation(db.Model):
     resource_type = db.Column(db.String(120), nullable=True)
     quantity = db.Column(db.Integer, nullable=True)
     unit = db.Column(db.String(50), nullable=True)
+    # Filled on write by app/Resource/units.py
+    canonical_unit = db.Column(db.String(50), nullable=True)
+    unit_factor = db.Column(db.Float, nullable=True)
+    normalized_quantity = db.Column(db.Float, nullable=True)
     amount = db.Column(db.Float, nullable=True)
     disaster_id = db.Column(db.Integer, db.ForeignKey("disasters.id"), nullable=True)
     donated_by = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
-    donated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    donated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
 
     disaster = db.relationship("Disaster", back_populates="donations")
     user = db.relationship("User", back_populates="donations")
@@ -203,6 +273,102 @@ class Donation(db.Model):
         return f"<Donation {self.donor_name} - {self.resource_type or 'Money'}>"
 
 
+class DonationDisasterTotal(db.Model):
+    """Running donation totals per disaster (disaster_id 0 = not tied to a disaster)."""
+    __tablename__ = "donation_disaster_totals"
+
+    disaster_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    donation_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Float, nullable=False, default=0)
+    total_quantity = db.Column(db.Float, nullable=False, default=0)  # normalized units
+
+
+class DonationDonorTotal(db.Model):
+    """Running donation totals per donating user, backing the leaderboards."""
+    __tablename__ = "donation_donor_totals"
+
+    donor_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    donor_name = db.Column(db.String(120), nullable=True)
+    donation_count = db.Column(db.Integer, nullable=False, default=0, index=True)
+    total_amount = db.Column(db.Float, nullable=False, default=0, index=True)
+    total_quantity = db.Column(db.Float, nullable=False, default=0, index=True)
+    last_donated_at = db.Column(db.DateTime, nullable=True)
+
+
+class DonationDailyTotal(db.Model):
+    """Running donation totals per resource type per day ("money" for cash-only donations)."""
+    __tablename__ = "donation_daily_totals"
+
+    day = db.Column(db.Date, primary_key=True)
+    resource_type = db.Column(db.String(120), primary_key=True)
+    donation_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Float, nullable=False, default=0)
+    total_quantity = db.Column(db.Float, nullable=False, default=0)
+
+
+class StockMovement(db.Model):
+    """Append-only ledger of every change to Resource.quantity."""
+    __tablename__ = "stock_movements"
+    __table_args__ = (
+        db.Index("ix_stock_movements_resource", "resource_id", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    resource_id = db.Column(db.Integer, db.ForeignKey("resources.id", ondelete="CASCADE"), nullable=False)
+    disaster_id = db.Column(db.Integer, nullable=True)
+    resource_type = db.Column(db.String(50), nullable=True)
+    movement_type = db.Column(db.String(20), nullable=False)  # donation_in | allocation_out | adjustment
+    delta = db.Column(db.Integer, nullable=False)
+    # Plain ids, not FKs: the ledger outlives the donation / request it refers to
+    donation_id = db.Column(db.Integer, nullable=True, index=True)
+    relief_request_id = db.Column(db.Integer, nullable=True, index=True)
+    user_id = db.Column(db.Integer, nullable=True)
+    note = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<StockMovement {self.movement_type} {self.delta:+d} on Resource {self.resource_id}>"
+
+
+class StockReservation(db.Model):
+    """A hold on part of a resource's stock, e.g. for an approved relief request."""
+    __tablename__ = "stock_reservations"
+    __table_args__ = (
+        db.Index("ix_stock_reservations_status_expires", "status", "expires_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    resource_id = db.Column(db.Integer, db.ForeignKey("resources.id", ondelete="CASCADE"), nullable=False, index=True)
+    relief_request_id = db.Column(db.Integer, db.ForeignKey("relief_requests.id", ondelete="CASCADE"),
+                                  nullable=True, index=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), default="active", nullable=False)  # active | consumed | released | expired
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_by = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    closed_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<StockReservation {self.quantity} of Resource {self.resource_id} ({self.status})>"
+
+
+class StockSnapshot(db.Model):
+    """Stock level of one resource as of ledger row `last_movement_id`."""
+    __tablename__ = "stock_snapshots"
+    __table_args__ = (
+        db.Index("ix_stock_snapshots_resource", "resource_id", "last_movement_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    resource_id = db.Column(db.Integer, db.ForeignKey("resources.id", ondelete="CASCADE"), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    last_movement_id = db.Column(db.Integer, nullable=False)
+    taken_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<StockSnapshot Resource {self.resource_id} = {self.quantity} @ {self.last_movement_id}>"
+
+
 
 # The rest of the models (VolunteerProfile, Organization, ReliefCamp, Notification, AuditLog, TaskAssignment, Message)
 # remain the same as your previous file and do not need changes
@@ -216,6 +382,8 @@ class VolunteerProfile(db.Model):
     experience_years = db.Column(db.Integer, default=0)
     availability = db.Column(db.Boolean, default=True)
     location = db.Column(db.String(100), nullable=True)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
     preferred_role = db.Column(db.String(50), nullable=True)
     languages = db.Column(db.String(255), nullable=True)
     phone_number = db.Column(db.String(20), nullable=True)
@@ -250,6 +418,9 @@ class ReliefCamp(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     location = db.Column(db.String(200), nullable=False)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    geohash = db.Column(db.String(12), nullable=True, index=True)
     capacity = db.Column(db.Integer, nullable=False)
     current_occupancy = db.Column(db.Integer, default=0)
 
@@ -259,11 +430,41 @@ class ReliefCamp(db.Model):
 
     organization = db.relationship("Organization", back_populates="relief_camps")
     disaster = db.relationship("Disaster", back_populates="relief_camps")
+    occupancy_events = db.relationship("CampOccupancyEvent", back_populates="camp", cascade="all, delete",
+                                       passive_deletes=True)
 
     def __repr__(self):
         return f"<ReliefCamp {self.name} ({self.current_occupancy}/{self.capacity})>"
 
 
+class CampOccupancyEvent(db.Model):
+    """One append-only check-in, check-out or correction at a relief camp.
+
+    `occupancy_after` is the camp's occupancy right after this event, read
+    inside the same transaction as the counter update (see
+    ReliefCamp/occupancy.py), so the log can be replayed or audited without
+    recomputing running totals.
+    """
+    __tablename__ = "camp_occupancy_events"
+    __table_args__ = (
+        db.Index("ix_camp_occupancy_events_camp", "camp_id", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    camp_id = db.Column(db.Integer, db.ForeignKey("relief_camps.id", ondelete="CASCADE"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    kind = db.Column(db.String(20), nullable=False)   # check_in, check_out, adjust
+    people = db.Column(db.Integer, nullable=False)    # signed change in occupancy
+    occupancy_after = db.Column(db.Integer, nullable=False)
+    note = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    camp = db.relationship("ReliefCamp", back_populates="occupancy_events")
+
+    def __repr__(self):
+        return f"<CampOccupancyEvent camp_id={self.camp_id} {self.kind} {self.people:+d}>"
+
+
 
 class Notification(db.Model):
     __tablename__ = "notifications"
@@ -311,6 +512,7 @@ class TaskAssignment(db.Model):
         nullable=False
     )
     assigned_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime, nullable=True, index=True)
 
     volunteer = db.relationship("User", back_populates="tasks")
     relief_request = db.relationship("ReliefRequest", back_populates="tasks")
@@ -364,6 +566,29 @@ class RoleRequest(db.Model):
     user = db.relationship("User", foreign_keys=[user_id])
     admin = db.relationship("User", foreign_keys=[admin_id])
 
-    
 
+class MetricRollup(db.Model):
+    """Pre-aggregated per-hour / per-day counters backing the dashboard trend charts.
+
+    Dimension columns are NOT NULL (0 / "" mean "not applicable") so the unique
+    key below actually deduplicates rows.
+    """
+    __tablename__ = "metric_rollups"
+    __table_args__ = (
+        db.UniqueConstraint("metric", "granularity", "bucket_start", "disaster_id", "status",
+                            name="uq_metric_rollup_bucket"),
+        db.Index("ix_metric_rollups_series", "metric", "granularity", "bucket_start"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(50), nullable=False)        # relief_requests | donations | new_users | tasks_completed
+    granularity = db.Column(db.String(10), nullable=False)   # hour | day
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    disaster_id = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default="")
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0)
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    def __repr__(self):
+        return f"<MetricRollup {self.metric}/{self.granularity} {self.bucket_start} = {self.count}>"
@@ -11,6 +11,68 @@ document.addEventListener("DOMContentLoaded", function () {
         attribution: '&copy; OpenStreetMap contributors'
     }).addTo(map);
 
+    // ----------------------
+    // Cluster layers (coordinators)
+    // ----------------------
+    const clusterLayers = {
+        "Volunteers": { layer: "volunteers", group: L.layerGroup(), color: "#198754" },
+        "Relief camps": { layer: "camps", group: L.layerGroup(), color: "#0d6efd" }
+    };
+    const overlays = {};
+    Object.entries(clusterLayers).forEach(([label, cfg]) => overlays[label] = cfg.group);
+    const layersControl = L.control.layers(null, overlays).addTo(map);
+
+    function loadClusters() {
+        const bbox = map.getBounds().toBBoxString();
+        const zoom = map.getZoom();
+        Object.values(clusterLayers).forEach(cfg => {
+            if (!map.hasLayer(cfg.group)) return;
+            fetch(`/userLocation/clusters?layer=${cfg.layer}&bbox=${bbox}&zoom=${zoom}`)
+                .then(res => res.ok ? res.json() : null)
+                .then(data => {
+                    cfg.group.clearLayers();
+                    if (!data) return;
+                    data.clusters.forEach(c => {
+                        L.circleMarker([c.latitude, c.longitude], {
+                            radius: Math.min(6 + Math.log2(c.count) * 3, 30),
+                            color: cfg.color,
+                            fillOpacity: 0.5
+                        }).bindTooltip(String(c.count), { permanent: c.count > 1, direction: "center" })
+                          .addTo(cfg.group);
+                    });
+                })
+                .catch(err => console.log("Error fetching clusters:", err));
+        });
+    }
+
+    // Pending relief demand, binned by the server
+    const demandLayer = L.layerGroup();
+    layersControl.addOverlay(demandLayer, "Pending demand");
+
+    function loadDemand() {
+        if (!map.hasLayer(demandLayer)) return;
+        const precision = Math.min(Math.max(Math.ceil(2 * (map.getZoom() + 2) / 5), 1), 6);
+        fetch(`/reliefRequest/heatmap?precision=${precision}&bbox=${map.getBounds().toBBoxString()}`)
+            .then(res => res.ok ? res.json() : null)
+            .then(data => {
+                demandLayer.clearLayers();
+                if (!data) return;
+                const max = Math.max(1, ...data.cells.map(c => c.quantity));
+                data.cells.forEach(c => {
+                    L.circleMarker([c.latitude, c.longitude], {
+                        radius: 6 + 18 * Math.sqrt(c.quantity / max),
+                        stroke: false,
+                        color: "#dc3545",
+                        fillOpacity: 0.25 + 0.5 * c.quantity / max
+                    }).bindTooltip(`${c.resource}: ${c.quantity} (${c.requests} requests)`).addTo(demandLayer);
+                });
+            })
+            .catch(err => console.log("Error fetching demand heatmap:", err));
+    }
+
+    map.on("moveend overlayadd", loadClusters);
+    map.on("moveend overlayadd", loadDemand);
+
     // Update marker and input fields
     function updateMarker(lat, lng, zoom = 10) {
         marker.setLatLng([lat, lng]);
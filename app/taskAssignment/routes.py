@@ -49,10 +49,12 @@ def create_task_assignment():
         if not relief_request:
             return jsonify({"error": "Relief request not found"}), 404
 
+        task_status = data.get("status", "Assigned")
         new_task = TaskAssignment(
             volunteer_id=volunteer_id,
             relief_request_id=relief_request_id,
-            status=data.get("status", "Assigned")
+            status=task_status,
+            completed_at=datetime.utcnow() if task_status == "Completed" else None
         )
         db.session.add(new_task)
         db.session.commit()
@@ -92,6 +94,10 @@ def update_task(task_id):
     t = TaskAssignment.query.get_or_404(task_id)
     try:
         t.status = data.get("status", t.status)
+        if t.status == "Completed" and not t.completed_at:
+            t.completed_at = datetime.utcnow()
+        elif t.status != "Completed":
+            t.completed_at = None
         db.session.commit()
         log_action(admin.id, "UPDATE_TASK", f"Task {t.id} updated to {t.status}")
         return jsonify({"message": "✅ Task updated"}), 200
@@ -53,6 +53,8 @@ def get_profile():
         "experience_years": volunteer.experience_years,
         "availability": volunteer.availability,
         "location": volunteer.location,
+        "latitude": volunteer.latitude,
+        "longitude": volunteer.longitude,
         "preferred_role": volunteer.preferred_role,
         "languages": volunteer.languages,
         "phone_number": volunteer.phone_number